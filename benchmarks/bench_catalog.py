@@ -0,0 +1,109 @@
+"""Benchmark of parsing a large audio transcription catalog.
+
+Writes a synthetic catalog with the spreadsheet columns and compares the
+previous row-by-row `iterrows()` parser with the column-wise `parse_catalog`,
+reading the whole file at once and in chunks. Each mode runs in a fresh
+interpreter so its peak RSS is measured in isolation.
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_catalog.py --rows 500000
+    PYTHONPATH=src python benchmarks/bench_catalog.py --format parquet --skip-iterrows
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+MODE_SCRIPT = """
+import json, resource, sys, time
+import pandas as pd
+from stt_data_with_llm.catalog_parser import CATALOG_COLUMNS, parse_catalog
+
+def parse_catalog_iterrows(catalog_df):
+    catalog = {}
+    for index, row in catalog_df.iterrows():
+        catalog[str(index)] = {
+            field: row.get(column, "") if not pd.isna(row.get(column, "")) else ""
+            for field, column in CATALOG_COLUMNS.items()
+        }
+    return catalog
+
+mode, path = sys.argv[1], sys.argv[2]
+start = time.perf_counter()
+if mode == "iterrows":
+    reader = pd.read_parquet if path.endswith(".parquet") else pd.read_csv
+    catalog = parse_catalog_iterrows(reader(path))
+elif mode == "column-wise":
+    catalog = parse_catalog(path, chunk_size=10**9)
+else:
+    catalog = parse_catalog(path)
+elapsed = time.perf_counter() - start
+peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps({"seconds": elapsed, "peak_rss_mb": peak_rss_mb, "entries": len(catalog)}))
+"""  # noqa: E501
+
+
+def make_catalog(path, num_rows):
+    """Writes a synthetic catalog with a few empty cells in every column."""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(0)
+    ids = np.arange(num_rows)
+    catalog_df = pd.DataFrame(
+        {
+            "Sr.no": ids + 1,
+            "ID": [f"STT_NW{i:07}" for i in ids],
+            "Audio URL": [f"https://example.com/audio/{i}.mp3" for i in ids],
+            "Audio Text": ["བོད་ཀྱི་གསར་འགྱུར། " * 20] * num_rows,
+            "Speaker Name": rng.choice(["བདེ་སྐྱིད།", "བཀྲ་ཤིས།", None], num_rows),
+            "Speaker Gender": rng.choice(["Male", "Female", None], num_rows),
+            "News Channel": rng.choice(["RFA", "VOA", "VOT"], num_rows),
+            "Publishing Year": rng.choice(["2021.01.28", "2024.08.20"], num_rows),
+        }
+    )
+    if path.endswith(".parquet"):
+        catalog_df.to_parquet(path, index=False)
+    else:
+        catalog_df.to_csv(path, index=False)
+
+
+def run_mode(mode, path):
+    output = subprocess.run(
+        [sys.executable, "-c", MODE_SCRIPT, mode, path],
+        check=True,
+        capture_output=True,
+        text=True,
+        env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)),
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--skip-iterrows", action="store_true")
+    args = parser.parse_args()
+
+    modes = ["iterrows", "column-wise", "chunked"]
+    if args.skip_iterrows:
+        modes.remove("iterrows")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, f"catalog.{args.format}")
+        make_catalog(path, args.rows)
+        print(f"catalog: {args.rows} rows, {os.path.getsize(path) / 2**20:.1f} MB")
+        print(f"{'mode':<14}{'seconds':>10}{'rows/s':>12}{'peak RSS (MB)':>16}")
+        for mode in modes:
+            result = run_mode(mode, path)
+            print(
+                f"{mode:<14}{result['seconds']:>10.2f}"
+                f"{result['entries'] / result['seconds']:>12.0f}"
+                f"{result['peak_rss_mb']:>16.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Benchmark of peak memory and time of decoding audio to 16kHz PCM.
+
+Compares `convert_to_16K` (pydub decode, resample and WAV export in memory)
+with the streaming `decode_to_16K_pcm` path. Each mode runs in a fresh
+interpreter so its peak RSS is measured in isolation (ffmpeg children excluded),
+the "import only" row is the RSS of the interpreter before decoding anything.
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_decode.py --minutes 60
+    PYTHONPATH=src python benchmarks/bench_decode.py --minutes 60 --format wav
+
+pydub needs ffprobe to open compressed formats, use `--format wav` without it.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+MODE_SCRIPT = """
+import json, resource, sys, time
+from stt_data_with_llm.audio_parser import convert_to_16K, decode_to_16K_pcm
+mode, path = sys.argv[1], sys.argv[2]
+start = time.perf_counter()
+if mode == "import only":
+    num_bytes = 0
+elif mode == "convert_to_16K":
+    with open(path, "rb") as file:
+        result = convert_to_16K(file.read())
+    num_bytes = len(result)
+elif mode == "streaming":
+    num_bytes = decode_to_16K_pcm(path).nbytes
+else:
+    num_bytes = decode_to_16K_pcm(path, output_path=path + ".pcm").nbytes
+elapsed = time.perf_counter() - start
+peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps({"seconds": elapsed, "peak_rss_mb": peak_rss_mb, "pcm_mb": num_bytes / 2**20}))
+"""  # noqa: E501
+
+
+def make_fixture(path, minutes, audio_format):
+    """Encodes a synthetic 44.1kHz stereo tone plus noise program with ffmpeg."""
+    duration = int(minutes * 60)
+    command = ["ffmpeg", "-v", "error", "-y"]
+    command += ["-f", "lavfi", "-i", f"sine=frequency=220:duration={duration}"]
+    command += ["-f", "lavfi", "-i", f"anoisesrc=d={duration}:a=0.05"]
+    command += ["-filter_complex", "[0][1]amerge=inputs=2", "-ar", "44100"]
+    if audio_format == "mp3":
+        command += ["-b:a", "64k"]
+    subprocess.run(command + [path], check=True)
+
+
+def run_mode(mode, path):
+    output = subprocess.run(
+        [sys.executable, "-c", MODE_SCRIPT, mode, path],
+        check=True,
+        capture_output=True,
+        text=True,
+        env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)),
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--minutes", type=float, default=30)
+    parser.add_argument("--format", choices=["mp3", "wav"], default="mp3")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, f"fixture.{args.format}")
+        make_fixture(path, args.minutes, args.format)
+        print(f"fixture: {args.minutes} min, {os.path.getsize(path) / 2**20:.1f} MB")
+        print(f"{'mode':<16}{'seconds':>10}{'peak RSS (MB)':>16}{'PCM (MB)':>12}")
+        for mode in ("import only", "convert_to_16K", "streaming", "memmap"):
+            result = run_mode(mode, path)
+            print(
+                f"{mode:<16}{result['seconds']:>10.2f}"
+                f"{result['peak_rss_mb']:>16.1f}{result['pcm_mb']:>12.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""Agreement of the local correction with the LLM on a held-out set.
+
+Reads segments with their inference, reference and LLM corrected texts, either
+from a dataset written by the pipeline or from a JSON lines file with the same
+"inference_transcript", "reference_transcript" and "LLM_corrected_text" fields.
+The LLM texts must come from the LLM: use a dataset written before the local
+correction tier existed or with `LOCAL_CORRECTION_MAX_SYLLABLE_CER = None`, or
+pass `--query-llm` to ask the LLM again for the segments corrected locally.
+
+For every `--max-syllable-cer` value, reports how many valid segments the local
+correction resolves, the LLM requests this avoids with the `LLM_BATCH_SIZE`
+segments per request, and how often the local correction agrees with the LLM,
+exactly and on every syllable once the punctuation is ignored, along with their
+CER where they differ. `--min-agreement` makes the benchmark exit with a non-zero
+status when the exact agreement of the first value is lower, so it can guard the
+default threshold.
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_local_correction.py --dataset-dir data/dataset
+    PYTHONPATH=src python benchmarks/bench_local_correction.py --pairs held_out.jsonl \\
+        --max-syllable-cer 0.25 0.5 0.75
+"""
+import argparse
+import json
+import math
+import sys
+
+from stt_data_with_llm.cer import calculate_cer, normalize_cer_text
+from stt_data_with_llm.config import (
+    CER_THRESHOLD,
+    LLM_BATCH_SIZE,
+    LOCAL_CORRECTION_MAX_SYLLABLE_CER,
+)
+from stt_data_with_llm.dataset_writer import read_dataset_index, read_dataset_record
+from stt_data_with_llm.local_corrector import get_local_corrected_text, split_syllables
+
+TEXT_FIELDS = ("inference_transcript", "reference_transcript", "LLM_corrected_text")
+
+
+def load_segments(dataset_dir=None, pairs_path=None, limit=None):
+    """Returns the held-out segments as dicts of their texts."""
+    segments = []
+    if pairs_path is not None:
+        with open(pairs_path, encoding="utf-8") as pairs_file:
+            records = (json.loads(line) for line in pairs_file if line.strip())
+            segments = [
+                {field: record[field] for field in TEXT_FIELDS} for record in records
+            ]
+    else:
+        for entry in read_dataset_index(dataset_dir):
+            record = read_dataset_record(entry, dataset_dir)
+            segments.append({field: record[field] for field in TEXT_FIELDS})
+    return segments[:limit]
+
+
+def query_llm(segments):
+    """Replaces the LLM texts of the segments by a new LLM correction."""
+    from stt_data_with_llm.LLM_post_corrector import get_LLM_corrected_texts
+
+    corrected_texts = get_LLM_corrected_texts(
+        [
+            {
+                "id": str(index),
+                "inference_text": segment["inference_transcript"],
+                "reference_text": segment["reference_transcript"],
+                "is_valid": True,
+            }
+            for index, segment in enumerate(segments)
+        ]
+    )
+    for index, segment in enumerate(segments):
+        segment["LLM_corrected_text"] = corrected_texts.get(str(index))
+
+
+def evaluate(segments, max_syllable_cer):
+    """Compares the local correction with the LLM text of the valid segments.
+
+    Returns:
+        dict: Segment counts, avoided requests, exact and syllable agreement rates
+            and mean CER of the local correction against the LLM text where they
+            differ
+    """
+    resolved = agreed = syllables_agreed = 0
+    disagreement_cers = []
+    for segment in segments:
+        local_text = get_local_corrected_text(
+            segment["inference_transcript"],
+            segment["reference_transcript"],
+            max_syllable_cer,
+        )
+        llm_text = segment["LLM_corrected_text"]
+        if local_text is None or llm_text is None:
+            continue
+        resolved += 1
+        if split_syllables(local_text) == split_syllables(llm_text):
+            syllables_agreed += 1
+        if normalize_cer_text(local_text) == normalize_cer_text(llm_text):
+            agreed += 1
+        else:
+            disagreement_cers.append(calculate_cer(llm_text, local_text))
+    requests_before = math.ceil(len(segments) / LLM_BATCH_SIZE)
+    requests_after = math.ceil((len(segments) - resolved) / LLM_BATCH_SIZE)
+    return {
+        "valid": len(segments),
+        "resolved": resolved,
+        "avoided_requests": requests_before - requests_after,
+        "agreement": agreed / resolved if resolved else 1.0,
+        "syllable_agreement": syllables_agreed / resolved if resolved else 1.0,
+        "disagreement_cer": sum(disagreement_cers) / len(disagreement_cers)
+        if disagreement_cers
+        else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--dataset-dir")
+    source.add_argument("--pairs")
+    parser.add_argument(
+        "--max-syllable-cer",
+        type=float,
+        nargs="+",
+        default=[LOCAL_CORRECTION_MAX_SYLLABLE_CER],
+    )
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--query-llm", action="store_true")
+    parser.add_argument("--min-agreement", type=float, default=None)
+    args = parser.parse_args()
+
+    segments = load_segments(args.dataset_dir, args.pairs, args.limit)
+    # Only segments passing validation get the reference spelling, by the LLM or
+    # locally, the others are left out like in the pipeline.
+    valid_segments = [
+        segment
+        for segment in segments
+        if calculate_cer(
+            segment["inference_transcript"],
+            segment["reference_transcript"],
+            CER_THRESHOLD,
+        )
+        <= CER_THRESHOLD
+    ]
+    if args.query_llm:
+        query_llm(valid_segments)
+    print(f"{len(segments)} held-out segments, {len(valid_segments)} valid")
+    print(
+        f"{'max cer':>8}{'resolved':>10}{'share':>8}{'requests saved':>16}"
+        f"{'agreement':>11}{'syllables':>11}{'cer when differing':>20}"
+    )
+    results = [
+        evaluate(valid_segments, max_syllable_cer)
+        for max_syllable_cer in args.max_syllable_cer
+    ]
+    for max_syllable_cer, result in zip(args.max_syllable_cer, results):
+        share = result["resolved"] / result["valid"] if result["valid"] else 0.0
+        print(
+            f"{max_syllable_cer:>8.2f}{result['resolved']:>10}{share:>8.1%}"
+            f"{result['avoided_requests']:>16}{result['agreement']:>11.1%}"
+            f"{result['syllable_agreement']:>11.1%}"
+            f"{result['disagreement_cer']:>20.3f}"
+        )
+
+    if args.min_agreement is not None and results[0]["agreement"] < args.min_agreement:
+        print(f"agreement below {args.min_agreement:.1%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
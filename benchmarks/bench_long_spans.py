@@ -0,0 +1,158 @@
+"""Benchmark of the splitting of VAD spans longer than `AUDIO_SEG_UPPER_LIMIT`.
+
+Builds a synthetic 16kHz recording of continuous speech, noise modulated by
+syllables of random lengths with no silence between them, and VAD spans of 9 to
+40 seconds over it, then splits every span two ways:
+
+- "librosa + halving": the previous splitting, `librosa.effects.split` on the
+  samples of each span and stretches still too long cut in equal chunks
+- "frame energy": `split_long_span`, silences and cuts read from the frame
+  energy of the whole audio computed once
+
+Reports the time of both, the number of segments, and the energy of the frame
+centered on each chop (a cut between two segments with no silence in between)
+relative to the loudest frame of the recording, lower means fewer cuts in the
+middle of a syllable.
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_long_spans.py --minutes 30
+"""
+import argparse
+import time
+
+import numpy as np
+
+from stt_data_with_llm.audio_parser import (
+    FrameEnergy,
+    pcm_to_float,
+    sec_to_frame,
+    split_long_span,
+)
+from stt_data_with_llm.config import (
+    AUDIO_SEG_LOWER_LIMIT,
+    AUDIO_SEG_UPPER_LIMIT,
+    SAMPLE_RATE,
+)
+
+
+class Span:
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+
+
+def make_fixture(minutes, seed=0):
+    """Builds continuous speech-like noise and long VAD spans over it."""
+    rng = np.random.default_rng(seed)
+    num_samples = int(minutes * 60 * SAMPLE_RATE)
+    # Syllable rate between 2.5 and 5 per second, changing every 250 ms.
+    rate = rng.uniform(2.5, 5.0, num_samples // (SAMPLE_RATE // 4) + 1)
+    phase = np.cumsum(rate.repeat(SAMPLE_RATE // 4)[:num_samples]) / SAMPLE_RATE
+    envelope = 0.05 + np.abs(np.sin(np.pi * phase)) ** 2
+    samples = (rng.normal(0, 0.3, num_samples) * envelope * 8000).astype(np.int16)
+    spans = [
+        Span(start, start + rng.uniform(9, 40))
+        for start in np.arange(0, minutes * 60 - 45, 45)
+    ]
+    return samples, spans
+
+
+def librosa_split_long_span(audio_buffer, vad_span, lower_limit, upper_limit):
+    """The previous splitting of a long span, returning the segment times."""
+    import librosa
+
+    splits = librosa.effects.split(
+        pcm_to_float(
+            audio_buffer[
+                int(sec_to_frame(vad_span.start, SAMPLE_RATE)) : int(  # noqa: E203
+                    sec_to_frame(vad_span.end, SAMPLE_RATE)
+                )
+            ]
+        ),
+        top_db=30,
+    )
+    segments = []
+    for split_start, split_end in splits:
+        start = vad_span.start + split_start / SAMPLE_RATE
+        duration = (vad_span.start + split_end / SAMPLE_RATE) - start
+        if lower_limit <= duration <= upper_limit:
+            segments.append((start, start + duration))
+        elif duration > upper_limit:
+            chop_length = duration / 2
+            while chop_length > upper_limit:
+                chop_length = chop_length / 2
+            for chop_index in range(int(duration / chop_length)):
+                segments.append(
+                    (
+                        start + chop_length * chop_index,
+                        start + chop_length * (chop_index + 1),
+                    )
+                )
+    return segments
+
+
+def chop_decibels(segments, energy, loudest):
+    """Energy in dB of the frames centered on the cuts between adjacent segments."""
+    decibels = []
+    for (_, end), (next_start, _) in zip(segments, segments[1:]):
+        if end != next_start:
+            continue
+        cut = int(sec_to_frame(end, SAMPLE_RATE))
+        power = energy.frame_power(
+            cut - energy.frame_length // 2, cut + energy.frame_length // 2
+        )[energy.frame_length // 2 // energy.hop_length]
+        decibels.append(10 * np.log10(max(power, 1e-10) / loudest))
+    return decibels
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--minutes", type=float, default=30)
+    args = parser.parse_args()
+
+    samples, spans = make_fixture(args.minutes)
+    # Load librosa and numba once so the timing does not include them.
+    librosa_split_long_span(
+        samples, spans[0], AUDIO_SEG_LOWER_LIMIT, AUDIO_SEG_UPPER_LIMIT
+    )
+
+    start = time.perf_counter()
+    previous = [
+        segment
+        for span in spans
+        for segment in librosa_split_long_span(
+            samples, span, AUDIO_SEG_LOWER_LIMIT, AUDIO_SEG_UPPER_LIMIT
+        )
+    ]
+    previous_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    energy = FrameEnergy(samples)
+    current = [
+        tuple(segment)
+        for span in spans
+        for segment in split_long_span(
+            energy, span, SAMPLE_RATE, AUDIO_SEG_LOWER_LIMIT, AUDIO_SEG_UPPER_LIMIT
+        )
+    ]
+    current_seconds = time.perf_counter() - start
+
+    loudest = energy.frame_power(0, len(samples)).max()
+    print(f"fixture: {args.minutes} min, {len(spans)} VAD spans")
+    print(
+        f"{'mode':<20}{'seconds':>9}{'segments':>10}{'chops':>7}"
+        f"{'mean chop dB':>14}{'median chop dB':>16}"
+    )
+    for mode, segments, seconds in (
+        ("librosa + halving", previous, previous_seconds),
+        ("frame energy", current, current_seconds),
+    ):
+        decibels = chop_decibels(segments, energy, loudest)
+        print(
+            f"{mode:<20}{seconds:>9.2f}{len(segments):>10}{len(decibels):>7}"
+            f"{np.mean(decibels):>14.1f}{np.median(decibels):>16.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
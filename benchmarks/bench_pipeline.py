@@ -0,0 +1,263 @@
+"""Offline end-to-end benchmark of `get_audio_transcript_pairs`.
+
+Runs the whole pipeline on a local catalog of synthetic recordings against the
+stand-in services of `tests/fake_servers.py`: an audio file host, an ASR endpoint
+replacing `API_URL` and an Anthropic-compatible Messages API, each with a
+configurable latency. The recordings are built like in `bench_segments.py` and
+the VAD is replaced by the timelines stored in `tests/vad_output`, so no model or
+network is needed. The fake ASR answers every segment with a synthetic text and
+the reference transcript of an audio is the concatenation of these texts, so
+every audio passes validation and reaches the LLM correction, except the
+`--mismatched` first audios which get the reference of another audio, as a
+catalog row pointing to the wrong recording would.
+
+`transfer_segmentation` is replaced by the identity: fast-antx downloads a binary
+from GitHub when it is first called.
+
+Reports audio-hours processed per hour of wall time, the latency percentiles of
+every pipeline stage and the peak RSS of the process. `--min-audio-hours-per-hour`
+and `--max-rss-mb` make the benchmark exit with a non-zero status when missed, so
+it can guard regressions.
+
+Usage:
+    PYTHONPATH=src:. python benchmarks/bench_pipeline.py --audios 8 --minutes 10
+"""
+import argparse
+import csv
+import hashlib
+import io
+import os
+import resource
+import sys
+import tempfile
+import time
+import wave
+from collections import defaultdict
+from unittest import mock
+
+import numpy as np
+from bench_segments import TimelinePipeline, make_fixture
+
+from stt_data_with_llm import audio_parser
+from stt_data_with_llm import main as pipeline
+from stt_data_with_llm.audio_parser import encode_wav
+from stt_data_with_llm.cache import reset_caches
+from stt_data_with_llm.config import SAMPLE_RATE
+from stt_data_with_llm.dataset_writer import read_dataset_index
+from stt_data_with_llm.http_session import close_sessions
+from stt_data_with_llm.LLM_post_corrector import reset_anthropic_client
+from stt_data_with_llm.metrics import get_registry
+from tests.fake_servers import (
+    FakeAudioFileHandler,
+    LocalServer,
+    fake_anthropic_server,
+    fake_asr_server,
+)
+
+SYLLABLES = ("བཀྲ", "ཤིས", "བདེ", "ལེགས", "ཁྱེད", "རང", "སྐུ", "གཟུགས", "ཡིན", "པས")
+
+
+def segment_text(segment_pcm):
+    """Synthetic transcript of a segment, derived from its samples."""
+    digest = hashlib.sha1(segment_pcm).digest()
+    num_syllables = 4 + len(segment_pcm) // (SAMPLE_RATE * 2)
+    return "་".join(
+        SYLLABLES[digest[index % len(digest)] % len(SYLLABLES)]
+        for index in range(num_syllables)
+    )
+
+
+class FixtureFiles:
+    """Audio host content read from the fixture directory on request."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def get(self, path):
+        file_path = os.path.join(self.directory, os.path.basename(path))
+        if not os.path.exists(file_path):
+            return None
+        with open(file_path, "rb") as file:
+            return file.read()
+
+
+def make_fixtures(directory, num_audios, minutes):
+    """Writes the synthetic recordings and returns their texts and VAD timeline.
+
+    Returns:
+        tuple: (list of (audio id, file name, reference transcript), transcript by
+            segment hash, VAD spans, seconds of audio)
+    """
+    audios = []
+    transcripts = {}
+    spans = []
+    for index in range(num_audios):
+        samples, spans = make_fixture(minutes, seed=index)
+        full_audio_id = f"STT_BENCH{index:04}"
+        with mock.patch.object(
+            audio_parser, "initialize_vad_pipeline", lambda: TimelinePipeline(spans)
+        ):
+            split_audio = audio_parser.get_split_audio(
+                samples, full_audio_id, save_segments=False
+            )
+        texts = []
+        for segment in split_audio.values():
+            text = segment_text(segment.tobytes())
+            transcripts[hashlib.sha1(segment.tobytes()).hexdigest()] = text
+            texts.append(text)
+        file_name = f"{full_audio_id}.wav"
+        with open(os.path.join(directory, file_name), "wb") as file:
+            file.write(encode_wav(samples))
+        audios.append((full_audio_id, file_name, "".join(texts)))
+    return audios, transcripts, spans, num_audios * minutes * 60
+
+
+def transcribe_with(transcripts):
+    def transcribe(wav_data):
+        with wave.open(io.BytesIO(wav_data), "rb") as wav_file:
+            frames = wav_file.readframes(wav_file.getnframes())
+        return transcripts.get(hashlib.sha1(frames).hexdigest(), "")
+
+    return transcribe
+
+
+def timed_stages(latencies):
+    """Wraps `pipeline.AUDIO_STAGES` to record the seconds of every stage call."""
+
+    def timed(name, stage):
+        def run(job):
+            start = time.perf_counter()
+            try:
+                return stage(job)
+            finally:
+                latencies[name].append(time.perf_counter() - start)
+
+        return run
+
+    return tuple((name, timed(name, stage)) for name, stage in pipeline.AUDIO_STAGES)
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--audios", type=int, default=8)
+    parser.add_argument("--minutes", type=float, default=10)
+    parser.add_argument("--runner", choices=["staged", "serial"], default="staged")
+    parser.add_argument("--mismatched", type=int, default=0)
+    parser.add_argument("--download-latency", type=float, default=0.2)
+    parser.add_argument("--asr-latency", type=float, default=0.05)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--min-audio-hours-per-hour", type=float, default=None)
+    parser.add_argument("--max-rss-mb", type=float, default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        fixture_dir = os.path.join(temp_dir, "fixtures")
+        os.makedirs(fixture_dir)
+        audios, transcripts, spans, audio_seconds = make_fixtures(
+            fixture_dir, args.audios, args.minutes
+        )
+        latencies = defaultdict(list)
+        audio_server = LocalServer(
+            FakeAudioFileHandler,
+            files=FixtureFiles(fixture_dir),
+            latency=args.download_latency,
+            request_log=[],
+        )
+        asr_server = fake_asr_server(
+            latency=args.asr_latency, transcribe=transcribe_with(transcripts)
+        )
+        anthropic_server = fake_anthropic_server(latency=args.llm_latency)
+        with audio_server, asr_server, anthropic_server, mock.patch.dict(
+            "os.environ",
+            {
+                "STT_CACHE_DIR": os.path.join(temp_dir, "cache"),
+                "ANTHROPIC_BASE_URL": anthropic_server.url,
+                "ANTHROPIC_API_KEY": "benchmark",
+            },
+        ), mock.patch(
+            "stt_data_with_llm.inference_transcript.API_URL", asr_server.url
+        ), mock.patch.object(
+            audio_parser, "initialize_vad_pipeline", lambda: TimelinePipeline(spans)
+        ), mock.patch.object(
+            pipeline, "transfer_segmentation", lambda inference, reference: inference
+        ), mock.patch.object(
+            pipeline, "AUDIO_STAGES", timed_stages(latencies)
+        ):
+            catalog_path = os.path.join(temp_dir, "catalog.csv")
+            with open(catalog_path, "w", encoding="utf-8", newline="") as file:
+                writer = csv.writer(file)
+                writer.writerow(["ID", "Audio URL", "Audio Text"])
+                for index, (full_audio_id, file_name, reference) in enumerate(audios):
+                    if index < args.mismatched:
+                        reference = audios[(index + 1) % len(audios)][2]
+                    writer.writerow(
+                        [full_audio_id, f"{audio_server.url}/{file_name}", reference]
+                    )
+            reset_caches()
+            close_sessions()
+            reset_anthropic_client()
+
+            start = time.perf_counter()
+            pipeline.get_audio_transcript_pairs(
+                catalog_path,
+                prefetch_workers=0,
+                manifest_path=os.path.join(temp_dir, "manifest.sqlite"),
+                dataset_dir=os.path.join(temp_dir, "dataset"),
+                stage_workers=pipeline.STAGE_WORKERS
+                if args.runner == "staged"
+                else None,
+                metrics_path=None,
+            )
+            seconds = time.perf_counter() - start
+            num_segments = len(read_dataset_index(os.path.join(temp_dir, "dataset")))
+
+            reset_caches()
+            close_sessions()
+            reset_anthropic_client()
+
+    throughput = audio_seconds / seconds
+    rss = peak_rss_mb()
+    print(
+        f"{args.audios} audios x {args.minutes} min, {args.runner} runner, "
+        f"{num_segments} segments saved in {seconds:.1f} s"
+    )
+    print(f"audio-hours per hour: {throughput:.1f}")
+    print(f"peak RSS: {rss:.0f} MiB")
+    registry = get_registry()
+    print(
+        f"early rejections: {registry.get_counter('early_rejections_total')}, "
+        "inference saved: "
+        f"{registry.get_counter('inference_saved_total', unit='segments')} segments"
+    )
+    print(f"{'stage':<12}{'calls':>7}{'p50 (s)':>10}{'p90 (s)':>10}{'p99 (s)':>10}")
+    for name, _ in pipeline.AUDIO_STAGES:
+        values = np.array(latencies[name] or [0.0])
+        print(
+            f"{name:<12}{len(latencies[name]):>7}{np.percentile(values, 50):>10.3f}"
+            f"{np.percentile(values, 90):>10.3f}{np.percentile(values, 99):>10.3f}"
+        )
+
+    failed = False
+    if num_segments == 0:
+        print("no segment was saved")
+        failed = True
+    if args.min_audio_hours_per_hour is not None and (
+        throughput < args.min_audio_hours_per_hour
+    ):
+        print(f"below {args.min_audio_hours_per_hour} audio-hours per hour")
+        failed = True
+    if args.max_rss_mb is not None and rss > args.max_rss_mb:
+        print(f"peak RSS over {args.max_rss_mb:.0f} MiB")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
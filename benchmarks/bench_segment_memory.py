@@ -0,0 +1,56 @@
+"""Benchmark of the memory held by the segments of `get_split_audio`.
+
+Splits the fixture of `bench_segments.py` without writing files and measures with
+tracemalloc the memory retained by the returned segments and the peak while
+splitting, for the current segment views and for the previous layout where every
+segment was a bytes copy of its slice.
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_segment_memory.py --minutes 60
+"""
+import argparse
+import gc
+import tracemalloc
+from unittest import mock
+
+from bench_segments import TimelinePipeline, make_fixture
+
+from stt_data_with_llm import audio_parser
+from stt_data_with_llm.config import SAMPLE_RATE
+
+
+def measure(samples, spans, copy_segments):
+    gc.collect()
+    tracemalloc.start()
+    with mock.patch.object(
+        audio_parser, "initialize_vad_pipeline", lambda: TimelinePipeline(spans)
+    ):
+        split_audio = audio_parser.get_split_audio(
+            samples, "BENCH", save_segments=False
+        )
+        if copy_segments:
+            split_audio = {key: bytes(value) for key, value in split_audio.items()}
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(split_audio), retained, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--minutes", type=float, default=60)
+    args = parser.parse_args()
+
+    samples, spans = make_fixture(args.minutes)
+    # Load librosa and numba before tracing so their imports are not counted.
+    measure(samples[: 200 * SAMPLE_RATE], spans[:10], False)
+    mib = 1024 * 1024
+    print(f"fixture: {args.minutes} min, PCM buffer {samples.nbytes / mib:.1f} MiB")
+    print(f"{'segments':<14}{'count':>8}{'retained MiB':>14}{'peak MiB':>10}")
+    for name, copy_segments in (("bytes copies", True), ("views", False)):
+        count, retained, peak = measure(samples, spans, copy_segments)
+        print(f"{name:<14}{count:>8}{retained / mib:>14.2f}{peak / mib:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
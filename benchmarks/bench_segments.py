@@ -0,0 +1,128 @@
+"""Benchmark of segments per second of `get_split_audio` on a long fixture.
+
+Splits a synthetic 16kHz recording along the VAD timelines stored in
+`tests/vad_output` (tiled to the fixture length, so no VAD model is needed) and
+compares three ways of handling the segments:
+
+- "pydub export": the previous `save_segment`, an ffmpeg process per segment
+- "direct WAV": the current `save_segment` writing PCM behind a WAV header
+- "no files": `save_segments=False`, segments only kept in memory
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_segments.py --minutes 60
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from unittest import mock
+
+import numpy as np
+
+from stt_data_with_llm import audio_parser
+from stt_data_with_llm.config import SAMPLE_RATE, SAMPLE_WIDTH
+
+
+class Span:
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+
+
+class TimelinePipeline:
+    """Stands in for the VAD pipeline and returns a fixed timeline."""
+
+    def __init__(self, spans):
+        self.spans = spans
+
+    def __call__(self, audio):
+        return self
+
+    def get_timeline(self):
+        return self
+
+    def support(self):
+        return self.spans
+
+
+def make_fixture(minutes, seed=0):
+    """Builds noise bursts and a VAD timeline tiled from the stored outputs."""
+    duration = minutes * 60
+    timelines = []
+    for name in ("NW_001", "NW_002", "NW_003"):
+        path = f"tests/vad_output/{name}_vad_output.json"
+        with open(path, encoding="utf-8") as file:
+            timelines.append(json.load(file)["timeline"])
+    spans = []
+    offset = 0.0
+    while True:
+        for timeline in timelines:
+            for span in timeline:
+                if offset + span["end"] > duration:
+                    return make_samples(duration, seed), spans
+                spans.append(Span(offset + span["start"], offset + span["end"]))
+            offset += timeline[-1]["end"] + 1
+
+
+def make_samples(duration, seed):
+    rng = np.random.default_rng(seed)
+    time_axis = np.arange(int(duration * SAMPLE_RATE)) / SAMPLE_RATE
+    envelope = (np.sin(2 * np.pi * 0.3 * time_axis) > -0.2) * (
+        0.5 + 0.5 * np.sin(2 * np.pi * 3 * time_axis) ** 2
+    )
+    noise = rng.normal(0, 0.3, len(time_axis)).astype(np.float32)
+    return (noise * envelope * 8000).astype(np.int16)
+
+
+def pydub_save_segment(segment, folder, prefix, id, start_ms, end_ms):
+    """The previous `save_segment`, exporting through pydub and ffmpeg."""
+    from pydub import AudioSegment
+
+    AudioSegment(
+        data=segment, sample_width=SAMPLE_WIDTH, frame_rate=SAMPLE_RATE, channels=1
+    ).export(
+        f"{folder}/{prefix}_{id:04}_{int(start_ms)}_to_{int(end_ms)}.wav",  # noqa: E231
+        format="wav",
+        parameters=["-ac", "1", "-ar", "16000"],
+    )
+
+
+def run_mode(mode, samples, spans):
+    save_segment = (
+        pydub_save_segment if mode == "pydub export" else audio_parser.save_segment
+    )
+    with tempfile.TemporaryDirectory() as temp_dir, mock.patch.object(
+        audio_parser, "initialize_vad_pipeline", lambda: TimelinePipeline(spans)
+    ), mock.patch.object(audio_parser, "save_segment", save_segment):
+        cwd = os.getcwd()
+        os.chdir(temp_dir)
+        try:
+            start = time.perf_counter()
+            split_audio = audio_parser.get_split_audio(
+                samples, "BENCH", save_segments=mode != "no files"
+            )
+            return len(split_audio), time.perf_counter() - start
+        finally:
+            os.chdir(cwd)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--minutes", type=float, default=60)
+    args = parser.parse_args()
+
+    samples, spans = make_fixture(args.minutes)
+    # Load librosa and numba once so the first mode does not pay for it.
+    run_mode("no files", samples[: SAMPLE_RATE * 200], spans[:10])
+    print(f"fixture: {args.minutes} min, {len(spans)} VAD spans")
+    print(f"{'mode':<14}{'segments':>10}{'seconds':>10}{'segments/s':>12}")
+    for mode in ("pydub export", "direct WAV", "no files"):
+        num_segments, seconds = run_mode(mode, samples, spans)
+        print(
+            f"{mode:<14}{num_segments:>10}{seconds:>10.2f}{num_segments / seconds:>12.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
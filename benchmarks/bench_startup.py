@@ -0,0 +1,87 @@
+"""Benchmark of the pipeline import cost.
+
+Runs `python -X importtime` on a fresh interpreter importing the pipeline entry
+point, reports the slowest modules and the heavy dependencies that were loaded
+eagerly. Exits with a non-zero status when the import exceeds `--budget-ms` or
+when a heavy dependency is imported at startup, so it can guard regressions.
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_startup.py --budget-ms 1000
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+HEAVY_MODULES = (
+    "anthropic",
+    "evaluate",
+    "librosa",
+    "pandas",
+    "pyannote.audio",
+    "pydub",
+    "torch",
+    "torchaudio",
+)
+
+
+def parse_importtime(stderr):
+    """Parses `-X importtime` output into (module, self us, cumulative us) rows."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line.split(":", 1)[1].split("|")
+        rows.append((module.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def measure(module):
+    """Imports `module` in a fresh interpreter.
+
+    Returns:
+        tuple: importtime rows and the heavy modules found in `sys.modules`
+    """
+    code = (
+        f"import sys, {module}\n"
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        env=os.environ.copy(),
+        check=True,
+    )
+    loaded = [name for name in result.stdout.strip().split(",") if name]
+    return parse_importtime(result.stderr), loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--module", default="stt_data_with_llm.main")
+    parser.add_argument("--budget-ms", type=float, default=None)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    rows, loaded = measure(args.module)
+    total_ms = next(cum for name, _, cum in rows if name == args.module) / 1000
+
+    print(f"{'module':<50}{'self (ms)':>12}{'cumulative (ms)':>18}")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda row: -row[2])[
+        : args.top
+    ]:
+        print(f"{name:<50}{self_us / 1000:>12.1f}{cumulative_us / 1000:>18.1f}")
+    print(f"\n{args.module} imported in {total_ms:.1f} ms")
+    print(f"heavy modules loaded at startup: {', '.join(loaded) or 'none'}")
+
+    if loaded:
+        sys.exit(1)
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        print(f"over budget of {args.budget_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Benchmark of the segmentation transfer on long synthetic Tibetan transcripts.
+
+Builds a reference transcript of random syllables and an inference transcript
+with one line per segment, dropping, misspelling and inserting some syllables
+like the ASR does. The line breaks are transferred to the reference by a single
+fast-antx call over the full transcripts, as before, and by
+`transfer_segmentation_windowed`, which aligns windows cut at anchors.
+
+fast-antx downloads its diff binary from GitHub, so by default the diff runs with
+`diff_match_patch`, the Python port of the same library, with the same 1 s
+timeout; `--binary` uses the downloaded binary instead.
+
+Reports the time of both transfers, how many boundaries they put at the same
+place, and how many boundaries each one puts where the synthetic segments end,
+before or after the closing shad.
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_transfer.py --chars 10000 100000
+"""
+import argparse
+import random
+import time
+from unittest import mock
+
+import fast_antx.core
+
+from stt_data_with_llm.config import TRANSFER_WINDOW_CHARS, TRANSFER_WORKERS
+from stt_data_with_llm.segmentation_transfer import (
+    transfer_newlines,
+    transfer_segmentation_windowed,
+)
+
+SYLLABLES = (
+    "བཀྲ ཤིས བདེ ལེགས ཁྱེད རང སྐུ གཟུགས ཡིན པས དགོན སྡེ"
+    " ལྷག པར བོད ཀྱི སྐད ཡིག མི རྣམས ལ དང གི ནས"
+).split()
+
+
+def make_transcripts(num_chars, seed=0):
+    """Returns the inference and reference transcripts and the true boundaries.
+
+    Returns:
+        tuple: (inference transcript with one line per segment, reference
+            transcript, (first, last) reference positions where a boundary is
+            correct for every segment, before or after its closing shad)
+    """
+    rng = random.Random(seed)
+    inference_lines, reference, boundaries = [], "", []
+    while len(reference) < num_chars:
+        syllables = [rng.choice(SYLLABLES) for _ in range(rng.randint(8, 25))]
+        reference += "་".join(syllables)
+        reference += "། "
+        boundaries.append((len(reference) - 2, len(reference)))
+        heard = []
+        for syllable in syllables:
+            draw = rng.random()
+            if draw < 0.05:
+                continue
+            heard.append(syllable[:-1] if draw < 0.15 else syllable)
+            if rng.random() < 0.03:
+                heard.append(rng.choice(SYLLABLES))
+        inference_lines.append("་".join(heard))
+    return "\n".join(inference_lines) + "\n", reference, boundaries
+
+
+def boundary_positions(segmented):
+    """Returns the positions of the line breaks in the text without them."""
+    positions, position = [], 0
+    for line in segmented.split("\n")[:-1]:
+        position += len(line)
+        positions.append(position)
+    return positions
+
+
+class PythonDiffMatchPatch:
+    """Stand-in of the fast-antx diff binary running `diff_match_patch` in process."""
+
+    def __init__(self):
+        import diff_match_patch
+
+        self.dmp = diff_match_patch.diff_match_patch()
+
+    def diff_main(self, text1, text2):
+        return self.dmp.diff_main(text1, text2)
+
+
+def count_correct(segmented, boundaries):
+    return sum(
+        first <= position <= last
+        for position, (first, last) in zip(boundary_positions(segmented), boundaries)
+    )
+
+
+def timed_transfer(transfer):
+    start = time.perf_counter()
+    result = transfer()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chars", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--window-chars", type=int, default=TRANSFER_WINDOW_CHARS)
+    parser.add_argument("--workers", type=int, default=TRANSFER_WORKERS)
+    parser.add_argument("--binary", action="store_true")
+    parser.add_argument("--skip-full", action="store_true")
+    args = parser.parse_args()
+
+    with mock.patch.object(
+        fast_antx.core,
+        "optimized_diff_match_patch",
+        fast_antx.core.optimized_diff_match_patch
+        if args.binary
+        else PythonDiffMatchPatch,
+    ):
+        print(
+            f"{'chars':>8}{'segments':>10}{'full (s)':>10}{'windowed (s)':>14}"
+            f"{'same boundaries':>17}{'full correct':>14}{'windowed correct':>18}"
+        )
+        for num_chars in args.chars:
+            inference, reference, boundaries = make_transcripts(num_chars)
+            windowed, windowed_seconds = timed_transfer(
+                lambda: transfer_segmentation_windowed(
+                    inference,
+                    reference,
+                    window_chars=args.window_chars,
+                    workers=args.workers,
+                )
+            )
+            windowed_correct = count_correct(windowed, boundaries)
+            full_seconds = same = full_correct = float("nan")
+            if not args.skip_full:
+                full, full_seconds = timed_transfer(
+                    lambda: transfer_newlines(inference, reference)
+                )
+                same = sum(
+                    a == b
+                    for a, b in zip(
+                        boundary_positions(full), boundary_positions(windowed)
+                    )
+                ) / len(boundaries)
+                full_correct = count_correct(full, boundaries) / len(boundaries)
+            print(
+                f"{num_chars:>8}{len(boundaries):>10}{full_seconds:>10.2f}"
+                f"{windowed_seconds:>14.2f}{same:>17.1%}{full_correct:>14.1%}"
+                f"{windowed_correct / len(boundaries):>18.1%}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Benchmark of the per-audio VAD setup cost.
+
+Compares loading a fresh pyannote pipeline for every audio (the previous
+behaviour of `get_split_audio`) with the process wide pipeline registry.
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_vad_setup.py --audios 5
+"""
+
+import argparse
+import time
+
+from stt_data_with_llm.audio_parser import (
+    clear_vad_pipelines,
+    initialize_vad_pipeline,
+    load_vad_pipeline,
+)
+
+
+def time_per_audio(setup, num_audios):
+    """Runs `setup` once per simulated audio and returns the timings in seconds."""
+    timings = []
+    for _ in range(num_audios):
+        start = time.perf_counter()
+        setup()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--audios", type=int, default=5)
+    args = parser.parse_args()
+
+    before = time_per_audio(load_vad_pipeline, args.audios)
+    clear_vad_pipelines()
+    after = time_per_audio(initialize_vad_pipeline, args.audios)
+
+    print(f"{'mode':<10}{'first (s)':>12}{'mean (s)':>12}{'total (s)':>12}")
+    for mode, timings in (("before", before), ("after", after)):
+        print(
+            f"{mode:<10}{timings[0]:>12.3f}"
+            f"{sum(timings) / len(timings):>12.3f}{sum(timings):>12.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,110 @@
+import json
 import logging
 import os
+import threading
+import time
 
-import anthropic
 from dotenv import load_dotenv
 
-from stt_data_with_llm.util import setup_logging
+from stt_data_with_llm.cache import get_cache, make_cache_key
+from stt_data_with_llm.config import (
+    LLM_BATCH_MAX_TOKENS,
+    LLM_BATCH_POLL_INTERVAL,
+    LLM_BATCH_SEGMENT_TOKENS,
+    LLM_BATCH_SIZE,
+    LLM_BATCH_TOKENS_PER_CHAR,
+    LLM_CACHE_MAX_BYTES,
+    LLM_MAX_TOKENS,
+    LLM_MODEL,
+)
+from stt_data_with_llm.metrics import increment, timed
+from stt_data_with_llm.rate_limiter import (
+    RetryableError,
+    check_status,
+    get_rate_limiter,
+)
 
 load_dotenv()
-setup_logging("llm_corrector.log")
 
+# Anthropic client of the current process, created on first use.
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
 
-def get_LLM_corrected_text(inference_text, is_valid, reference_text=None):
+
+def get_anthropic_client():
     """
-    Corrects colloquial text with spelling mistakes using Claude API by referencing a literal sentence.
+    Returns the Anthropic client shared by every correction call of the process.
+
+    The client does not retry by itself, retries are left to the "llm" rate
+    limiter, see `call_anthropic`.
+
+    Returns:
+        anthropic.Client: Client authenticated with `ANTHROPIC_API_KEY`
+    """
+    import anthropic
+
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = anthropic.Client(
+                api_key=os.getenv("ANTHROPIC_API_KEY"), max_retries=0
+            )
+            _client_pid = os.getpid()
+        return _client
+
+
+def reset_anthropic_client():
+    """Drops the shared client, the next call creates a new one."""
+    global _client
+    with _client_lock:
+        _client = None
+
+
+def _classify_anthropic_errors(method, **params):
+    """Calls a client method, raising `RetryableError` for errors worth retrying."""
+    import anthropic
+
+    try:
+        return method(**params)
+    except anthropic.APIStatusError as e:
+        check_status(e.status_code, e.response.headers)
+        raise
+    except anthropic.APIConnectionError as e:
+        raise RetryableError(f"Anthropic request failed: {e}") from e
+
+
+def call_anthropic(method, **params):
+    """
+    Calls an Anthropic client method through the shared "llm" rate limiter.
+
+    Requests are paced to the API quota, and 429, 529, 5xx and connection errors
+    are retried with jittered backoff, honouring the Retry-After of the response.
+
+    Args:
+        method (callable): Client method, e.g. `client.messages.create`
+        **params: Arguments of the method
+
+    Returns:
+        The result of the method
+    """
+    return get_rate_limiter("llm").call(_classify_anthropic_errors, method, **params)
+
+
+def build_correction_prompt(inference_text, is_valid, reference_text=None):
+    """
+    Builds the prompt correcting a single segment.
 
     Args:
         inference_text (str): The colloquial text with potential spelling mistakes
+        is_valid (bool): Whether the segment matched its reference transcript
         reference_text (str): The literal reference text with correct spelling
 
     Returns:
-        str: Corrected text, or None if API call fails
+        str: Prompt for Claude
     """
-    # Initialize the Anthropic client
-    client = anthropic.Client(api_key=os.getenv("ANTHROPIC_API_KEY"))
-
     if is_valid and reference_text is not None:
-        prompt = f"""
+        return f"""
             I have two sentences: a colloquial sentence and a reference sentence.
             Your task is to EXACTLY match the spellings from the reference sentence.
             Do not make any corrections beyond matching the reference sentence exactly, even if you think a word is misspelled.   # noqa
@@ -34,30 +113,426 @@ def get_LLM_corrected_text(inference_text, is_valid, reference_text=None):
             Reference sentence: {reference_text}
             Give me only the corrected sentence that exactly matches the reference, without any explanation
             """
-    else:
-        prompt = f"""
+    return f"""
             You are a Tibetan Language Expert. I want you to look for any spelling and grammar mistakes in the following Tibetan
             sentence. Make sure that you don't change the terms and sentence if its not grammatically incorrect.
             Tibetan sentence: {inference_text}
             Output: output should be only the corrected sentence.
             Give me only the corrected sentence without any explanation
-            """
+            """  # noqa: E501
+
+
+def _record_usage(response):
+    """Counts the tokens of an API response."""
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        increment("llm_tokens_total", usage.input_tokens, direction="input")
+        increment("llm_tokens_total", usage.output_tokens, direction="output")
+
+
+def get_correction_cache():
+    """
+    Returns the persistent cache of LLM corrections.
+
+    Returns:
+        SQLiteCache: Cache of corrected texts keyed by `correction_cache_key`
+    """
+    return get_cache("llm_corrections", LLM_CACHE_MAX_BYTES)
+
+
+def correction_cache_key(inference_text, is_valid, reference_text=None):
+    """
+    Returns the cache key of a segment correction.
+
+    The key hashes the model id, the full single-segment prompt and the batched
+    prompt template, so editing either prompt template or switching model never
+    serves stale corrections. Batched corrections are cached under the same keys.
+
+    Args:
+        inference_text (str): The colloquial text with potential spelling mistakes
+        is_valid (bool): Whether the segment matched its reference transcript
+        reference_text (str): The literal reference text with correct spelling
+
+    Returns:
+        str: Cache key
+    """
+    return make_cache_key(
+        LLM_MODEL,
+        build_correction_prompt(inference_text, is_valid, reference_text),
+        # The batched prompt without segments, which is its template.
+        build_batch_correction_prompt([]),
+    )
+
+
+def _segment_cache_key(segment):
+    return correction_cache_key(
+        segment["inference_text"], segment["is_valid"], segment.get("reference_text")
+    )
+
+
+@timed("get_LLM_corrected_text")
+def get_LLM_corrected_text(inference_text, is_valid, reference_text=None):
+    """
+    Corrects colloquial text with spelling mistakes using Claude API by referencing a literal sentence.
+
+    Args:
+        inference_text (str): The colloquial text with potential spelling mistakes
+        reference_text (str): The literal reference text with correct spelling
+
+    Returns:
+        str: Corrected text, or None if API call still fails after the retries
+    """
+    cache = get_correction_cache()
+    cache_key = correction_cache_key(inference_text, is_valid, reference_text)
+    cached_text = cache.get(cache_key)
+    if cached_text is not None:
+        increment("cache_requests_total", cache="corrections", result="hit")
+        return cached_text
+    increment("cache_requests_total", cache="corrections", result="miss")
+
+    client = get_anthropic_client()
+    prompt = build_correction_prompt(inference_text, is_valid, reference_text)
 
     try:
         # Make API call to Claude
-        response = client.messages.create(
-            model="claude-3-5-sonnet-20241022",
-            max_tokens=1000,
+        response = call_anthropic(
+            client.messages.create,
+            model=LLM_MODEL,
+            max_tokens=LLM_MAX_TOKENS,
             messages=[{"role": "user", "content": prompt}],
         )
+        _record_usage(response)
 
         # Extract and return the corrected text
+        corrected_text = response.content[0].text.strip()
         logging.info(
-            f"Inference_transcript: {inference_text}\nReference_transcript: {reference_text}\nCorrected_text: {response.content[0].text.strip()}"  # noqa
+            f"Inference_transcript: {inference_text}\nReference_transcript: {reference_text}\nCorrected_text: {corrected_text}"  # noqa
         )
-        return response.content[0].text.strip()
+        cache.set(cache_key, corrected_text)
+        return corrected_text
 
     except Exception as e:
         # Log error and return None if API call fails
         logging.error(f"Error in LLM correction: {str(e)}")
+        increment("failures_total", operation="get_LLM_corrected_text")
         return None
+
+
+def build_batch_correction_prompt(segments):
+    """
+    Builds a prompt correcting several segments at once with structured output.
+
+    Args:
+        segments (list of dict): Segments with "id", "inference_text", "is_valid"
+            and "reference_text" keys
+
+    Returns:
+        str: Prompt for Claude
+    """
+    payload = [
+        {
+            "id": segment["id"],
+            "colloquial": segment["inference_text"],
+            "reference": segment.get("reference_text") if segment["is_valid"] else None,
+        }
+        for segment in segments
+    ]
+    return f"""
+            You are a Tibetan Language Expert. Below is a JSON list of Tibetan segments, each with an "id",
+            a "colloquial" sentence and an optional "reference" sentence.
+            When "reference" is given, EXACTLY match the spellings from the reference sentence.
+            Do not make any corrections beyond matching the reference sentence exactly, even if you think a word is misspelled.
+            If a word appears the same way in both sentences, do not change it.
+            When "reference" is null, look for spelling and grammar mistakes in the colloquial sentence.
+            Make sure that you don't change the terms and sentence if its not grammatically incorrect.
+            Segments: {json.dumps(payload, ensure_ascii=False)}
+            Output: only a JSON list with one object per segment, in the same order, of the form
+            {{"id": <id>, "corrected_text": <corrected sentence>}}, without any explanation
+            """  # noqa: E501
+
+
+def parse_batch_correction_response(response_text, segment_ids):
+    """
+    Extracts the per-segment corrections from a multi-segment response.
+
+    Args:
+        response_text (str): Text returned by Claude
+        segment_ids (list of str): Ids of the segments sent in the prompt
+
+    Returns:
+        dict: Corrected text by segment id, segments missing from the response are left out
+    """
+    start, end = response_text.find("["), response_text.rfind("]")
+    if start == -1 or end < start:
+        return {}
+    try:
+        corrections = json.loads(response_text[start : end + 1])  # noqa: E203
+    except json.JSONDecodeError:
+        return {}
+    expected_ids = set(segment_ids)
+    corrected_texts = {}
+    for correction in corrections:
+        if not isinstance(correction, dict):
+            continue
+        segment_id = correction.get("id")
+        corrected_text = correction.get("corrected_text")
+        if segment_id in expected_ids and isinstance(corrected_text, str):
+            corrected_texts[segment_id] = corrected_text.strip()
+    return corrected_texts
+
+
+def _segment_output_tokens(segment):
+    """Estimates the output tokens of a segment in a multi-segment response."""
+    text_length = max(
+        len(segment["inference_text"] or ""), len(segment.get("reference_text") or "")
+    )
+    return LLM_BATCH_SEGMENT_TOKENS + LLM_BATCH_TOKENS_PER_CHAR * text_length
+
+
+def _chunk_segments(segments, batch_size):
+    """Groups segments by `batch_size`, fewer when their output needs more tokens."""
+    chunks = []
+    chunk_tokens = 0
+    for segment in segments:
+        segment_tokens = _segment_output_tokens(segment)
+        if (
+            not chunks
+            or len(chunks[-1]) == batch_size
+            or chunk_tokens + segment_tokens > LLM_BATCH_MAX_TOKENS
+        ):
+            chunks.append([])
+            chunk_tokens = 0
+        chunks[-1].append(segment)
+        chunk_tokens += segment_tokens
+    return chunks
+
+
+def _batch_message_params(chunk):
+    max_tokens = sum(_segment_output_tokens(segment) for segment in chunk)
+    return {
+        "model": LLM_MODEL,
+        "max_tokens": min(max_tokens, LLM_BATCH_MAX_TOKENS),
+        "messages": [{"role": "user", "content": build_batch_correction_prompt(chunk)}],
+    }
+
+
+def _check_stop_reason(message, chunk):
+    """Logs a multi-segment response cut at max_tokens, its JSON is incomplete."""
+    if message.stop_reason == "max_tokens":
+        logging.warning(
+            f"Batched correction of {len(chunk)} segments stopped at max_tokens, "
+            "the segments missing from it are corrected alone"
+        )
+        increment("llm_truncated_responses_total")
+
+
+def _split_cached_segments(segments):
+    """Separates the segments whose correction is already cached.
+
+    Returns:
+        tuple: (corrected text by segment id for cached segments, uncached segments)
+    """
+    cache = get_correction_cache()
+    corrected_texts = {}
+    uncached_segments = []
+    for segment in segments:
+        cached_text = cache.get(_segment_cache_key(segment))
+        if cached_text is None:
+            uncached_segments.append(segment)
+        else:
+            corrected_texts[segment["id"]] = cached_text
+    increment(
+        "cache_requests_total", len(corrected_texts), cache="corrections", result="hit"
+    )
+    increment(
+        "cache_requests_total",
+        len(uncached_segments),
+        cache="corrections",
+        result="miss",
+    )
+    if corrected_texts:
+        logging.info(f"{len(corrected_texts)} corrections served from the cache")
+    return corrected_texts, uncached_segments
+
+
+def _cache_corrections(segments, corrected_texts):
+    cache = get_correction_cache()
+    for segment in segments:
+        corrected_text = corrected_texts.get(segment["id"])
+        if corrected_text is not None:
+            cache.set(_segment_cache_key(segment), corrected_text)
+
+
+def _correct_missing_segments(segments, corrected_texts):
+    """Falls back to one request per segment for segments left out of a response."""
+    for segment in segments:
+        if segment["id"] not in corrected_texts:
+            logging.warning(
+                f"No batched correction for segment {segment['id']}, correcting it alone"
+            )
+            corrected_texts[segment["id"]] = get_LLM_corrected_text(
+                segment["inference_text"],
+                segment["is_valid"],
+                segment.get("reference_text"),
+            )
+    return corrected_texts
+
+
+@timed("get_LLM_corrected_texts")
+def get_LLM_corrected_texts(segments, batch_size=LLM_BATCH_SIZE):
+    """
+    Corrects many segments, grouping `batch_size` segments per request.
+
+    Segments may come from one audio or from many audios as long as their ids are
+    unique. Long segments are grouped by fewer than `batch_size` so that the
+    answer fits in `LLM_BATCH_MAX_TOKENS`. Cached corrections are reused and only
+    the remaining segments are sent. Segments the model leaves out of its answer are corrected one by one.
+    When a request fails after its retries, the segments of its chunk are left
+    as None without more requests, so that they are retried on a later run.
+
+    Args:
+        segments (list of dict): Segments with "id", "inference_text", "is_valid"
+            and "reference_text" keys
+        batch_size (int): Maximum number of segments per prompt
+
+    Returns:
+        dict: Corrected text (or None if the API call failed) by segment id
+    """
+    corrected_texts, uncached_segments = _split_cached_segments(segments)
+    if not uncached_segments:
+        return corrected_texts
+    client = get_anthropic_client()
+    for chunk in _chunk_segments(uncached_segments, batch_size):
+        segment_ids = [segment["id"] for segment in chunk]
+        try:
+            with timed("llm_correction_request"):
+                response = call_anthropic(
+                    client.messages.create, **_batch_message_params(chunk)
+                )
+            _record_usage(response)
+            _check_stop_reason(response, chunk)
+            chunk_corrected_texts = parse_batch_correction_response(
+                response.content[0].text, segment_ids
+            )
+            _cache_corrections(chunk, chunk_corrected_texts)
+            corrected_texts.update(chunk_corrected_texts)
+            logging.info(f"Corrected {len(chunk)} segments in one request")
+        except Exception as e:
+            logging.error(f"Error in batched LLM correction: {str(e)}")
+            increment("failures_total", operation="llm_correction_request")
+            corrected_texts.update(dict.fromkeys(segment_ids))
+            continue
+        _correct_missing_segments(chunk, corrected_texts)
+    return corrected_texts
+
+
+def submit_LLM_correction_batch(segments, batch_size=LLM_BATCH_SIZE):
+    """
+    Submits the corrections of many segments through the Message Batches API.
+
+    Args:
+        segments (list of dict): Segments with "id", "inference_text", "is_valid"
+            and "reference_text" keys
+        batch_size (int): Maximum number of segments per prompt
+
+    Returns:
+        str: Id of the submitted message batch
+    """
+    client = get_anthropic_client()
+    requests = [
+        {
+            "custom_id": f"chunk-{chunk_index}",
+            "params": _batch_message_params(chunk),
+        }
+        for chunk_index, chunk in enumerate(_chunk_segments(segments, batch_size))
+    ]
+    message_batch = call_anthropic(client.messages.batches.create, requests=requests)
+    logging.info(
+        f"Submitted message batch {message_batch.id} with {len(requests)} requests"
+    )
+    return message_batch.id
+
+
+def collect_LLM_correction_batch(
+    message_batch_id,
+    segments,
+    batch_size=LLM_BATCH_SIZE,
+    poll_interval=LLM_BATCH_POLL_INTERVAL,
+):
+    """
+    Waits for a submitted message batch to end and collects its corrections.
+
+    Args:
+        message_batch_id (str): Id returned by `submit_LLM_correction_batch`
+        segments (list of dict): The segments given to `submit_LLM_correction_batch`
+        batch_size (int): The batch size given to `submit_LLM_correction_batch`
+        poll_interval (float): Seconds between two status checks
+
+    Returns:
+        dict: Corrected text (or None if the API call failed) by segment id, the
+            segments of a failed request are None
+    """
+    client = get_anthropic_client()
+    while (
+        client.messages.batches.retrieve(message_batch_id).processing_status != "ended"
+    ):
+        time.sleep(poll_interval)
+
+    chunks = {
+        f"chunk-{chunk_index}": chunk
+        for chunk_index, chunk in enumerate(_chunk_segments(segments, batch_size))
+    }
+    corrected_texts = {}
+    failed_chunk_ids = set()
+    for result in client.messages.batches.results(message_batch_id):
+        chunk = chunks.get(result.custom_id)
+        if chunk is None:
+            continue
+        if result.result.type != "succeeded":
+            logging.error(
+                f"Message batch request {result.custom_id} {result.result.type}"
+            )
+            failed_chunk_ids.add(result.custom_id)
+            continue
+        _record_usage(result.result.message)
+        _check_stop_reason(result.result.message, chunk)
+        chunk_corrected_texts = parse_batch_correction_response(
+            result.result.message.content[0].text,
+            [segment["id"] for segment in chunk],
+        )
+        _cache_corrections(chunk, chunk_corrected_texts)
+        corrected_texts.update(chunk_corrected_texts)
+    for chunk_id, chunk in chunks.items():
+        if chunk_id in failed_chunk_ids:
+            corrected_texts.update(dict.fromkeys(segment["id"] for segment in chunk))
+        else:
+            _correct_missing_segments(chunk, corrected_texts)
+    return corrected_texts
+
+
+def get_LLM_corrected_texts_with_message_batch(
+    segments, batch_size=LLM_BATCH_SIZE, poll_interval=LLM_BATCH_POLL_INTERVAL
+):
+    """
+    Corrects many segments through the asynchronous Message Batches API.
+
+    Only segments without a cached correction are submitted.
+
+    Args:
+        segments (list of dict): Segments with "id", "inference_text", "is_valid"
+            and "reference_text" keys
+        batch_size (int): Maximum number of segments per prompt
+        poll_interval (float): Seconds between two status checks
+
+    Returns:
+        dict: Corrected text (or None if the API call failed) by segment id
+    """
+    corrected_texts, uncached_segments = _split_cached_segments(segments)
+    if uncached_segments:
+        message_batch_id = submit_LLM_correction_batch(uncached_segments, batch_size)
+        corrected_texts.update(
+            collect_LLM_correction_batch(
+                message_batch_id, uncached_segments, batch_size, poll_interval
+            )
+        )
+    return corrected_texts
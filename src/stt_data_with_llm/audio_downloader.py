@@ -0,0 +1,311 @@
+import collections
+import hashlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from stt_data_with_llm.cache import get_cache_dir
+from stt_data_with_llm.config import (
+    AUDIO_HEADERS,
+    DOWNLOAD_ATTEMPTS,
+    DOWNLOAD_CHUNK_SIZE,
+    DOWNLOAD_MAX_WORKERS,
+    DOWNLOAD_TIMEOUT,
+)
+from stt_data_with_llm.http_session import get_session
+from stt_data_with_llm.metrics import increment, timed
+
+# Ranges only make sense on the bytes as stored, so ask for the identity encoding.
+DOWNLOAD_HEADERS = dict(AUDIO_HEADERS, **{"accept-encoding": "identity"})
+
+_url_locks = {}
+_url_locks_lock = threading.Lock()
+
+
+def get_download_dir():
+    """Returns the directory of the audio download cache.
+
+    Returns:
+        str: `<cache dir>/audio`
+    """
+    return os.path.join(get_cache_dir(), "audio")
+
+
+def _url_key(audio_url):
+    return hashlib.sha256(audio_url.encode("utf-8")).hexdigest()
+
+
+def _url_lock(audio_url):
+    with _url_locks_lock:
+        return _url_locks.setdefault(audio_url, threading.Lock())
+
+
+def _read_json(path):
+    try:
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, data):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(data, file)
+    os.replace(temp_path, path)
+
+
+def _validators(response):
+    return {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+
+
+def _revalidate(audio_url, entry, session):
+    """Checks a cached download against the server.
+
+    Returns:
+        bool: True if the cached content is still current
+    """
+    headers = dict(DOWNLOAD_HEADERS)
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    if len(headers) == len(DOWNLOAD_HEADERS):
+        # Nothing to validate against, cached downloads are treated as immutable.
+        return True
+    try:
+        with session.get(
+            audio_url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT
+        ) as response:
+            if response.status_code == 304:
+                return True
+            return response.status_code == 200 and _validators(response) == {
+                "etag": entry.get("etag"),
+                "last_modified": entry.get("last_modified"),
+            }
+    except requests.RequestException as e:
+        logging.warning(f"Could not revalidate {audio_url}, using cached copy: {e}")
+        return True
+
+
+def _content_range_total(response):
+    """Returns the full size given by the Content-Range header, None if unknown."""
+    total = response.headers.get("Content-Range", "").rpartition("/")[2]
+    return int(total) if total.isdigit() else None
+
+
+def _remove_partial_download(part_path, meta_path):
+    for path in (part_path, meta_path):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _download_attempt(audio_url, part_path, meta_path, chunk_size, session):
+    """Streams the audio into the partial file, resuming it when possible.
+
+    A partial file can already hold the whole audio when the process stopped
+    before moving it to the cache, the server then answers the resume request
+    with 416 or an empty range ending at its size, and the partial file is kept
+    as is. A 416 for another size means the partial file is stale, it is removed
+    so the next attempt starts over.
+
+    Raises:
+        requests.RequestException: If the attempt failed and may be retried
+    """
+    headers = dict(DOWNLOAD_HEADERS)
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    meta = _read_json(meta_path) or {}
+    if offset and (meta.get("etag") or meta.get("last_modified")):
+        headers["Range"] = f"bytes={offset}-"
+        headers["If-Range"] = meta.get("etag") or meta.get("last_modified")
+
+    with session.get(
+        audio_url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT
+    ) as response:
+        if offset and "Range" in headers:
+            total = _content_range_total(response)
+            if (response.status_code == 416 and total in (None, offset)) or (
+                response.status_code == 206 and total == offset
+            ):
+                logging.info(f"Download of {audio_url} was already complete")
+                return meta
+            if response.status_code == 416:
+                _remove_partial_download(part_path, meta_path)
+                raise requests.HTTPError(
+                    f"Partial download of {audio_url} does not match its size {total}",
+                    response=response,
+                )
+        if response.status_code == 206:
+            logging.info(f"Resuming download of {audio_url} at byte {offset}")
+            mode = "ab"
+        elif response.status_code == 200:
+            mode = "wb"
+        else:
+            raise requests.HTTPError(
+                f"Failed to download audio from {audio_url}: "
+                f"HTTP {response.status_code}",
+                response=response,
+            )
+        if mode == "wb" or not meta:
+            meta = _validators(response)
+            _write_json(meta_path, meta)
+        with open(part_path, mode) as file:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                file.write(chunk)
+    return meta
+
+
+def _hash_file(path, chunk_size):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@timed("download_audio")
+def download_audio(audio_url, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """Downloads an audio into the content addressed cache and returns its path.
+
+    The body is streamed to disk in `chunk_size` chunks. An interrupted download
+    is resumed with an HTTP Range request, and a cached download is revalidated
+    with its ETag/Last-Modified before being reused.
+
+    Args:
+        audio_url (str): URL of the audio file
+        chunk_size (int): Number of bytes read from the network at a time
+
+    Raises:
+        Exception: If download fails
+
+    Returns:
+        str: Path of the downloaded file, named after the SHA-256 of its content
+    """
+    download_dir = get_download_dir()
+    for folder in ("objects", "partial", "index"):
+        os.makedirs(os.path.join(download_dir, folder), exist_ok=True)
+    url_key = _url_key(audio_url)
+    index_path = os.path.join(download_dir, "index", f"{url_key}.json")
+    part_path = os.path.join(download_dir, "partial", f"{url_key}.part")
+    meta_path = f"{part_path}.json"
+    session = get_session("download", DOWNLOAD_MAX_WORKERS)
+
+    with _url_lock(audio_url):
+        entry = _read_json(index_path)
+        if entry is not None:
+            object_path = os.path.join(download_dir, "objects", entry["sha256"])
+            if os.path.exists(object_path) and _revalidate(audio_url, entry, session):
+                logging.info(f"Using cached download of {audio_url}")
+                increment("cache_requests_total", cache="downloads", result="hit")
+                return object_path
+
+        logging.info(f"Downloading audio from: {audio_url}")
+        for attempt in range(1, DOWNLOAD_ATTEMPTS + 1):
+            try:
+                meta = _download_attempt(
+                    audio_url, part_path, meta_path, chunk_size, session
+                )
+                break
+            except requests.RequestException as e:
+                logging.warning(
+                    f"Download of {audio_url} interrupted (attempt {attempt}): {e}"
+                )
+                if attempt < DOWNLOAD_ATTEMPTS:
+                    increment("retries_total", operation="download_audio")
+                else:
+                    err_message = f"Failed to download audio from {audio_url}"
+                    logging.error(err_message)
+                    raise Exception(err_message) from e
+
+        sha256 = _hash_file(part_path, chunk_size)
+        object_path = os.path.join(download_dir, "objects", sha256)
+        os.replace(part_path, object_path)
+        os.remove(meta_path)
+        increment(
+            "bytes_total",
+            os.path.getsize(object_path),
+            operation="download_audio",
+            direction="received",
+        )
+        _write_json(
+            index_path,
+            {
+                "url": audio_url,
+                "sha256": sha256,
+                "size": os.path.getsize(object_path),
+                **meta,
+            },
+        )
+        return object_path
+
+
+def _prefetch_audio(audio_url):
+    try:
+        return download_audio(audio_url)
+    except Exception as e:
+        logging.error(f"Prefetch of {audio_url} failed: {e}")
+        return None
+
+
+def prefetch_audios(audio_urls, max_workers=DOWNLOAD_MAX_WORKERS):
+    """Downloads many audios into the cache in parallel.
+
+    Args:
+        audio_urls (iterable of str): URLs of the audio files
+        max_workers (int): Maximum number of downloads at the same time
+
+    Returns:
+        dict: Cached file path by URL, None for the downloads that failed
+    """
+    audio_urls = list(dict.fromkeys(url for url in audio_urls if url))
+    with ThreadPoolExecutor(
+        max_workers=max(1, min(max_workers, len(audio_urls))),
+        thread_name_prefix="download",
+    ) as executor:
+        return dict(zip(audio_urls, executor.map(_prefetch_audio, audio_urls)))
+
+
+def prefetch_ahead(items, audio_url_of, max_workers=DOWNLOAD_MAX_WORKERS):
+    """Yields items in order while the audios of the next ones download in the background.
+
+    At most `max_workers` audios are downloaded ahead of the item being consumed,
+    so the downloads never run far ahead of the processing. An item is yielded once
+    its own download is over, a failed download is logged and left to the consumer.
+
+    Args:
+        items (iterable): Items to yield, e.g. catalog entries
+        audio_url_of (callable): Returns the audio URL of an item, empty to skip it
+        max_workers (int): Maximum number of downloads at the same time
+
+    Yields:
+        Items of `items`
+    """
+    executor = ThreadPoolExecutor(
+        max_workers=max(1, max_workers), thread_name_prefix="download"
+    )
+    pending = collections.deque()
+
+    def downloaded():
+        item, future = pending.popleft()
+        if future is not None:
+            future.result()
+        return item
+
+    try:
+        for item in items:
+            audio_url = audio_url_of(item)
+            future = executor.submit(_prefetch_audio, audio_url) if audio_url else None
+            pending.append((item, future))
+            if len(pending) > max_workers:
+                yield downloaded()
+        while pending:
+            yield downloaded()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
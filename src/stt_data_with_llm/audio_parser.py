@@ -1,28 +1,39 @@
 import io
+import json
 import logging
 import os
+import struct
+import subprocess
+import threading
 
-import librosa
-import requests
-import torchaudio
+import numpy as np
 from dotenv import load_dotenv
-from pyannote.audio import Pipeline
-from pydub import AudioSegment
 
+from stt_data_with_llm.audio_downloader import download_audio
+from stt_data_with_llm.cache import get_cache, make_cache_key
 from stt_data_with_llm.config import (
-    AUDIO_HEADERS,
     AUDIO_SEG_LOWER_LIMIT,
     AUDIO_SEG_UPPER_LIMIT,
+    CHANNELS,
+    CHOP_SEARCH_SECONDS,
+    DECODE_CHUNK_SIZE,
+    ENERGY_FRAME_LENGTH,
+    ENERGY_HOP_LENGTH,
     HYPER_PARAMETERS,
+    NON_MUTE_TOP_DB,
+    SAMPLE_RATE,
+    SAMPLE_WIDTH,
+    SAVE_SEGMENT_FILES,
+    VAD_CACHE_MAX_BYTES,
+    VAD_LOCAL_MODEL_PATH,
+    VAD_MODEL_ID,
 )
-from stt_data_with_llm.util import setup_logging
+from stt_data_with_llm.metrics import increment, timed
 
 # load the evnironment variable
 load_dotenv()
 
 USE_AUTH_TOKEN = os.getenv("use_auth_token")
-# Call the setup_logging function at the beginning of your script
-setup_logging("audio_parser.log")
 
 
 def sec_to_millis(seconds):
@@ -63,47 +74,195 @@ def sec_to_frame(sec, sr):
     return sec * sr
 
 
-def initialize_vad_pipeline():
+def _hyper_parameters_key(hyper_parameters):
+    """Builds a hashable key from a VAD hyper-parameter mapping.
+
+    Args:
+        hyper_parameters (dict): Pyannote pipeline hyper-parameters
+
+    Returns:
+        tuple: Sorted (name, value) pairs
     """
-    Initializes the Voice Activity Detection (VAD) pipeline using Pyannote.
+    return tuple(sorted(hyper_parameters.items()))
+
+
+def load_vad_pipeline(model_id=VAD_MODEL_ID, hyper_parameters=HYPER_PARAMETERS):
+    """Loads and instantiates a fresh Pyannote VAD pipeline.
+
+    This always pays the full model load cost, use `get_vad_pipeline` to share
+    a loaded pipeline across audios.
+
+    Args:
+        model_id (str): Pyannote model identifier on the Hugging Face hub
+        hyper_parameters (dict): Hyper-parameters used to instantiate the pipeline
+
     Returns:
         Pipeline: Initialized VAD pipeline
     """
-    logging.info("Initializing Voice Activity Detection pipeline...")
+    from pyannote.audio import Pipeline
+
+    logging.info(f"Loading Voice Activity Detection pipeline {model_id}...")
     try:
         vad_pipeline = Pipeline.from_pretrained(
-            "pyannote/voice-activity-detection",
+            model_id,
             use_auth_token=USE_AUTH_TOKEN,
         )
     except Exception as e:
         logging.warning(f"Failed to load online model: {e}. Using local model.")
         vad_pipeline = Pipeline.from_pretrained(
-            "tests/pyannote_vad_model",
+            VAD_LOCAL_MODEL_PATH,
             use_auth_token=False,
         )
-    vad_pipeline.instantiate(HYPER_PARAMETERS)
-    logging.info("VAD pipeline initialized successfully.")
+    vad_pipeline.instantiate(dict(hyper_parameters))
+    logging.info("VAD pipeline loaded successfully.")
     return vad_pipeline
 
 
+# Process wide registry of loaded VAD pipelines keyed by model id and hyper-parameters.
+_vad_pipelines = {}
+_vad_pipelines_pid = os.getpid()
+_vad_pipelines_lock = threading.Lock()
+_vad_thread_pipelines = threading.local()
+
+
+def get_vad_pipeline(
+    model_id=VAD_MODEL_ID, hyper_parameters=HYPER_PARAMETERS, per_thread=False
+):
+    """Returns a VAD pipeline from the registry, loading it on first use.
+
+    A pipeline is loaded once per process for each (model id, hyper-parameters)
+    pair. Forked worker processes never reuse the parent's pipeline, they load
+    their own on first use. With `per_thread` every thread gets its own instance,
+    which is needed when several threads run VAD concurrently.
+
+    Args:
+        model_id (str): Pyannote model identifier
+        hyper_parameters (dict): Hyper-parameters used to instantiate the pipeline
+        per_thread (bool): Whether to keep a separate instance per thread
+
+    Returns:
+        Pipeline: Initialized VAD pipeline
+    """
+    global _vad_pipelines_pid
+    key = (model_id, _hyper_parameters_key(hyper_parameters))
+    if per_thread:
+        thread_pipelines = getattr(_vad_thread_pipelines, "pipelines", None)
+        if thread_pipelines is None or _vad_thread_pipelines.pid != os.getpid():
+            thread_pipelines = _vad_thread_pipelines.pipelines = {}
+            _vad_thread_pipelines.pid = os.getpid()
+        if key not in thread_pipelines:
+            thread_pipelines[key] = load_vad_pipeline(model_id, hyper_parameters)
+        return thread_pipelines[key]
+
+    with _vad_pipelines_lock:
+        if _vad_pipelines_pid != os.getpid():
+            # Running in a forked worker, the inherited pipelines belong to the parent.
+            _vad_pipelines.clear()
+            _vad_pipelines_pid = os.getpid()
+        if key not in _vad_pipelines:
+            _vad_pipelines[key] = load_vad_pipeline(model_id, hyper_parameters)
+        return _vad_pipelines[key]
+
+
+def warm_vad_pipelines(configurations=None):
+    """Pre-loads VAD pipelines so the first audio does not pay the load cost.
+
+    Meant to be called at startup or as a worker process initializer.
+
+    Args:
+        configurations (list of tuple, optional): (model id, hyper-parameters) pairs
+            to load. Defaults to the configured model and hyper-parameters.
+    """
+    if configurations is None:
+        configurations = [(VAD_MODEL_ID, HYPER_PARAMETERS)]
+    for model_id, hyper_parameters in configurations:
+        get_vad_pipeline(model_id, hyper_parameters)
+
+
+def clear_vad_pipelines():
+    """Drops every pipeline held by the registry of the current process."""
+    with _vad_pipelines_lock:
+        _vad_pipelines.clear()
+    _vad_thread_pipelines.__dict__.clear()
+
+
+def initialize_vad_pipeline():
+    """
+    Returns the Voice Activity Detection (VAD) pipeline for the configured model.
+
+    The pipeline is loaded on the first call and reused from the registry afterwards.
+    Returns:
+        Pipeline: Initialized VAD pipeline
+    """
+    return get_vad_pipeline(VAD_MODEL_ID, HYPER_PARAMETERS)
+
+
 def save_segment(segment, folder, prefix, id, start_ms, end_ms):
     """Saves an audio segment to WAV file with standardized naming.
 
+    The 16kHz mono PCM is written behind a WAV header directly, without
+    starting an ffmpeg process per segment.
+
     Args:
-        segment (AudioSegment): Audio segment to save
+        segment (SegmentView, bytes or AudioSegment): 16kHz mono 16-bit PCM of the segment
         folder (str): Output directory path
         prefix (str): Filename prefix
         id (int): Segment Identifier
         start_ms (float): Segment start time in milliseconds
         end_ms (float): Segment end time in milliseconds
     """
-    segment.export(
+    pcm_data = pcm_buffer(segment)
+    with open(
         f"{folder}/{prefix}_{id:04}_{int(start_ms)}_to_{int(end_ms)}.wav",  # noqa: E231
-        format="wav",
-        parameters=["-ac", "1", "-ar", "16000"],
+        "wb",
+    ) as file:
+        file.write(wav_header(len(pcm_data)))
+        file.write(pcm_data)
+
+
+def wav_header(num_bytes, sampling_rate=SAMPLE_RATE):
+    """Builds the 44 byte header of a 16-bit mono PCM WAV file.
+
+    Args:
+        num_bytes (int): Size of the PCM payload in bytes
+        sampling_rate (int): Audio sampling rate in Hz
+
+    Returns:
+        bytes: RIFF/WAVE header followed by the start of the data chunk
+    """
+    block_align = CHANNELS * SAMPLE_WIDTH
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF",
+        36 + num_bytes,
+        b"WAVE",
+        b"fmt ",
+        16,
+        1,
+        CHANNELS,
+        sampling_rate,
+        sampling_rate * block_align,
+        block_align,
+        SAMPLE_WIDTH * 8,
+        b"data",
+        num_bytes,
     )
 
 
+def encode_wav(pcm_data, sampling_rate=SAMPLE_RATE):
+    """Wraps 16-bit mono PCM in a WAV container without re-encoding the samples.
+
+    Args:
+        pcm_data (SegmentView or bytes): Raw PCM samples
+        sampling_rate (int): Audio sampling rate in Hz
+
+    Returns:
+        bytes: WAV file content
+    """
+    pcm_data = pcm_buffer(pcm_data)
+    return wav_header(len(pcm_data), sampling_rate) + pcm_data
+
+
 def convert_to_16K(audio_data):
     """Converts audio data to 16kHz mono WAV format.
 
@@ -113,6 +272,8 @@ def convert_to_16K(audio_data):
     Returns:
         bytes: Converted 16kHz mono audio data, if conversion fails then returns None
     """
+    from pydub import AudioSegment
+
     try:
         # Load the audio data into an AudioSegment
         audio = AudioSegment.from_file(io.BytesIO(audio_data))
@@ -131,9 +292,119 @@ def convert_to_16K(audio_data):
         return None
 
 
+def _estimate_pcm_samples(source_size, sampling_rate):
+    """Estimates an upper bound of the PCM samples decoded from a compressed file.
+
+    Assumes a bitrate of at least 16kbps, every compressed byte then decodes to at
+    most half a second / 1000 of audio. Untouched pages of a numpy.empty buffer
+    are never committed, so overestimating costs address space, not memory.
+    """
+    return max(int(source_size * 8 / 16000 * sampling_rate), sampling_rate * 60)
+
+
+@timed("decode_to_16K_pcm")
+def decode_to_16K_pcm(
+    source,
+    sampling_rate=SAMPLE_RATE,
+    chunk_size=DECODE_CHUNK_SIZE,
+    output_path=None,
+):
+    """Decodes and resamples audio to 16kHz mono int16 PCM in a single streaming pass.
+
+    ffmpeg decodes, downmixes and resamples the source and its output is read in
+    `chunk_size` chunks straight into a preallocated buffer, or into a memory
+    mapped file when `output_path` is given. No intermediate full resolution copy
+    or WAV export is ever held in memory.
+
+    Args:
+        source (str or bytes): Path of the audio file, or its encoded content
+        sampling_rate (int): Target sampling rate in Hz
+        chunk_size (int): Number of PCM bytes read from ffmpeg at a time
+        output_path (str, optional): File backing the returned samples
+
+    Raises:
+        Exception: If ffmpeg fails to decode the audio
+
+    Returns:
+        numpy.ndarray: int16 PCM samples, a numpy.memmap if `output_path` is given
+    """
+    from_file = isinstance(source, (str, os.PathLike))
+    command = ["ffmpeg", "-v", "error", "-i", source if from_file else "pipe:0"]
+    command += ["-f", "s16le", "-acodec", "pcm_s16le", "-ac", "1"]
+    command += ["-ar", str(sampling_rate), "pipe:1"]
+    process = subprocess.Popen(
+        command,
+        stdin=subprocess.DEVNULL if from_file else subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    if not from_file:
+        # Feed the encoded bytes from a thread so stdout never blocks on stdin.
+        def feed():
+            try:
+                process.stdin.write(source)
+            except BrokenPipeError:
+                pass
+            finally:
+                process.stdin.close()
+
+        threading.Thread(target=feed, daemon=True).start()
+    stderr = []
+    stderr_reader = threading.Thread(
+        target=lambda: stderr.append(process.stderr.read()), daemon=True
+    )
+    stderr_reader.start()
+
+    chunk_size -= chunk_size % SAMPLE_WIDTH
+    num_bytes = 0
+    if output_path is not None:
+        chunk = bytearray(chunk_size)
+        with open(output_path, "wb") as file:
+            while True:
+                read = process.stdout.readinto(chunk)
+                if not read:
+                    break
+                file.write(memoryview(chunk)[:read])
+                num_bytes += read
+    else:
+        source_size = os.path.getsize(source) if from_file else len(source)
+        pcm = np.empty(_estimate_pcm_samples(source_size, sampling_rate), np.int16)
+        while True:
+            if num_bytes + chunk_size > pcm.nbytes:
+                grown_pcm = np.empty(len(pcm) * 2, np.int16)
+                grown_pcm[: num_bytes // SAMPLE_WIDTH] = pcm[
+                    : num_bytes // SAMPLE_WIDTH
+                ]
+                pcm = grown_pcm
+            with memoryview(pcm).cast("B") as view:
+                chunk = view[num_bytes : num_bytes + chunk_size]  # noqa: E203
+                read = process.stdout.readinto(chunk)
+                chunk.release()
+            if not read:
+                break
+            num_bytes += read
+    process.wait()
+    stderr_reader.join()
+    if process.returncode != 0:
+        err_message = f"ffmpeg failed to decode audio: {stderr[0].decode(errors='replace').strip()}"  # noqa: E501
+        logging.error(err_message)
+        raise Exception(err_message)
+
+    num_samples = num_bytes // SAMPLE_WIDTH
+    if output_path is not None:
+        if not num_samples:
+            return np.empty(0, np.int16)
+        return np.memmap(output_path, dtype=np.int16, mode="r", shape=(num_samples,))
+    return pcm[:num_samples]
+
+
+@timed("get_audio")
 def get_audio(audio_url):
     """Downloads and converts audio from URL to 16kHz format.
 
+    The download goes through the audio download cache, so an audio is only
+    fetched again when the server reports a change. The file is then decoded
+    in a single streaming pass by `decode_to_16K_pcm`.
 
     Args:
         audio_url (str): URL of the audio file
@@ -142,241 +413,747 @@ def get_audio(audio_url):
         Exception: If download fails
 
     Returns:
-        bytes: Downloaded and converted audio data
-    """
-    logging.info(f"Downloading audio from: {audio_url}")
-    response = requests.get(audio_url, headers=AUDIO_HEADERS, stream=True)
-    if response.status_code == 200:
-        audio_data = response.content  # Store original audio in memory
-        logging.info("Converting Audio to 16k")
-        audio_data_16k = convert_to_16K(audio_data)
-        logging.info("Audio downloaded and converted to 16kHz successfully")
-        return audio_data_16k
-    else:
-        err_message = f"Failed to download audio from {audio_url}"
-        logging.error(err_message)
-        raise Exception(err_message)
+        numpy.ndarray: Downloaded audio as 16kHz mono int16 PCM samples
+    """
+    audio_path = download_audio(audio_url)
+    logging.info("Converting Audio to 16k")
+    audio_data_16k = decode_to_16K_pcm(audio_path)
+    logging.info("Audio downloaded and converted to 16kHz successfully")
+    return audio_data_16k
 
 
-def chop_long_segment_duration(
-    segment_split_duration,
-    upper_limit,
-    original_audio_segment,
-    vad_span,
-    split_start,
+def sec_to_sample(sec, sampling_rate):
+    """Converts seconds to a sample offset in the decoded audio buffer.
+
+    Rounds through milliseconds the same way pydub slices audio, so segment
+    boundaries match the ones previously cut from an AudioSegment.
+
+    Args:
+        sec (float): Time in seconds
+        sampling_rate (int): Audio sampling rate in Hz
+
+    Returns:
+        int: Sample offset
+    """
+    return int(sec_to_millis(sec) * (sampling_rate / 1000.0))
+
+
+def _parse_wav_header(audio_data):
+    """Locates the PCM payload of a WAV file without copying it.
+
+    Args:
+        audio_data (bytes): WAV file content
+
+    Returns:
+        tuple: (audio format, channels, sampling rate, bits per sample, data offset,
+            data size), or None if `audio_data` is not a RIFF/WAVE file
+    """
+    if len(audio_data) < 12 or audio_data[:4] != b"RIFF" or audio_data[8:12] != b"WAVE":
+        return None
+    fmt = None
+    offset = 12
+    while offset + 8 <= len(audio_data):
+        chunk_id = audio_data[offset : offset + 4]  # noqa: E203
+        (chunk_size,) = struct.unpack_from("<I", audio_data, offset + 4)
+        body = offset + 8
+        if chunk_id == b"fmt ":
+            audio_format, channels, sampling_rate = struct.unpack_from(
+                "<HHI", audio_data, body
+            )
+            (bits_per_sample,) = struct.unpack_from("<H", audio_data, body + 14)
+            fmt = (audio_format, channels, sampling_rate, bits_per_sample)
+        elif chunk_id == b"data" and fmt is not None:
+            # Streamed WAV headers may carry a placeholder size, trust the buffer length.
+            data_size = min(chunk_size, len(audio_data) - body)
+            return (*fmt, body, data_size)
+        offset = body + chunk_size + (chunk_size % 2)
+    return None
+
+
+def decode_audio_buffer(audio_data, sampling_rate=SAMPLE_RATE):
+    """Decodes audio once into a 16-bit mono PCM buffer.
+
+    16kHz mono 16-bit WAV data, as produced by `get_audio`, is wrapped without
+    copying the samples. Any other input is decoded and resampled with pydub.
+
+    Args:
+        audio_data (bytes or numpy.ndarray): WAV/encoded audio bytes or int16 PCM samples
+        sampling_rate (int): Target sampling rate in Hz
+
+    Returns:
+        numpy.ndarray: int16 PCM samples at `sampling_rate`
+    """
+    if isinstance(audio_data, np.ndarray):
+        return audio_data.astype(np.int16, copy=False)
+    header = _parse_wav_header(audio_data)
+    if header is not None:
+        (
+            audio_format,
+            channels,
+            wav_sampling_rate,
+            bits_per_sample,
+            offset,
+            size,
+        ) = header
+        if (audio_format, channels, wav_sampling_rate, bits_per_sample) == (
+            1,
+            1,
+            sampling_rate,
+            16,
+        ):
+            return np.frombuffer(
+                audio_data, dtype="<i2", count=size // 2, offset=offset
+            )
+    from pydub import AudioSegment
+
+    audio = (
+        AudioSegment.from_file(io.BytesIO(audio_data))
+        .set_frame_rate(sampling_rate)
+        .set_channels(1)
+        .set_sample_width(2)
+    )
+    return np.frombuffer(audio.raw_data, dtype="<i2")
+
+
+def pcm_to_float(audio_buffer):
+    """Scales int16 PCM samples to float32 values in [-1.0, 1.0).
+
+    Args:
+        audio_buffer (numpy.ndarray): int16 PCM samples
+
+    Returns:
+        numpy.ndarray: float32 samples
+    """
+    return audio_buffer.astype(np.float32) / 32768.0
+
+
+def run_vad(pipeline, audio_buffer, sampling_rate):
+    """Runs the VAD pipeline on an in-memory PCM buffer.
+
+    Args:
+        pipeline (Pipeline): Initialized VAD pipeline
+        audio_buffer (numpy.ndarray): int16 PCM samples
+        sampling_rate (int): Audio sampling rate in Hz
+
+    Returns:
+        Annotation: VAD output of the pipeline
+    """
+    import torch
+
+    waveform = torch.from_numpy(pcm_to_float(audio_buffer)).unsqueeze(0)
+    return pipeline({"waveform": waveform, "sample_rate": sampling_rate})
+
+
+class VADSpan:
+    """Speech region of a VAD timeline.
+
+    Args:
+        start (float): Start time in seconds
+        end (float): End time in seconds
+    """
+
+    __slots__ = ("start", "end")
+
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+
+    def __eq__(self, other):
+        if not isinstance(other, VADSpan):
+            return NotImplemented
+        return (self.start, self.end) == (other.start, other.end)
+
+    def __repr__(self):
+        return f"VADSpan(start={self.start}, end={self.end})"
+
+
+def vad_timeline_to_json(timeline):
+    """Serializes VAD spans in the format of the files in `tests/vad_output`.
+
+    Args:
+        timeline (iterable): Spans with `start` and `end` attributes in seconds
+
+    Returns:
+        str: JSON object with a "timeline" list of {"start", "end"} objects
+    """
+    return json.dumps(
+        {"timeline": [{"start": span.start, "end": span.end} for span in timeline]}
+    )
+
+
+def vad_timeline_from_json(timeline_json):
+    """Reads VAD spans written by `vad_timeline_to_json`.
+
+    Args:
+        timeline_json (str): JSON object with a "timeline" list
+
+    Returns:
+        list of VADSpan: Spans of the timeline
+    """
+    return [
+        VADSpan(span["start"], span["end"])
+        for span in json.loads(timeline_json)["timeline"]
+    ]
+
+
+def get_vad_cache():
+    """
+    Returns the persistent cache of VAD timelines.
+
+    Returns:
+        SQLiteCache: Cache of timelines keyed by `vad_cache_key`
+    """
+    return get_cache("vad_timelines", VAD_CACHE_MAX_BYTES)
+
+
+def vad_cache_key(audio_buffer, model_id, hyper_parameters):
+    """
+    Returns the cache key of the VAD timeline of an audio.
+
+    The key hashes the model id, the hyper-parameters, the PCM format and the
+    samples, so a timeline is only reused for the same audio and pipeline.
+
+    Args:
+        audio_buffer (numpy.ndarray): int16 PCM samples
+        model_id (str): Pyannote model identifier
+        hyper_parameters (dict): Hyper-parameters of the pipeline
+
+    Returns:
+        str: Cache key
+    """
+    return make_cache_key(
+        model_id,
+        json.dumps(dict(hyper_parameters), sort_keys=True),
+        f"{SAMPLE_RATE}:{CHANNELS}:{SAMPLE_WIDTH}",  # noqa: E231
+        np.ascontiguousarray(audio_buffer),
+    )
+
+
+@timed("get_vad_timeline")
+def get_vad_timeline(audio_buffer, sampling_rate):
+    """Returns the speech regions of an audio, from the VAD cache when possible.
+
+    On a miss the configured VAD pipeline runs on the buffer and its timeline is
+    cached, the pipeline is not even loaded on a hit.
+
+    Args:
+        audio_buffer (numpy.ndarray): int16 PCM samples
+        sampling_rate (int): Audio sampling rate in Hz
+
+    Returns:
+        list of VADSpan: Speech regions in order
+    """
+    cache = get_vad_cache()
+    cache_key = vad_cache_key(audio_buffer, VAD_MODEL_ID, HYPER_PARAMETERS)
+    cached_timeline = cache.get(cache_key)
+    if cached_timeline is not None:
+        increment("cache_requests_total", cache="vad", result="hit")
+        return vad_timeline_from_json(cached_timeline)
+    increment("cache_requests_total", cache="vad", result="miss")
+    pipeline = initialize_vad_pipeline()
+    vad = run_vad(pipeline, audio_buffer, sampling_rate)
+    timeline = [VADSpan(span.start, span.end) for span in vad.get_timeline().support()]
+    cache.set(cache_key, vad_timeline_to_json(timeline))
+    return timeline
+
+
+def slice_audio(audio_buffer, start_sec, end_sec, sampling_rate):
+    """Returns the samples between two timestamps as a view on the buffer.
+
+    Args:
+        audio_buffer (numpy.ndarray): int16 PCM samples
+        start_sec (float): Start time in seconds
+        end_sec (float): End time in seconds
+        sampling_rate (int): Audio sampling rate in Hz
+
+    Returns:
+        numpy.ndarray: View on the samples of the segment
+    """
+    return audio_buffer[
+        sec_to_sample(start_sec, sampling_rate) : sec_to_sample(  # noqa: E203
+            end_sec, sampling_rate
+        )
+    ]
+
+
+class SegmentView:
+    """Segment of a decoded audio that references its samples instead of copying them.
+
+    Holds a memoryview on the shared PCM buffer of the audio, the bytes of the
+    segment are only produced by `tobytes()` when a caller needs them. Pickling
+    a set of segments sends their shared buffer once.
+
+    Args:
+        full_audio_id (str): Identifier of the audio the segment is cut from
+        audio_buffer (numpy.ndarray): int16 PCM samples of the whole audio
+        start (int): First sample of the segment
+        end (int): Sample after the last one of the segment
+    """
+
+    __slots__ = ("full_audio_id", "start", "end", "samples")
+
+    def __init__(self, full_audio_id, audio_buffer, start, end):
+        self.full_audio_id = full_audio_id
+        self.start = start
+        self.end = end
+        self.samples = memoryview(audio_buffer)[start:end]
+
+    @property
+    def pcm(self):
+        """memoryview: The PCM bytes of the segment, without copying them."""
+        return self.samples.cast("B")
+
+    @property
+    def nbytes(self):
+        return self.samples.nbytes
+
+    def tobytes(self):
+        return self.samples.tobytes()
+
+    __bytes__ = tobytes
+
+    def __eq__(self, other):
+        if isinstance(other, SegmentView):
+            other = other.pcm
+        elif not isinstance(other, (bytes, bytearray, memoryview)):
+            return NotImplemented
+        return self.pcm == other
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return (
+            SegmentView,
+            (self.full_audio_id, self.samples.obj, self.start, self.end),
+        )
+
+    def __repr__(self):
+        return (
+            f"SegmentView({self.full_audio_id!r}, start={self.start}, end={self.end})"
+        )
+
+
+def pcm_buffer(segment):
+    """Returns the PCM bytes of a segment as a byte memoryview, without copying.
+
+    Args:
+        segment (SegmentView, bytes or AudioSegment): Segment audio
+
+    Returns:
+        memoryview: Unsigned byte view on the PCM data
+    """
+    if isinstance(segment, SegmentView):
+        return segment.pcm
+    return memoryview(getattr(segment, "raw_data", segment)).cast("B")
+
+
+class SplitAudio(dict):
+    """Mapping of segment IDs to `SegmentView`s, as returned by `get_split_audio`.
+
+    The segments all reference the same decoded buffer, so an audio is held once
+    in memory whatever the number of segments.
+    """
+
+    @property
+    def sample_ranges(self):
+        """dict: (start, end) sample range of every segment, used to rebuild them."""
+        return {
+            segment_key: (segment.start, segment.end)
+            for segment_key, segment in self.items()
+        }
+
+
+def split_audio_from_sample_ranges(audio_data, sample_ranges, full_audio_id=""):
+    """Rebuilds the segments of an audio from their recorded sample ranges.
+
+    Args:
+        audio_data (bytes or numpy.ndarray): 16kHz WAV data or int16 PCM samples
+        sample_ranges (dict): (start, end) sample range by segment ID
+        full_audio_id (str): Identifier of the audio
+
+    Returns:
+        SplitAudio: Mapping of segment IDs to segments of the audio
+    """
+    audio_buffer = decode_audio_buffer(audio_data)
+    return SplitAudio(
+        (segment_key, SegmentView(full_audio_id, audio_buffer, start, end))
+        for segment_key, (start, end) in sample_ranges.items()
+    )
+
+
+def add_segment(
+    split_audio,
+    audio_buffer,
+    start_sec,
+    end_sec,
     sampling_rate,
     full_audio_id,
-    split_audio,
     output_folder,
     counter,
 ):
-    """Splits an audio segment into smaller chunks if its duration exceeds the specified upper limit.
+    """Stores a segment of the audio buffer in `split_audio` and saves it to disk.
 
+    Nothing is written when `output_folder` is None.
 
     Args:
-        segment_split_duration (float): The duration of the segment to be split (in seconds).
-        upper_limit (float): The maximum duration allowed for a segment (in seconds).
-        original_audio_segment (AudioSegment): The original audio segment to be split.
-        vad_span (Timeline): The Voice Activity Detection (VAD) span containing start and end times for the audio segment.
-        split_start (float): The starting point for splitting the audio segment (in seconds).
+        split_audio (dict): A dictionary to store the resulting split audio segments with their IDs as keys.
+        audio_buffer (numpy.ndarray): int16 PCM samples of the full audio
+        start_sec (float): Segment start time in seconds
+        end_sec (float): Segment end time in seconds
         sampling_rate (int): The sampling rate of the audio (in Hz).
         full_audio_id (str): The unique identifier for the full audio file.
-        split_audio (dict): A dictionary to store the resulting split audio segments with their IDs as keys.
-        output_folder (str): The directory where the split segments should be saved.
+        output_folder (str): The directory where the segment should be saved, or None.
         counter (int): The counter for naming the segment files.
+    """
+    segment = SegmentView(
+        full_audio_id,
+        audio_buffer,
+        sec_to_sample(start_sec, sampling_rate),
+        sec_to_sample(end_sec, sampling_rate),
+    )
+    split_audio[f"{full_audio_id}_{counter:04}"] = segment  # noqa: E231
+    if output_folder is None:
+        return
+    save_segment(
+        segment=segment,
+        folder=output_folder,
+        prefix=full_audio_id,
+        id=counter,
+        start_ms=sec_to_millis(start_sec),
+        end_ms=sec_to_millis(end_sec),
+    )
 
-    Returns:
-        int: The updated counter after processing the split segments.
-    """  # noqa: E501
-    chop_length = segment_split_duration / 2
-    while chop_length > upper_limit:
-        chop_length = chop_length / 2
-    for chop_index in range(int(segment_split_duration / chop_length)):
-        segment_split_chop = original_audio_segment[
-            sec_to_millis(
-                vad_span.start
-                + frame_to_sec(split_start, sampling_rate)
-                + chop_length * chop_index
-            ) : sec_to_millis(  # noqa: E203
-                vad_span.start
-                + frame_to_sec(split_start, sampling_rate)
-                + chop_length * (chop_index + 1)
+
+class FrameEnergy:
+    """Energy of a decoded audio, computed once for all its long VAD spans.
+
+    Holds the cumulative sum of the squared samples at every `hop_length` samples.
+    The frames of a span start at the span start, like the frames of
+    `librosa.effects.split` on the span samples, so their energy is read from the
+    cumulative sums with a few array operations, only the samples between a hop
+    boundary and a frame edge are read again.
+
+    Args:
+        audio_buffer (numpy.ndarray): int16 PCM samples
+        frame_length (int): Number of samples per frame
+        hop_length (int): Number of samples between two frames, must divide
+            `frame_length`
+    """
+
+    # Hops squared at a time, bounds the size of the temporary arrays
+    CHUNK_HOPS = 4096
+
+    def __init__(
+        self,
+        audio_buffer,
+        frame_length=ENERGY_FRAME_LENGTH,
+        hop_length=ENERGY_HOP_LENGTH,
+    ):
+        if frame_length % hop_length:
+            raise ValueError(
+                f"Hop length {hop_length} does not divide frame length {frame_length}"
             )
-        ]
-        segment_key = f"{full_audio_id}_{counter:04}"  # noqa: E231
-        split_audio[segment_key] = segment_split_chop.raw_data
-        save_segment(
-            segment=segment_split_chop,
-            folder=output_folder,
-            prefix=full_audio_id,
-            id=counter,
-            start_ms=sec_to_millis(
-                vad_span.start
-                + frame_to_sec(split_start, sampling_rate)
-                + chop_length * chop_index
-            ),
-            end_ms=sec_to_millis(
-                vad_span.start
-                + frame_to_sec(split_start, sampling_rate)
-                + chop_length * (chop_index + 1)
-            ),
+        self.audio_buffer = audio_buffer
+        self.frame_length = frame_length
+        self.hop_length = hop_length
+        hop_energy = np.empty(-(-len(audio_buffer) // hop_length), dtype=np.int64)
+        chunk_length = self.CHUNK_HOPS * hop_length
+        for chunk_start in range(0, len(audio_buffer), chunk_length):
+            samples = audio_buffer[
+                chunk_start : chunk_start + chunk_length  # noqa: E203
+            ].astype(np.int32)
+            sums = np.add.reduceat(
+                samples * samples,
+                np.arange(0, len(samples), hop_length),
+                dtype=np.int64,
+            )
+            first_hop = chunk_start // hop_length
+            hop_energy[first_hop : first_hop + len(sums)] = sums  # noqa: E203
+        self.cumulative_energy = np.concatenate(([0], np.cumsum(hop_energy)))
+
+    def energy_before(self, first, count):
+        """Sums of the squared samples before `first + i * hop_length` for i < count.
+
+        Args:
+            first (int): First sample offset
+            count (int): Number of offsets, the last one at most the buffer length
+
+        Returns:
+            numpy.ndarray: int64 energy before each offset
+        """
+        hop_length = self.hop_length
+        first_hop, offset = divmod(first, hop_length)
+        energy = self.cumulative_energy[first_hop : first_hop + count].copy()  # noqa
+        if offset:
+            # Every offset lies `offset` samples into its hop.
+            region = self.audio_buffer[
+                first_hop * hop_length : (first_hop + count) * hop_length  # noqa: E203
+            ]
+            full_hops = len(region) // hop_length
+            heads = (
+                region[: full_hops * hop_length]
+                .reshape(full_hops, hop_length)[:, :offset]
+                .astype(np.int32)
+            )
+            energy[:full_hops] += (heads * heads).sum(axis=1, dtype=np.int64)
+            if full_hops < count:
+                # The last offset is in the final, incomplete hop of the buffer.
+                tail = region[
+                    full_hops * hop_length : full_hops * hop_length  # noqa: E203
+                    + offset
+                ].astype(np.int64)
+                energy[full_hops] += (tail * tail).sum()
+        return energy
+
+    def frame_power(self, start, end):
+        """Mean power of the frames of the samples between `start` and `end`.
+
+        Frame t is centered on sample `start + t * hop_length` and the samples
+        outside the range count as zeros, like `librosa.feature.rms` with
+        `center=True` on these samples.
+
+        Args:
+            start (int): First sample of the range
+            end (int): Sample after the range
+
+        Returns:
+            numpy.ndarray: float64 mean square of each frame, samples scaled to
+                [-1.0, 1.0)
+        """
+        hop_length = self.hop_length
+        frame_hops = self.frame_length // hop_length
+        num_frames = 1 + (end - start) // hop_length
+        # Frame t lies between the edges t and t + frame_hops, clipped to the range.
+        edges = (
+            start
+            - self.frame_length // 2
+            + hop_length * np.arange(num_frames + frame_hops)
+        )
+        first = int(np.searchsorted(edges, start))
+        last = int(np.searchsorted(edges, end, side="right"))
+        energy = np.empty(len(edges), dtype=np.int64)
+        energy[:first] = self.energy_before(start, 1)[0]
+        energy[last:] = self.energy_before(end, 1)[0]
+        if last > first:
+            energy[first:last] = self.energy_before(int(edges[first]), last - first)
+        return (energy[frame_hops:] - energy[:-frame_hops]) / (
+            self.frame_length * 32768.0**2
         )
-        counter += 1
-    return counter
 
+    def non_mute_intervals(self, start, end, top_db=NON_MUTE_TOP_DB):
+        """Finds the non-silent intervals of the samples between `start` and `end`.
 
-def process_non_mute_segments(
-    non_mute_segment_splits,
-    original_audio_segment,
-    vad_span,
-    sampling_rate,
+        Gives the intervals of `librosa.effects.split` on these samples with the
+        same frame and hop lengths.
+
+        Args:
+            start (int): First sample of the range
+            end (int): Sample after the range
+            top_db (float): Decibels below the loudest frame of the range under
+                which a frame is silent
+
+        Returns:
+            tuple: (int array of the (start, end) sample offsets of the intervals from
+                `start`, shape (n, 2), power of the frames, see `frame_power`)
+        """
+        power = self.frame_power(start, end)
+        decibels = 10 * np.log10(np.maximum(power, 1e-10))
+        non_silent = (decibels - decibels.max() > -top_db).astype(np.int8)
+        edges = np.flatnonzero(np.diff(non_silent, prepend=0, append=0))
+        edges = np.minimum(edges * self.hop_length, end - start)
+        return edges.reshape(-1, 2), power
+
+
+def chop_long_segment(
+    frame_power,
+    split_start,
+    split_end,
     lower_limit,
     upper_limit,
-    full_audio_id,
-    output_folder,
-    counter,
-    split_audio,
+    sampling_rate,
+    hop_length=ENERGY_HOP_LENGTH,
+    search_seconds=CHOP_SEARCH_SECONDS,
 ):
-    """Processes non-mute segments by splitting them based on duration constraints and saving them as separate audio files.
+    """Chops a non-silent stretch longer than `upper_limit` at its quietest points.
+
+    The stretch is cut in 2, 4, 8... equal chunks until they are at most
+    `upper_limit` long, then each cut is moved to the frame of lowest energy within
+    `search_seconds` of it, or less when the chunks would otherwise leave the
+    duration limits, so it falls between two syllables rather than in one.
 
     Args:
-        non_mute_segment_splits (list of tuple): A list of tuples containing the start and end frame numbers for non-silent segments.
-        original_audio_segment (AudioSegment): The original audio segment to be processed.
-        vad_span (Timeline): The Voice Activity Detection (VAD) span containing start and end times for the audio segment.
-        sampling_rate (int): The sampling rate of the audio (in Hz).
-        lower_limit (float): The minimum duration allowed for a segment (in seconds).
-        upper_limit (float): The maximum duration allowed for a segment (in seconds).
-        full_audio_id (str): The unique identifier for the full audio file.
-        output_folder (str): The directory where the segments should be saved.
-        counter (int): The counter for naming the segment files.
-        split_audio (dict): A dictionary to store the resulting split audio segments with their IDs as keys.
+        frame_power (numpy.ndarray): Power of the frames of the VAD span, see
+            `FrameEnergy.frame_power`
+        split_start (int): Start of the stretch in samples from the span start
+        split_end (int): End of the stretch in samples from the span start
+        lower_limit (float): Minimum segment duration in seconds
+        upper_limit (float): Maximum segment duration in seconds
+        sampling_rate (int): Audio sampling rate in Hz
+        hop_length (int): Number of samples between two frames
+        search_seconds (float): Largest move of a cut in seconds
 
     Returns:
-        int: The updated counter after processing the non-mute segments.
-    """  # noqa: E501
-    for split_start, split_end in non_mute_segment_splits:
-        segment_split = original_audio_segment[
-            sec_to_millis(
-                vad_span.start + frame_to_sec(split_start, sampling_rate)
-            ) : sec_to_millis(  # noqa: E203
-                vad_span.start + frame_to_sec(split_end, sampling_rate)
-            )
-        ]
-        segment_split_duration = (
-            vad_span.start + frame_to_sec(split_end, sampling_rate)
-        ) - (vad_span.start + frame_to_sec(split_start, sampling_rate))
-        if lower_limit <= segment_split_duration <= upper_limit:
-            segment_key = f"{full_audio_id}_{counter:04}"  # noqa: E231
-            split_audio[segment_key] = segment_split.raw_data
-            save_segment(
-                segment=segment_split,
-                folder=output_folder,
-                prefix=full_audio_id,
-                id=counter,
-                start_ms=sec_to_millis(
-                    vad_span.start + frame_to_sec(split_start, sampling_rate)
-                ),
-                end_ms=sec_to_millis(
-                    vad_span.start + frame_to_sec(split_end, sampling_rate)
-                ),
-            )
-            counter += 1
-        elif segment_split_duration > upper_limit:
-            counter = chop_long_segment_duration(
-                segment_split_duration,
+        numpy.ndarray: Boundaries of the chunks in samples from the span start,
+            `split_start` and `split_end` included
+    """
+    num_chunks = 2
+    while (split_end - split_start) / num_chunks > upper_limit * sampling_rate:
+        num_chunks *= 2
+    boundaries = np.linspace(split_start, split_end, num_chunks + 1)
+    chunk_length = (split_end - split_start) / num_chunks
+    radius = min(
+        search_seconds * sampling_rate,
+        (upper_limit * sampling_rate - chunk_length) / 2,
+        (chunk_length - lower_limit * sampling_rate) / 2,
+    )
+    cuts = boundaries[1:-1]
+    first_frames = np.ceil((cuts - radius) / hop_length).astype(np.int64)
+    last_frames = np.floor((cuts + radius) / hop_length).astype(np.int64)
+    width = int((last_frames - first_frames).max()) + 1
+    if width > 0:
+        frames = first_frames[:, np.newaxis] + np.arange(width)
+        candidates = np.where(
+            frames <= last_frames[:, np.newaxis],
+            frame_power[np.clip(frames, 0, len(frame_power) - 1)],
+            np.inf,
+        )
+        quietest = frames[np.arange(len(cuts)), candidates.argmin(axis=1)]
+        boundaries[1:-1] = np.where(
+            last_frames >= first_frames, quietest * hop_length, cuts
+        )
+    return np.round(boundaries).astype(np.int64)
+
+
+def split_long_span(energy, vad_span, sampling_rate, lower_limit, upper_limit):
+    """Splits a VAD span longer than `upper_limit` at its silences.
+
+    Non-silent intervals shorter than `lower_limit` are dropped and the ones longer
+    than `upper_limit` are chopped, see `chop_long_segment`.
+
+    Args:
+        energy (FrameEnergy): Energy of the decoded audio
+        vad_span (Segment): VAD span with start and end times in seconds
+        sampling_rate (int): Audio sampling rate in Hz
+        lower_limit (float): Minimum segment duration in seconds
+        upper_limit (float): Maximum segment duration in seconds
+
+    Returns:
+        numpy.ndarray: (start, end) times of the segments in seconds, shape (n, 2)
+    """
+    span_end = min(
+        int(sec_to_frame(vad_span.end, sampling_rate)), len(energy.audio_buffer)
+    )
+    span_start = min(int(sec_to_frame(vad_span.start, sampling_rate)), span_end)
+    if span_start == span_end:
+        return np.empty((0, 2))
+    intervals, frame_power = energy.non_mute_intervals(span_start, span_end)
+    starts = vad_span.start + frame_to_sec(intervals[:, 0], sampling_rate)
+    ends = vad_span.start + frame_to_sec(intervals[:, 1], sampling_rate)
+    durations = ends - starts
+    segments = []
+    for index in np.flatnonzero(durations >= lower_limit):
+        if durations[index] <= upper_limit:
+            segments.append([[starts[index], ends[index]]])
+            continue
+        boundaries = vad_span.start + frame_to_sec(
+            chop_long_segment(
+                frame_power,
+                intervals[index, 0],
+                intervals[index, 1],
+                lower_limit,
                 upper_limit,
-                original_audio_segment,
-                vad_span,
-                split_start,
                 sampling_rate,
-                full_audio_id,
-                split_audio,
-                output_folder,
-                counter,
-            )
-    return counter
+                energy.hop_length,
+            ),
+            sampling_rate,
+        )
+        segments.append(np.column_stack((boundaries[:-1], boundaries[1:])))
+    return np.concatenate(segments) if segments else np.empty((0, 2))
 
 
+@timed("get_split_audio")
 def get_split_audio(
     audio_data,
     full_audio_id,
     lower_limit=AUDIO_SEG_LOWER_LIMIT,
     upper_limit=AUDIO_SEG_UPPER_LIMIT,
+    save_segments=SAVE_SEGMENT_FILES,
 ):
     """Splits audio into segments based on voice activity detection.
 
+    The audio is decoded once into a 16kHz PCM buffer which VAD, silence
+    splitting and segment slicing all read from, no temporary file is written.
+    The VAD timeline is cached, see `get_vad_timeline`, so splitting the same
+    audio again with other limits does not run VAD.
+    Each segment is also saved as a WAV file in `data/split_audio/<full_audio_id>`
+    unless `save_segments` is False. VAD spans longer than `upper_limit` are split
+    at silences and at their quietest points, read from the frame energy of the
+    whole audio computed once, see `FrameEnergy` and `split_long_span`.
+
     Args:
-        audio_data (bytes): Raw audio data
+        audio_data (bytes or numpy.ndarray): 16kHz WAV data or int16 PCM samples
         lower_limit (float): Minimum segment duration in seconds
         upper_limit (_type_): Maximum segment duration in seconds
         full_audio_id (str):  Identifier for the full audio file
+        save_segments (bool): Whether to write a WAV file per segment
 
     Returns:
-        dict: Mapping of segment IDs to raw audio data
+        SplitAudio: Mapping of segment IDs to segments referencing the decoded audio
     """
-
     logging.info(f"Splitting audio for {full_audio_id}")
-    split_audio = {}
-    temp_audio_file = "temp_audio_in_memory.wav"
-    with open(temp_audio_file, "wb") as f:
-        f.write(audio_data)
+    split_audio = SplitAudio()
+    sampling_rate = SAMPLE_RATE
+    audio_buffer = decode_audio_buffer(audio_data, sampling_rate)
 
-    output_folder = f"data/split_audio/{full_audio_id}"
-
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
-    # initialize vad pipeline
-    pipeline = initialize_vad_pipeline()
-    vad = pipeline(temp_audio_file)
-
-    original_audio_segment = AudioSegment.from_file(temp_audio_file)
-    original_audio_ndarray, sampling_rate = torchaudio.load(temp_audio_file)
-    original_audio_ndarray = original_audio_ndarray[0]
+    output_folder = None
+    if save_segments:
+        output_folder = f"data/split_audio/{full_audio_id}"
+        if not os.path.exists(output_folder):
+            os.makedirs(output_folder)
+    timeline = get_vad_timeline(audio_buffer, sampling_rate)
 
+    # Computed at the first VAD span too long to be a segment, if any
+    energy = None
     counter = 1
-    for vad_span in vad.get_timeline().support():
-        vad_segment = original_audio_segment[
-            sec_to_millis(vad_span.start) : sec_to_millis(vad_span.end)  # noqa: E203
-        ]
+    for vad_span in timeline:
         vad_span_length = vad_span.end - vad_span.start
         if lower_limit <= vad_span_length <= upper_limit:
-            segment_key = f"{full_audio_id}_{counter:04}"  # noqa: E231
-            split_audio[segment_key] = vad_segment.raw_data
-            save_segment(
-                segment=vad_segment,
-                folder=output_folder,
-                prefix=full_audio_id,
-                id=counter,
-                start_ms=sec_to_millis(vad_span.start),
-                end_ms=sec_to_millis(vad_span.end),
-            )
-            counter += 1
-        elif vad_span_length > upper_limit:
-            non_mute_segment_splits = librosa.effects.split(
-                original_audio_ndarray[
-                    int(
-                        sec_to_frame(vad_span.start, sampling_rate)
-                    ) : int(  # noqa: E203
-                        sec_to_frame(vad_span.end, sampling_rate)
-                    )
-                ],
-                top_db=30,
-            )
-            counter = process_non_mute_segments(
-                non_mute_segment_splits,
-                original_audio_segment,
-                vad_span,
+            add_segment(
+                split_audio,
+                audio_buffer,
+                vad_span.start,
+                vad_span.end,
                 sampling_rate,
-                lower_limit,
-                upper_limit,
                 full_audio_id,
                 output_folder,
                 counter,
-                split_audio,
             )
+            counter += 1
+        elif vad_span_length > upper_limit:
+            if energy is None:
+                energy = FrameEnergy(audio_buffer)
+            for start_sec, end_sec in split_long_span(
+                energy, vad_span, sampling_rate, lower_limit, upper_limit
+            ):
+                add_segment(
+                    split_audio,
+                    audio_buffer,
+                    start_sec,
+                    end_sec,
+                    sampling_rate,
+                    full_audio_id,
+                    output_folder,
+                    counter,
+                )
+                counter += 1
 
-    os.remove(temp_audio_file)
     logging.info(
         f"Finished splitting audio for {full_audio_id}. Total segments: {len(split_audio)}"
     )
+    increment(
+        "audio_seconds_total",
+        len(audio_buffer) / sampling_rate,
+        operation="get_split_audio",
+    )
+    increment("segments_total", len(split_audio))
     return split_audio
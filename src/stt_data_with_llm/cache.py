@@ -0,0 +1,184 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from stt_data_with_llm.config import CACHE_DIR
+
+
+def get_cache_dir():
+    """Returns the directory holding the on-disk caches.
+
+    The `STT_CACHE_DIR` environment variable overrides `CACHE_DIR` from the config.
+
+    Returns:
+        str: Cache directory
+    """
+    return os.getenv("STT_CACHE_DIR", CACHE_DIR)
+
+
+def make_cache_key(*parts):
+    """Hashes the given parts into a cache key.
+
+    Args:
+        *parts (str or bytes-like): Values identifying the cached content
+
+    Returns:
+        str: Hex SHA-256 digest of the parts
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        part = memoryview(part).cast("B")
+        digest.update(len(part).to_bytes(8, "little"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class SQLiteCache:
+    """Persistent key/value cache stored in SQLite with size based LRU eviction.
+
+    Args:
+        path (str): Path of the SQLite database file
+        max_bytes (int): Maximum total size of the cached values, least recently
+            used entries are evicted beyond it
+    """
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = None
+        self._pid = None
+        self._size_bytes = 0
+
+    def _connect(self):
+        if self._connection is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._connection = sqlite3.connect(
+                self.path, timeout=30, check_same_thread=False
+            )
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._connection.commit()
+            self._pid = os.getpid()
+            self._size_bytes = self._total_size()
+        return self._connection
+
+    def _total_size(self):
+        (size,) = self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+        return size
+
+    def get(self, key):
+        """Returns the value cached under `key`, or None on a miss."""
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute(
+                "SELECT value FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            connection.execute(
+                "UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            connection.commit()
+            return row[0]
+
+    def set(self, key, value):
+        """Caches `value` under `key`, evicting old entries if the cache is full."""
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            connection = self._connect()
+            previous = connection.execute(
+                "SELECT size FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            connection.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time()),
+            )
+            self._size_bytes += size - (previous[0] if previous else 0)
+            if self._size_bytes > self.max_bytes:
+                self._evict()
+            connection.commit()
+
+    def _evict(self):
+        # Other processes may have written to the cache, start from the real size.
+        self._size_bytes = self._total_size()
+        rows = self._connection.execute(
+            "SELECT key, size FROM entries ORDER BY last_access"
+        )
+        evicted_keys = []
+        for key, size in rows:
+            if self._size_bytes <= self.max_bytes:
+                break
+            evicted_keys.append((key,))
+            self._size_bytes -= size
+        self._connection.executemany("DELETE FROM entries WHERE key = ?", evicted_keys)
+        logging.info(f"Evicted {len(evicted_keys)} entries from {self.path}")
+
+    def stats(self):
+        """Returns the hit/miss counters of this process and the cache size.
+
+        Returns:
+            dict: "hits", "misses", "entries" and "size_bytes"
+        """
+        with self._lock:
+            connection = self._connect()
+            (entries,) = connection.execute("SELECT COUNT(*) FROM entries").fetchone()
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": entries,
+                "size_bytes": self._total_size(),
+            }
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None and self._pid == os.getpid():
+                self._connection.close()
+            self._connection = None
+
+
+# Open caches of the process, keyed by name.
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(name, max_bytes):
+    """Returns the persistent cache called `name`, opening it on first use.
+
+    Args:
+        name (str): Name of the cache, used as the database file name
+        max_bytes (int): Maximum total size of the cached values
+
+    Returns:
+        SQLiteCache: The cache stored in `<cache dir>/<name>.sqlite`
+    """
+    path = os.path.join(get_cache_dir(), f"{name}.sqlite")
+    with _caches_lock:
+        cache = _caches.get(name)
+        if cache is None or cache.path != path:
+            cache = _caches[name] = SQLiteCache(path, max_bytes)
+        return cache
+
+
+def reset_caches():
+    """Closes every open cache, they are reopened on next use."""
+    with _caches_lock:
+        for cache in _caches.values():
+            cache.close()
+        _caches.clear()
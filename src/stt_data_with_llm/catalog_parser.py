@@ -1,91 +1,207 @@
 import logging
+import os
+
+from stt_data_with_llm.config import CATALOG_CHUNK_SIZE
+
+# Catalog entry field and the spreadsheet column it is read from
+CATALOG_COLUMNS = {
+    "full_audio_id": "ID",
+    "sr_no": "Sr.no",
+    "audio_url": "Audio URL",
+    "reference_transcript": "Audio Text",
+    "speaker_name": "Speaker Name",
+    "speaker_gender": "Speaker Gender",
+    "news_channel": "News Channel",
+    "publishing_year": "Publishing Year",
+}
+# Extensions of the local catalog files, any other source without a path separator
+# is a Google Spreadsheet ID
+CATALOG_EXTENSIONS = (".csv", ".parquet", ".jsonl", ".ndjson")
+
+
+def get_spreadsheet_url(sheet_id):
+    """
+    Returns the CSV export URL of a Google Spreadsheet.
+
+    Args:
+        sheet_id (str): The ID of the Google Spreadsheet.
+
+    Returns:
+        str: URL serving the first sheet as CSV
+    """
+    return (
+        f"https://docs.google.com/spreadsheets/d/{sheet_id}/gviz/tq?tqx=out:csv"  # noqa
+    )
 
-import pandas as pd
 
-from stt_data_with_llm.util import setup_logging
+def _read_parquet_chunks(path, chunk_size):
+    import pyarrow.parquet as pq
 
-# Call the setup_logging function at the beginning of your script
-setup_logging("catalog_parse.log")
+    offset = 0
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+        chunk = batch.to_pandas()
+        chunk.index = range(offset, offset + len(chunk))
+        offset += len(chunk)
+        yield chunk
 
 
-def read_spreadsheet(sheet_id):
+def read_catalog_chunks(source, chunk_size=CATALOG_CHUNK_SIZE):
     """
-    Reads a Google Spreadsheet as a Pandas DataFrame without mixing rows and headers.
+    Reads a catalog as an iterator of DataFrames of at most `chunk_size` rows.
+
+    Local `.csv`, `.parquet` and `.jsonl` files are read from disk. A source that
+    is neither an existing file, nor has a catalog extension or a path separator is
+    treated as a Google Spreadsheet ID. Row labels keep counting across chunks, so
+    they match the labels of the catalog read in one go.
 
     Args:
-        sheet_id (str): The ID of the Google Spreadsheet.
+        source (str): Path of a local catalog file or ID of a Google Spreadsheet
+        chunk_size (int): Number of rows per chunk
+
+    Yields:
+        pd.DataFrame: Consecutive rows of the catalog
+
+    Raises:
+        FileNotFoundError: If the source is a local catalog path that does not exist
+    """
+    import pandas as pd
+
+    source = str(source)
+    extension = os.path.splitext(source)[1].lower()
+    is_local = (
+        os.path.isfile(source)
+        or extension in CATALOG_EXTENSIONS
+        or os.sep in source
+        or "/" in source
+    )
+    if is_local and not os.path.isfile(source):
+        raise FileNotFoundError(f"Catalog file not found: {source}")
+    if not is_local:
+        chunks = pd.read_csv(
+            get_spreadsheet_url(source),
+            header=0,
+            encoding="utf-8",
+            chunksize=chunk_size,
+        )
+    elif extension == ".csv":
+        chunks = pd.read_csv(source, header=0, encoding="utf-8", chunksize=chunk_size)
+    elif extension == ".parquet":
+        chunks = _read_parquet_chunks(source, chunk_size)
+    elif extension in (".jsonl", ".ndjson"):
+        chunks = pd.read_json(
+            source, lines=True, dtype=False, encoding="utf-8", chunksize=chunk_size
+        )
+    else:
+        raise ValueError(f"Unsupported catalog file format: {source}")
+
+    with_headers = False
+    for chunk in chunks:
+        if not with_headers:
+            logging.info("Catalog successfully opened.")
+            logging.info(f"Headers: {chunk.columns.tolist()}")
+            with_headers = True
+        yield chunk
+
+
+def parse_catalog_chunk(catalog_df):
+    """
+    Converts catalog rows to entries column by column.
+
+    Missing columns and empty cells become empty strings.
+
+    Args:
+        catalog_df (pd.DataFrame): Catalog rows
 
     Returns:
-        pd.DataFrame: A cleaned DataFrame with rows and headers properly separated.
+        list of tuple: (row label, entry dict) pairs in row order
     """
-    url = (
-        f"https://docs.google.com/spreadsheets/d/{sheet_id}/gviz/tq?tqx=out:csv"  # noqa
+    columns = []
+    for column_name in CATALOG_COLUMNS.values():
+        if column_name not in catalog_df:
+            columns.append([""] * len(catalog_df))
+            continue
+        column = catalog_df[column_name]
+        columns.append(column.astype(object).where(column.notna(), "").tolist())
+
+    missing_ids = columns[0].count("")
+    if missing_ids:
+        logging.warning(f"{missing_ids} rows missing 'ID'")
+
+    fields = tuple(CATALOG_COLUMNS)
+    return list(
+        zip(
+            map(str, catalog_df.index),
+            (dict(zip(fields, values)) for values in zip(*columns)),
+        )
     )
-    try:
-        # Read the CSV data from the Google Spreadsheet
-        df = pd.read_csv(url, header=0, encoding="utf-8")
-        # Log basic information about the DataFrame
-        logging.info("Spreadsheet successfully read.")
-        logging.info(f"Headers: {df.columns.tolist()}")
 
-        return df
-    except Exception as e:
-        logging.error(f"Error reading spreadsheet: {e}")
-        return pd.DataFrame()
 
+def _parse_catalog_rows(catalog_df):
+    """Parses catalog rows one at a time, skipping the rows that fail."""
+    entries = []
+    for position in range(len(catalog_df)):
+        try:
+            row_df = catalog_df.iloc[position : position + 1]  # noqa: E203
+            entries += parse_catalog_chunk(row_df)
+        except Exception as e:
+            logging.error(
+                f"Error parsing catalog row {catalog_df.index[position]}: {e}"
+            )
+    return entries
+
+
+def iter_catalog(source, chunk_size=CATALOG_CHUNK_SIZE):
+    """
+    Parses a catalog lazily, holding at most one chunk of rows in memory.
+
+    A chunk that fails to parse is parsed again row by row, so only its bad rows
+    are lost.
+
+    Args:
+        source (str): Path of a local catalog file or ID of a Google Spreadsheet
+        chunk_size (int): Number of rows parsed at a time
+
+    Yields:
+        tuple: (row label, entry dict) pairs with the same schema as `parse_catalog`
+    """
+    for catalog_df in read_catalog_chunks(source, chunk_size):
+        try:
+            entries = parse_catalog_chunk(catalog_df)
+        except Exception as e:
+            logging.error(f"Error parsing catalog chunk: {e}, parsing it row by row")
+            entries = _parse_catalog_rows(catalog_df)
+        yield from entries
 
-def parse_catalog(google_sheet_id):
+
+def parse_catalog(google_sheet_id, chunk_size=CATALOG_CHUNK_SIZE):
     """
-    Parses an audio transcription catalog from a Google Spreadsheet.
+    Parses an audio transcription catalog from a Google Spreadsheet or a local file.
 
     Args:
-        audio_url (str): The URL of the Google Spreadsheet containing the audio transcription catalog.
+        google_sheet_id (str): The ID of the Google Spreadsheet containing the audio
+            transcription catalog, or the path of a local CSV, Parquet or JSONL catalog.
+        chunk_size (int): Number of rows parsed at a time
 
     Returns:
         dict: A dictionary where keys are unique IDs (e.g., "full_audio_id") and values are dictionaries of audio data.
+
+    Raises:
+        FileNotFoundError: If the catalog is a local path that does not exist
     """
-    catalog_df = read_spreadsheet(google_sheet_id)
+    audio_transcription_catalog = {}
+    try:
+        for data_id, audio_data_info in iter_catalog(google_sheet_id, chunk_size):
+            audio_transcription_catalog[data_id] = audio_data_info
+    except FileNotFoundError:
+        raise
+    except Exception as e:
+        # Keep the entries read before the error.
+        logging.error(f"Error reading catalog: {e}")
 
-    # Check if the catalog DataFrame is empty
-    if catalog_df.empty:
+    # Check if the catalog is empty
+    if not audio_transcription_catalog:
         logging.warning("Catalog DataFrame is empty.")
         return {}
 
-    audio_transcription_catalog = {}
-
-    for index, row in catalog_df.iterrows():
-        try:
-            full_audio_id = row.get("ID", "")
-            if not full_audio_id:
-                logging.warning(f"Row missing 'ID': {row.to_dict()}")
-
-            audio_transcription_catalog[str(index)] = {
-                "full_audio_id": full_audio_id if not pd.isna(full_audio_id) else "",
-                "sr_no": row.get("Sr.no", "")
-                if not pd.isna(row.get("Sr.no", ""))
-                else "",
-                "audio_url": row.get("Audio URL", "")
-                if not pd.isna(row.get("Audio URL", ""))
-                else "",
-                "reference_transcript": row.get("Audio Text", "")
-                if not pd.isna(row.get("Audio Text", ""))
-                else "",
-                "speaker_name": row.get("Speaker Name", "")
-                if not pd.isna(row.get("Speaker Name", ""))
-                else "",
-                "speaker_gender": row.get("Speaker Gender", "")
-                if not pd.isna(row.get("Speaker Gender", ""))
-                else "",
-                "news_channel": row.get("News Channel", "")
-                if not pd.isna(row.get("News Channel", ""))
-                else "",
-                "publishing_year": row.get("Publishing Year", "")
-                if not pd.isna(row.get("Publishing Year", ""))
-                else "",
-            }
-
-        except Exception as e:
-            logging.error(f"Error processing row: {row.to_dict()}. Error: {e}")
-
     logging.info(f"Parsed {len(audio_transcription_catalog)} entries from the catalog.")
     return audio_transcription_catalog
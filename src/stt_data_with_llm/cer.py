@@ -0,0 +1,214 @@
+import math
+import re
+
+# Same normalisation as the "cer" metric of evaluate: collapse runs of
+# whitespace into a single space and strip both ends.
+_MULTIPLE_SPACES = re.compile(r"\s\s+")
+
+
+def normalize_cer_text(text):
+    """Normalizes whitespace the way the evaluate/jiwer CER metric does.
+
+    Args:
+        text (str): Transcript
+
+    Returns:
+        str: Transcript with whitespace runs collapsed and ends stripped
+    """
+    return _MULTIPLE_SPACES.sub(" ", text).strip()
+
+
+def levenshtein_distance(source, target, max_distance=None):
+    """Computes the edit distance between two strings over code points.
+
+    Uses the bit-parallel algorithm of Myers/Hyyrö: each column of the dynamic
+    programming matrix is a pair of bit vectors, so a step costs a few integer
+    operations whatever the length of the shorter string.
+
+    Args:
+        source (str): First string
+        target (str): Second string
+        max_distance (int, optional): Stop as soon as the distance is known to
+            exceed this bound
+
+    Returns:
+        int: The edit distance, or `max_distance + 1` if it exceeds `max_distance`
+    """
+    if len(source) > len(target):
+        source, target = target, source
+    pattern_length, text_length = len(source), len(target)
+    if max_distance is not None and text_length - pattern_length > max_distance:
+        return max_distance + 1
+    if not pattern_length:
+        return text_length
+
+    peq = {}
+    for index, char in enumerate(source):
+        peq[char] = peq.get(char, 0) | (1 << index)
+    all_ones = (1 << pattern_length) - 1
+    last_bit = 1 << (pattern_length - 1)
+    positive_vertical, negative_vertical = all_ones, 0
+    score = pattern_length
+    for position, char in enumerate(target, 1):
+        eq = peq.get(char, 0)
+        x_vertical = eq | negative_vertical
+        x_horizontal = (
+            ((eq & positive_vertical) + positive_vertical) ^ positive_vertical
+        ) | eq
+        positive_horizontal = negative_vertical | (
+            all_ones & ~(x_horizontal | positive_vertical)
+        )
+        negative_horizontal = positive_vertical & x_horizontal
+        if positive_horizontal & last_bit:
+            score += 1
+        elif negative_horizontal & last_bit:
+            score -= 1
+        # The remaining characters can lower the score by at most one each.
+        if max_distance is not None and score - (text_length - position) > max_distance:
+            return max_distance + 1
+        positive_horizontal = ((positive_horizontal << 1) | 1) & all_ones
+        negative_horizontal = (negative_horizontal << 1) & all_ones
+        positive_vertical = negative_horizontal | (
+            all_ones & ~(x_vertical | positive_horizontal)
+        )
+        negative_vertical = positive_horizontal & x_vertical
+    return score
+
+
+def prefix_levenshtein_distance(pattern, text):
+    """Aligns a string with the best matching prefix of another one.
+
+    Same bit-parallel recurrence as `levenshtein_distance` with `pattern` as the
+    bit vectors, the score after each character of `text` is the edit distance
+    between `pattern` and that prefix of `text`.
+
+    Args:
+        pattern (str): String aligned in full, e.g. a partial transcript
+        text (str): String whose prefix is matched, e.g. the full reference
+
+    Returns:
+        tuple: (smallest edit distance, length of the matching prefix of `text`),
+            the longest prefix wins ties
+    """
+    pattern_length = len(pattern)
+    # The distance to a prefix longer than twice the pattern exceeds the
+    # distance to the empty prefix.
+    text = text[: 2 * pattern_length]  # noqa: E203
+    if not pattern_length:
+        return 0, 0
+
+    peq = {}
+    for index, char in enumerate(pattern):
+        peq[char] = peq.get(char, 0) | (1 << index)
+    all_ones = (1 << pattern_length) - 1
+    last_bit = 1 << (pattern_length - 1)
+    positive_vertical, negative_vertical = all_ones, 0
+    score = pattern_length
+    best_distance, best_length = score, 0
+    for position, char in enumerate(text, 1):
+        eq = peq.get(char, 0)
+        x_vertical = eq | negative_vertical
+        x_horizontal = (
+            ((eq & positive_vertical) + positive_vertical) ^ positive_vertical
+        ) | eq
+        positive_horizontal = negative_vertical | (
+            all_ones & ~(x_horizontal | positive_vertical)
+        )
+        negative_horizontal = positive_vertical & x_horizontal
+        if positive_horizontal & last_bit:
+            score += 1
+        elif negative_horizontal & last_bit:
+            score -= 1
+        if score <= best_distance:
+            best_distance, best_length = score, position
+        positive_horizontal = ((positive_horizontal << 1) | 1) & all_ones
+        negative_horizontal = (negative_horizontal << 1) & all_ones
+        positive_vertical = negative_horizontal | (
+            all_ones & ~(x_vertical | positive_horizontal)
+        )
+        negative_vertical = positive_horizontal & x_vertical
+    return best_distance, best_length
+
+
+def calculate_prefix_cer(reference, prediction):
+    """Calculates the CER of a partial prediction against the matching reference prefix.
+
+    The prediction covers an unknown part of the start of the reference, it is
+    aligned with the reference prefix it matches best and the CER is taken over
+    that prefix.
+
+    Args:
+        reference (str): Full reference transcript
+        prediction (str): Transcript of the start of the audio
+
+    Returns:
+        float: The CER between 0.0 and 1.0, 1.0 when nothing matches
+    """
+    reference = normalize_cer_text(reference)
+    prediction = normalize_cer_text(prediction)
+    if not prediction:
+        return 0.0 if not reference else 1.0
+    distance, prefix_length = prefix_levenshtein_distance(prediction, reference)
+    if not prefix_length:
+        return 1.0
+    return min(distance / prefix_length, 1.0)
+
+
+def max_errors_for_cer(reference_length, max_cer):
+    """Returns the largest number of edits whose CER stays within `max_cer`.
+
+    Args:
+        reference_length (int): Number of characters of the reference
+        max_cer (float): CER bound
+
+    Returns:
+        int: Largest `d` such that `d / reference_length <= max_cer`
+    """
+    max_errors = math.floor(max_cer * reference_length)
+    # Guard against floating point rounding of the product in both directions.
+    while (max_errors + 1) / reference_length <= max_cer:
+        max_errors += 1
+    while max_errors > 0 and max_errors / reference_length > max_cer:
+        max_errors -= 1
+    return max_errors
+
+
+def calculate_cer(reference, prediction, max_cer=None):
+    """Calculates the Character Error Rate of a prediction against a reference.
+
+    Gives the same value as the evaluate "cer" metric, capped at 1.0.
+
+    Args:
+        reference (str): Reference transcript, its length is the denominator
+        prediction (str): Predicted transcript
+        max_cer (float, optional): Stop early once the CER is known to exceed this
+            bound, a value greater than `max_cer` (but not the exact CER) is then
+            returned
+
+    Returns:
+        float: The CER between 0.0 and 1.0, 1.0 for an empty reference
+    """
+    reference = normalize_cer_text(reference)
+    prediction = normalize_cer_text(prediction)
+    if not reference:
+        return 1.0
+    max_distance = None
+    if max_cer is not None:
+        max_distance = max_errors_for_cer(len(reference), max_cer)
+    distance = levenshtein_distance(reference, prediction, max_distance)
+    return min(distance / len(reference), 1.0)
+
+
+def calculate_cers(pairs, max_cer=None):
+    """Calculates the CER of many (reference, prediction) pairs.
+
+    Args:
+        pairs (iterable of tuple): (reference, prediction) pairs
+        max_cer (float, optional): Early exit bound, see `calculate_cer`
+
+    Returns:
+        list of float: The CER of every pair, in order
+    """
+    return [
+        calculate_cer(reference, prediction, max_cer) for reference, prediction in pairs
+    ]
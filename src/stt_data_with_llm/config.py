@@ -1,11 +1,44 @@
 # Catalog Parser
 MAX_BYTES = 1024 * 1024
 BACKUP_COUNT = 5
+# Rows read at a time from a catalog source
+CATALOG_CHUNK_SIZE = 50_000
 
 
+# On-disk caches, the STT_CACHE_DIR environment variable overrides the directory
+CACHE_DIR = "data/cache"
+# Checkpoints of the pipeline stages completed for each audio and segment
+MANIFEST_PATH = "data/manifest.sqlite"
+
+# Output dataset, segments are appended to "tar" (WebDataset) or "parquet" shards
+DATASET_DIR = "data/dataset"
+DATASET_SHARD_FORMAT = "tar"
+DATASET_MAX_SHARD_BYTES = 512 * 1024 * 1024
+# Number of audios waiting for the background dataset writer before saving blocks
+DATASET_WRITER_QUEUE_SIZE = 16
+
 # Audio Segmentation
 AUDIO_SEG_UPPER_LIMIT = 8
 AUDIO_SEG_LOWER_LIMIT = 2
+# VAD spans longer than AUDIO_SEG_UPPER_LIMIT are split at silences, frames of
+# ENERGY_FRAME_LENGTH samples every ENERGY_HOP_LENGTH samples (it must divide the
+# frame length) more than NON_MUTE_TOP_DB below the loudest frame of the span are silent
+ENERGY_FRAME_LENGTH = 2048
+ENERGY_HOP_LENGTH = 512
+NON_MUTE_TOP_DB = 30
+# Non-silent stretches still too long are chopped in equal chunks, each cut moved to
+# the quietest frame within CHOP_SEARCH_SECONDS of it as long as the chunks stay
+# within the segment duration limits
+CHOP_SEARCH_SECONDS = 1.0
+# Whether get_split_audio writes every segment to data/split_audio/<id> as a WAV file
+SAVE_SEGMENT_FILES = True
+
+# Voice Activity Detection
+VAD_MODEL_ID = "pyannote/voice-activity-detection"
+VAD_LOCAL_MODEL_PATH = "tests/pyannote_vad_model"
+# Maximum size of the cached VAD timelines, keyed by audio, model id and
+# HYPER_PARAMETERS, so re-running the segmentation with new limits skips the VAD
+VAD_CACHE_MAX_BYTES = 64 * 1024 * 1024
 
 
 HYPER_PARAMETERS = {
@@ -37,12 +70,130 @@ AUDIO_HEADERS = {
     "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36 Edg/129.0.0.0",  # noqa: E501
 }
 
+# Audio download
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# Maximum number of audios downloaded ahead of the worker processes of the catalog
+# runner, and at the same time by `prefetch_audios`
+DOWNLOAD_MAX_WORKERS = 4
+# Number of attempts of a download, each attempt resumes the partial file
+DOWNLOAD_ATTEMPTS = 3
+DOWNLOAD_TIMEOUT = 60
+# Seconds to connect to the inference endpoint and to wait for its response
+INFERENCE_TIMEOUT = 120
+
+# Audio decoding, number of bytes of 16kHz PCM read from ffmpeg at a time
+DECODE_CHUNK_SIZE = 1024 * 1024
+
+# Catalog runner, number of audios processed in parallel worker processes (1 runs
+# them one after another in the current process)
+PIPELINE_WORKERS = 1
+# Start method of the worker processes, None uses the multiprocessing default
+PIPELINE_START_METHOD = None
+# Torch intra-op threads of each worker so parallel workers do not oversubscribe cores
+WORKER_TORCH_THREADS = 1
+
+# Staged runner used with a single process, each stage runs on its own threads so
+# an audio is downloaded and segmented while the previous one is transcribed and
+# corrected. Threads per stage, segmentation shares one VAD pipeline so keep it at 1.
+STAGE_WORKERS = {
+    "download": 2,
+    "segment": 1,
+    "transcribe": 2,
+    "validate": 1,
+    "correct": 2,
+}
+# Audios waiting in front of each stage before the previous stage blocks
+STAGE_QUEUE_SIZE = 2
+# Seconds between two logs of the stage queue depths
+STAGE_LOG_INTERVAL = 60
+
+# Metrics of the pipeline operations, written at the end of a run as Prometheus text,
+# or as JSON when the path ends with ".json". None disables the export.
+METRICS_PATH = "data/metrics.prom"
+# Upper bounds in seconds of the operation latency histogram buckets
+METRICS_LATENCY_BUCKETS = (0.005, 0.025, 0.1, 0.5, 1, 2.5, 10, 30, 120, 600)
+# JSON lines file receiving a timing summary per audio, None disables the traces
+TRACE_PATH = None
+
 # Inferfence
 SAMPLE_RATE = 16000
 CHANNELS = 1
 SAMPLE_WIDTH = 2
 
 API_URL = "https://wpgzw4at8o6876h0.us-east-1.aws.endpoints.huggingface.cloud"
+# Maximum number of segments sent to the inference endpoint at the same time
+INFERENCE_MAX_IN_FLIGHT = 8
+# Maximum size of the cached segment transcripts
+INFERENCE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Segmentation transfer, transcripts longer than TRANSFER_WINDOW_CHARS are aligned
+# in windows cut at exact matches of TRANSFER_ANCHOR_CHARS characters, with
+# TRANSFER_WORKERS windows aligned at the same time
+TRANSFER_WINDOW_CHARS = 2000
+TRANSFER_ANCHOR_CHARS = 16
+TRANSFER_WORKERS = 4
 
 # Validation
 CER_THRESHOLD = 0.4
+# Early rejection, the first segments of an audio are transcribed before the others
+# and the audio is rejected without transcribing the rest when their CER against
+# the matching start of the reference exceeds CER_THRESHOLD + EARLY_REJECT_MARGIN.
+# 0 segments disables it.
+EARLY_REJECT_SAMPLE_SEGMENTS = 8
+EARLY_REJECT_MARGIN = 0.2
+# Minimum number of transcribed characters needed to reject an audio early
+EARLY_REJECT_MIN_CHARS = 50
+
+# Local correction, valid segments whose syllables all align with a reference
+# syllable of at most this character error rate take the reference spelling
+# without calling the LLM. None sends every segment to the LLM.
+LOCAL_CORRECTION_MAX_SYLLABLE_CER = 0.5
+
+# LLM post correction
+LLM_MODEL = "claude-3-5-sonnet-20241022"
+LLM_MAX_TOKENS = 1000
+# Number of segments corrected by a single multi-segment prompt
+LLM_BATCH_SIZE = 20
+# Output tokens budgeted for each segment of a multi-segment prompt, a fixed JSON
+# overhead plus tokens per character of its text, Tibetan takes several per character
+LLM_BATCH_SEGMENT_TOKENS = 40
+LLM_BATCH_TOKENS_PER_CHAR = 3
+# Largest max_tokens of a multi-segment request, the output limit of the model.
+# Segments are grouped so that their budgets fit in it.
+LLM_BATCH_MAX_TOKENS = 8192
+# Seconds between two status checks of a submitted Message Batch
+LLM_BATCH_POLL_INTERVAL = 30
+# Maximum size of the cached corrections
+LLM_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Client side rate limits of the remote endpoints, shared by the threads of a
+# process and split between the worker processes. Requests are paced by a token
+# bucket of `requests_per_second` and `burst`, and the concurrency adapts between
+# `min_concurrency` and `max_concurrency`, it is halved on 429/503/529 responses and
+# lowered when requests take longer than `target_latency` seconds.
+RATE_LIMITS = {
+    "inference": {
+        "requests_per_second": 20,
+        "burst": 2 * INFERENCE_MAX_IN_FLIGHT,
+        "max_concurrency": INFERENCE_MAX_IN_FLIGHT,
+        "target_latency": 30,
+    },
+    "llm": {
+        "requests_per_second": 0.8,
+        "burst": 4,
+        "max_concurrency": 4,
+        "target_latency": 120,
+    },
+}
+# Maximum number of attempts of a request failing with a 429, a 5xx or a
+# connection error
+RETRY_ATTEMPTS = 5
+# Retries wait a random delay up to RETRY_BACKOFF_BASE * 2 ** retry seconds, at most
+# RETRY_BACKOFF_MAX, or the Retry-After of the response when longer
+RETRY_BACKOFF_BASE = 1
+RETRY_BACKOFF_MAX = 60
+# Every successful request earns RETRY_BUDGET_RATIO retries and RETRY_BUDGET_MIN
+# retries are available from the start, so retries stay a fraction of the traffic
+# while an endpoint is down
+RETRY_BUDGET_RATIO = 0.2
+RETRY_BUDGET_MIN = 10
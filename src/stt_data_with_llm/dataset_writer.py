@@ -0,0 +1,399 @@
+import io
+import json
+import logging
+import os
+import queue
+import re
+import tarfile
+import threading
+import time
+
+from stt_data_with_llm.audio_parser import encode_wav, pcm_buffer
+from stt_data_with_llm.catalog_parser import CATALOG_COLUMNS
+from stt_data_with_llm.config import (
+    DATASET_DIR,
+    DATASET_MAX_SHARD_BYTES,
+    DATASET_SHARD_FORMAT,
+    DATASET_WRITER_QUEUE_SIZE,
+    SAMPLE_RATE,
+    SAMPLE_WIDTH,
+)
+
+SHARD_FORMATS = ("tar", "parquet")
+INDEX_FILENAME = "index.jsonl"
+# Catalog fields copied to every segment record, as strings
+METADATA_FIELDS = tuple(
+    field
+    for field in CATALOG_COLUMNS
+    if field not in ("full_audio_id", "reference_transcript")
+)
+TEXT_FIELDS = (
+    "full_audio_id",
+    "inference_transcript",
+    "reference_transcript",
+    "LLM_corrected_text",
+)
+
+
+def build_segment_records(post_processed_audio_transcript_pairs, audio_data_info):
+    """Turns the post processed segments of an audio into dataset records.
+
+    Args:
+        post_processed_audio_transcript_pairs (dict): Segment data and texts by
+            segment id, as returned by `post_process_audio_transcript_pairs`
+        audio_data_info (dict): Catalog entry of the audio
+
+    Returns:
+        list of dict: One record per segment with its "key", "audio" PCM, texts,
+            "duration" in seconds and catalog metadata. The audio is only encoded
+            as WAV when its shard is written.
+    """
+    metadata = {
+        field: str(audio_data_info.get(field, "") or "") for field in METADATA_FIELDS
+    }
+    records = []
+    for segment_id, pair in post_processed_audio_transcript_pairs.items():
+        audio_seg_data = pair["audio_seg_data"]
+        records.append(
+            {
+                "key": segment_id,
+                "audio": audio_seg_data,
+                "full_audio_id": str(audio_data_info.get("full_audio_id", "")),
+                "inference_transcript": pair["inference_transcript"],
+                "reference_transcript": pair["reference_transcript"],
+                "LLM_corrected_text": pair["LLM_corrected_text"],
+                "duration": len(pcm_buffer(audio_seg_data))
+                / (SAMPLE_RATE * SAMPLE_WIDTH),
+                **metadata,
+            }
+        )
+    return records
+
+
+class _TarShard:
+    """WebDataset style tar shard, each record is a `<key>.wav` and `<key>.json` pair."""
+
+    extension = ".tar"
+
+    def __init__(self, path):
+        self.path = path
+        self._tar = tarfile.open(path, "w", format=tarfile.PAX_FORMAT)
+        self._mtime = int(time.time())
+
+    @property
+    def size(self):
+        return self._tar.offset
+
+    def _add_member(self, name, data):
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = self._mtime
+        header = info.tobuf(self._tar.format, self._tar.encoding, self._tar.errors)
+        offset = self._tar.offset + len(header)
+        self._tar.addfile(info, io.BytesIO(data))
+        return offset
+
+    def add_records(self, records):
+        entries = []
+        for record in records:
+            fields = {name: value for name, value in record.items() if name != "audio"}
+            text = json.dumps(fields, ensure_ascii=False).encode("utf-8")
+            audio = encode_wav(record["audio"])
+            audio_offset = self._add_member(f"{record['key']}.wav", audio)
+            json_offset = self._add_member(f"{record['key']}.json", text)
+            entries.append(
+                {
+                    "audio_offset": audio_offset,
+                    "audio_size": len(audio),
+                    "json_offset": json_offset,
+                    "json_size": len(text),
+                }
+            )
+        return entries
+
+    def close(self):
+        self._tar.close()
+
+
+class _ParquetShard:
+    """Parquet shard with a binary audio column, each written batch is a row group."""
+
+    extension = ".parquet"
+
+    def __init__(self, path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.path = path
+        self._pa = pa
+        self._schema = pa.schema(
+            [("key", pa.string()), ("audio", pa.binary())]
+            + [(field, pa.string()) for field in TEXT_FIELDS]
+            + [("duration", pa.float64())]
+            + [(field, pa.string()) for field in METADATA_FIELDS]
+        )
+        self._writer = pq.ParquetWriter(path, self._schema)
+        self._row_groups = 0
+
+    @property
+    def size(self):
+        return os.path.getsize(self.path)
+
+    def add_records(self, records):
+        if not records:
+            return []
+        table = self._pa.Table.from_pylist(
+            [dict(record, audio=encode_wav(record["audio"])) for record in records],
+            schema=self._schema,
+        )
+        self._writer.write_table(table, row_group_size=len(records))
+        row_group = self._row_groups
+        self._row_groups += 1
+        return [{"row_group": row_group, "row": row} for row in range(len(records))]
+
+    def close(self):
+        self._writer.close()
+
+
+_SHARD_CLASSES = {"tar": _TarShard, "parquet": _ParquetShard}
+
+
+class ShardedDatasetWriter:
+    """Appends segment records to size bounded shards from a background thread.
+
+    Records are written to `shard-<number>.<format>` files in `output_dir`. A shard
+    is written under a temporary name and renamed once it reaches `max_shard_bytes`
+    or the writer is closed, its records are then appended to `index.jsonl` with
+    their shard and position for random access. Writing an audio again, e.g. after
+    rerunning the correction, replaces its earlier records in the index, see
+    `latest_index_entries`, their stale copies stay in the older shards. Callbacks
+    passed to `write` run once the shard holding their records is complete, a shard
+    interrupted by a crash is discarded on the next start.
+
+    Args:
+        output_dir (str): Directory of the dataset
+        shard_format (str): "tar" for WebDataset style shards or "parquet"
+        max_shard_bytes (int): Size after which a new shard is started
+        queue_size (int): Number of pending `write` calls before `write` blocks
+    """
+
+    def __init__(
+        self,
+        output_dir=DATASET_DIR,
+        shard_format=DATASET_SHARD_FORMAT,
+        max_shard_bytes=DATASET_MAX_SHARD_BYTES,
+        queue_size=DATASET_WRITER_QUEUE_SIZE,
+    ):
+        if shard_format not in SHARD_FORMATS:
+            raise ValueError(f"Unsupported shard format: {shard_format}")
+        self.output_dir = output_dir
+        self.shard_format = shard_format
+        self.max_shard_bytes = max_shard_bytes
+        self.num_records = 0
+        self.num_shards = 0
+        self._shard_class = _SHARD_CLASSES[shard_format]
+        self._shard = None
+        self._shard_name = None
+        self._shard_entries = []
+        self._shard_callbacks = []
+        self._error = None
+        self._closed = False
+
+        os.makedirs(output_dir, exist_ok=True)
+        shard_numbers = [-1]
+        for filename in os.listdir(output_dir):
+            if filename.endswith(".tmp"):
+                logging.warning(f"Removing incomplete shard {filename}")
+                os.remove(os.path.join(output_dir, filename))
+            match = re.fullmatch(r"shard-(\d+)\.\w+", filename)
+            if match:
+                shard_numbers.append(int(match.group(1)))
+        self._next_shard_number = max(shard_numbers) + 1
+
+        self._queue = queue.Queue(queue_size)
+        self._thread = threading.Thread(
+            target=self._run, name="dataset-writer", daemon=True
+        )
+        self._thread.start()
+
+    def write(self, records, on_durable=None):
+        """Queues records for writing.
+
+        Args:
+            records (list of dict): Records built by `build_segment_records`
+            on_durable (callable, optional): Called without arguments once every
+                record is in a complete shard listed in the index
+
+        Raises:
+            Exception: The error that stopped the background writer, if any
+        """
+        if self._closed:
+            raise ValueError("Dataset writer is closed")
+        self._raise_error()
+        self._queue.put((records, on_durable))
+
+    def close(self):
+        """Completes the current shard and stops the background writer.
+
+        Raises:
+            Exception: The error that stopped the background writer, if any
+        """
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join()
+        self._raise_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if self._error is not None:
+                continue
+            try:
+                self._append(*item)
+            except Exception as e:
+                logging.exception(f"Dataset writer failed: {e}")
+                self._error = e
+        if self._error is None:
+            try:
+                self._complete_shard()
+            except Exception as e:
+                logging.exception(f"Dataset writer failed: {e}")
+                self._error = e
+
+    def _append(self, records, on_durable):
+        if self._shard is None:
+            self._shard_name = (
+                f"shard-{self._next_shard_number:06}{self._shard_class.extension}"
+            )
+            self._next_shard_number += 1
+            self._shard = self._shard_class(
+                os.path.join(self.output_dir, f"{self._shard_name}.tmp")
+            )
+        for record, entry in zip(records, self._shard.add_records(records)):
+            self._shard_entries.append(
+                {
+                    "key": record["key"],
+                    "full_audio_id": record["full_audio_id"],
+                    "shard": self._shard_name,
+                    **entry,
+                }
+            )
+        if on_durable is not None:
+            self._shard_callbacks.append(on_durable)
+        self.num_records += len(records)
+        if self._shard.size >= self.max_shard_bytes:
+            self._complete_shard()
+
+    def _complete_shard(self):
+        if self._shard is None:
+            return
+        self._shard.close()
+        os.replace(self._shard.path, os.path.join(self.output_dir, self._shard_name))
+        with open(
+            os.path.join(self.output_dir, INDEX_FILENAME), "a", encoding="utf-8"
+        ) as index_file:
+            for entry in self._shard_entries:
+                index_file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            index_file.flush()
+            os.fsync(index_file.fileno())
+        logging.info(
+            f"Wrote {len(self._shard_entries)} segments to shard {self._shard_name}"
+        )
+        self.num_shards += 1
+        callbacks = self._shard_callbacks
+        self._shard = self._shard_name = None
+        self._shard_entries = []
+        self._shard_callbacks = []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logging.error(f"Dataset writer callback failed: {e}")
+
+
+def latest_index_entries(entries):
+    """Keeps the entries of the last write of every audio and of every key.
+
+    The index is only appended to, an audio written again is listed again. Its
+    earlier entries are dropped, including the ones of segments it no longer has,
+    as well as earlier entries of a key written again. An audio is written in a
+    single shard, so its last write is the last shard listing it.
+
+    Args:
+        entries (list of dict): Index entries in the order they were appended
+
+    Returns:
+        list of dict: The current entries, in the order they were appended
+    """
+    last_shards = {
+        entry["full_audio_id"]: entry["shard"]
+        for entry in entries
+        if entry["full_audio_id"]
+    }
+    latest = {}
+    for entry in entries:
+        if entry["full_audio_id"] and (
+            entry["shard"] != last_shards[entry["full_audio_id"]]
+        ):
+            continue
+        latest.pop(entry["key"], None)
+        latest[entry["key"]] = entry
+    return list(latest.values())
+
+
+def read_dataset_index(output_dir=DATASET_DIR):
+    """Reads the index of a dataset written by `ShardedDatasetWriter`.
+
+    Args:
+        output_dir (str): Directory of the dataset
+
+    Returns:
+        list of dict: Index entries with the "key", "full_audio_id" and "shard" of
+            every current record and its position in the shard, one per key, see
+            `latest_index_entries`
+    """
+    path = os.path.join(output_dir, INDEX_FILENAME)
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as index_file:
+        return latest_index_entries(
+            [json.loads(line) for line in index_file if line.strip()]
+        )
+
+
+def read_dataset_record(entry, output_dir=DATASET_DIR):
+    """Reads a single record of a dataset from its index entry.
+
+    Args:
+        entry (dict): Entry returned by `read_dataset_index`
+        output_dir (str): Directory of the dataset
+
+    Returns:
+        dict: The record, with its WAV content under "audio"
+    """
+    path = os.path.join(output_dir, entry["shard"])
+    if entry["shard"].endswith(_ParquetShard.extension):
+        import pyarrow.parquet as pq
+
+        row_group = pq.ParquetFile(path).read_row_group(entry["row_group"])
+        return row_group.slice(entry["row"], 1).to_pylist()[0]
+
+    with open(path, "rb") as shard_file:
+        shard_file.seek(entry["json_offset"])
+        record = json.loads(shard_file.read(entry["json_size"]).decode("utf-8"))
+        shard_file.seek(entry["audio_offset"])
+        record["audio"] = shard_file.read(entry["audio_size"])
+    return record
@@ -0,0 +1,49 @@
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Pooled keep-alive sessions of the current process, keyed by name.
+_sessions = {}
+_sessions_pid = os.getpid()
+_sessions_lock = threading.Lock()
+
+
+def get_session(name, pool_maxsize=10):
+    """Returns the pooled keep-alive HTTP session registered under `name`.
+
+    Sessions are created once per process, so connections (and TLS handshakes)
+    are reused across requests. Forked worker processes get their own sessions
+    instead of sharing the parent's sockets.
+
+    Args:
+        name (str): Name of the session, e.g. "inference" or "download"
+        pool_maxsize (int): Maximum number of connections kept open per host
+
+    Returns:
+        requests.Session: Session with a connection pool of `pool_maxsize`
+    """
+    global _sessions_pid
+    with _sessions_lock:
+        if _sessions_pid != os.getpid():
+            _sessions.clear()
+            _sessions_pid = os.getpid()
+        session = _sessions.get(name)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=pool_maxsize, pool_maxsize=pool_maxsize
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[name] = session
+        return session
+
+
+def close_sessions():
+    """Closes every session of the current process."""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
@@ -1,18 +1,33 @@
 import logging
 import os
 import wave
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 
 import requests
 from dotenv import load_dotenv
 
-from stt_data_with_llm.config import API_URL, CHANNELS, SAMPLE_RATE, SAMPLE_WIDTH
-from stt_data_with_llm.util import setup_logging
+from stt_data_with_llm.audio_parser import pcm_buffer
+from stt_data_with_llm.cache import get_cache, make_cache_key
+from stt_data_with_llm.config import (
+    API_URL,
+    CHANNELS,
+    INFERENCE_CACHE_MAX_BYTES,
+    INFERENCE_MAX_IN_FLIGHT,
+    INFERENCE_TIMEOUT,
+    SAMPLE_RATE,
+    SAMPLE_WIDTH,
+)
+from stt_data_with_llm.http_session import get_session
+from stt_data_with_llm.metrics import bind_trace, increment, timed
+from stt_data_with_llm.rate_limiter import (
+    RetryableError,
+    check_status,
+    get_rate_limiter,
+)
 
 load_dotenv()
 TOKEN_ID = os.getenv("token_id")
-# Call the setup_logging function at the beginning of your script
-setup_logging("inference_log.log")
 
 INFERENCE_HEADERS = {
     "Accept": "application/json",
@@ -49,54 +64,150 @@ def convert_raw_to_wav_in_memory(raw_audio, sample_rate, channels, sample_width)
         return None
 
 
+def _post_audio(wav_buffer):
+    session = get_session("inference", INFERENCE_MAX_IN_FLIGHT)
+    wav_buffer.seek(0)
+    try:
+        response = session.post(
+            API_URL,
+            headers=INFERENCE_HEADERS,
+            data=wav_buffer,
+            timeout=INFERENCE_TIMEOUT,
+        )
+    except (requests.ConnectionError, requests.Timeout) as e:
+        raise RetryableError(f"Inference request failed: {e}") from e
+    check_status(response.status_code, response.headers)
+    response.raise_for_status()
+    return response.json()
+
+
 def query_audio_api(wav_buffer):
     """
     Sends the WAV audio data to the Hugging Face API for inference.
 
+    Requests go through the pooled keep-alive "inference" session, so
+    consecutive segments reuse open connections, and through the "inference"
+    rate limiter, which paces them and retries 429, 5xx and connection errors.
+
     Args:
         wav_buffer (BytesIO): In-memory WAV file buffer.
 
     Returns:
         dict: API response containing the transcription.
+
+    Raises:
+        RetryableError: The endpoint kept failing after the allowed retries
+        requests.RequestException: The endpoint rejected the request
     """
-    try:
-        response = requests.post(API_URL, headers=INFERENCE_HEADERS, data=wav_buffer)
-        response.raise_for_status()
-        api_response = response.json()
-        logging.info("API call successful")
-        return api_response
-    except requests.RequestException as e:
-        logging.error(f"Error during API call: {e}")
-        return None
+    api_response = get_rate_limiter("inference").call(_post_audio, wav_buffer)
+    logging.info("API call successful")
+    return api_response
+
+
+def get_transcript_cache():
+    """
+    Returns the persistent cache of segment transcripts.
+
+    Returns:
+        SQLiteCache: Cache of transcripts keyed by `transcript_cache_key`
+    """
+    return get_cache("transcripts", INFERENCE_CACHE_MAX_BYTES)
+
+
+def transcript_cache_key(raw_audio):
+    """
+    Returns the cache key of a segment transcript.
+
+    The key hashes the endpoint, the PCM format and the segment samples, so the
+    same audio sent to the same model is only transcribed once.
+
+    Args:
+        raw_audio (bytes-like): Raw audio data of the segment.
+
+    Returns:
+        str: Cache key
+    """
+    return make_cache_key(
+        API_URL, f"{SAMPLE_RATE}:{CHANNELS}:{SAMPLE_WIDTH}", raw_audio  # noqa: E231
+    )
 
 
+@timed("get_audio_inference_text")
 def get_audio_inference_text(raw_audio):
     """
     Generates the inference transcript for raw audio data.
 
+    Transcripts of segments already sent to the endpoint are served from the
+    transcript cache without calling the API. A failed inference raises instead
+    of returning an empty transcript, so the audio is not recorded as
+    transcribed and is retried on the next run.
+
     Args:
-        raw_audio (bytes): Raw audio data of the segment.
+        raw_audio (SegmentView or bytes): Raw audio data of the segment.
 
     Returns:
         str: The transcript generated for the given audio segment.
+
+    Raises:
+        Exception: The segment could not be transcribed
     """
     try:
+        raw_audio = pcm_buffer(raw_audio)
+        cache = get_transcript_cache()
+        cache_key = transcript_cache_key(raw_audio)
+        cached_transcript = cache.get(cache_key)
+        if cached_transcript is not None:
+            increment("cache_requests_total", cache="transcripts", result="hit")
+            return cached_transcript
+        increment("cache_requests_total", cache="transcripts", result="miss")
+
         # Convert raw audio to WAV format in memory
         wav_buffer = convert_raw_to_wav_in_memory(
             raw_audio, SAMPLE_RATE, CHANNELS, SAMPLE_WIDTH
         )
         if not wav_buffer:
-            return ""
+            raise ValueError("Could not convert the segment to WAV")
+        increment(
+            "bytes_total",
+            wav_buffer.getbuffer().nbytes,
+            operation="get_audio_inference_text",
+            direction="sent",
+        )
         logging.info("Running inference on audio segment")
         # Send the WAV data to the API for transcription
         response = query_audio_api(wav_buffer)
-        if not response or "text" not in response:
-            return ""
+        if not isinstance(response, dict) or "text" not in response:
+            raise ValueError(f"Unexpected inference response: {response!r}")
         transcript = response["text"]
+        cache.set(cache_key, transcript)
 
         logging.info("Inference completed successfully")
         return transcript
 
     except Exception as e:
         logging.error(f"Error during inference: {e}")
-        return ""
+        increment("failures_total", operation="get_audio_inference_text")
+        raise
+
+
+def get_audio_inference_texts(raw_audios, max_in_flight=INFERENCE_MAX_IN_FLIGHT):
+    """
+    Generates the inference transcripts of many segments concurrently.
+
+    At most `max_in_flight` requests are sent to the endpoint at the same time.
+
+    Args:
+        raw_audios (iterable of SegmentView or bytes): Raw audio data of the segments.
+        max_in_flight (int): Maximum number of concurrent inference requests.
+
+    Returns:
+        list of str: The transcripts, in the same order as `raw_audios`.
+    """
+    raw_audios = list(raw_audios)
+    if max_in_flight <= 1 or len(raw_audios) <= 1:
+        return [get_audio_inference_text(raw_audio) for raw_audio in raw_audios]
+    with ThreadPoolExecutor(
+        max_workers=min(max_in_flight, len(raw_audios)),
+        thread_name_prefix="inference",
+    ) as executor:
+        return list(executor.map(bind_trace(get_audio_inference_text), raw_audios))
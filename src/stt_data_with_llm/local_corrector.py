@@ -0,0 +1,168 @@
+import logging
+import re
+
+from stt_data_with_llm.cer import levenshtein_distance
+from stt_data_with_llm.config import LOCAL_CORRECTION_MAX_SYLLABLE_CER
+from stt_data_with_llm.metrics import increment, timed
+
+# Tibetan syllables are delimited by the tsheg (U+0F0B, U+0F0C), the shad family
+# of punctuation marks (U+0F0D to U+0F14) and whitespace.
+_SYLLABLE_DELIMITERS = re.compile(r"[\s\u0f0b-\u0f14]+")
+
+
+def split_syllables(text):
+    """Splits a Tibetan text into its syllables, without the punctuation.
+
+    Args:
+        text (str): Tibetan text
+
+    Returns:
+        list of str: Syllables in order
+    """
+    return [syllable for syllable in _SYLLABLE_DELIMITERS.split(text) if syllable]
+
+
+def syllable_distance(source, target):
+    """Returns the character edit distance of two syllables over the longest one."""
+    if source == target:
+        return 0.0
+    return levenshtein_distance(source, target) / max(len(source), len(target))
+
+
+def align_syllables(inference_syllables, reference_syllables):
+    """Aligns two syllable sequences with the minimum edit cost.
+
+    Substituting a syllable costs its character edit distance to the other one
+    over the longest of both, so a misspelled syllable is aligned with the
+    reference syllable it is a variant of rather than inserted and deleted.
+    Inserting or deleting a syllable costs 1.
+
+    Args:
+        inference_syllables (list of str): Syllables of the inference transcript
+        reference_syllables (list of str): Syllables of the reference transcript
+
+    Returns:
+        list of tuple: (inference syllable, reference syllable) pairs in order, with
+            None on the side of an inserted or deleted syllable
+    """
+    rows, columns = len(inference_syllables), len(reference_syllables)
+    costs = [[0.0] * (columns + 1) for _ in range(rows + 1)]
+    for row in range(1, rows + 1):
+        costs[row][0] = float(row)
+    for column in range(1, columns + 1):
+        costs[0][column] = float(column)
+    for row in range(1, rows + 1):
+        inference_syllable = inference_syllables[row - 1]
+        previous_costs, row_costs = costs[row - 1], costs[row]
+        for column in range(1, columns + 1):
+            row_costs[column] = min(
+                previous_costs[column - 1]
+                + syllable_distance(
+                    inference_syllable, reference_syllables[column - 1]
+                ),
+                previous_costs[column] + 1,
+                row_costs[column - 1] + 1,
+            )
+
+    alignment = []
+    row, column = rows, columns
+    while row or column:
+        if (
+            row
+            and column
+            and costs[row][column]
+            == costs[row - 1][column - 1]
+            + syllable_distance(
+                inference_syllables[row - 1], reference_syllables[column - 1]
+            )
+        ):
+            alignment.append(
+                (inference_syllables[row - 1], reference_syllables[column - 1])
+            )
+            row, column = row - 1, column - 1
+        elif row and costs[row][column] == costs[row - 1][column] + 1:
+            alignment.append((inference_syllables[row - 1], None))
+            row -= 1
+        else:
+            alignment.append((None, reference_syllables[column - 1]))
+            column -= 1
+    alignment.reverse()
+    return alignment
+
+
+@timed("get_local_corrected_text")
+def get_local_corrected_text(
+    inference_text, reference_text, max_syllable_cer=LOCAL_CORRECTION_MAX_SYLLABLE_CER
+):
+    """Applies the reference spelling to a segment without calling the LLM.
+
+    The inference and reference syllables are aligned, when every inference
+    syllable pairs with a reference syllable that is the same or a spelling
+    variant of it, the corrected sentence is the reference sentence, which is
+    what the LLM is asked to produce for valid segments. Segments with syllables
+    spoken but missing from the reference, reference syllables that were not
+    heard, or syllables replaced by a different word are ambiguous and left to
+    the LLM.
+
+    Args:
+        inference_text (str): The colloquial text with potential spelling mistakes
+        reference_text (str): The literal reference text with correct spelling
+        max_syllable_cer (float): Highest character error rate of two aligned
+            syllables still considered spelling variants
+
+    Returns:
+        str: Corrected text, or None if the segment is ambiguous
+    """
+    inference_syllables = split_syllables(inference_text)
+    reference_syllables = split_syllables(reference_text)
+    if not inference_syllables or not reference_syllables:
+        return None
+    for inference_syllable, reference_syllable in align_syllables(
+        inference_syllables, reference_syllables
+    ):
+        if inference_syllable is None or reference_syllable is None:
+            return None
+        if syllable_distance(inference_syllable, reference_syllable) > (
+            max_syllable_cer
+        ):
+            return None
+    return reference_text.strip()
+
+
+def split_local_corrections(
+    segments, max_syllable_cer=LOCAL_CORRECTION_MAX_SYLLABLE_CER
+):
+    """Corrects the unambiguous valid segments locally.
+
+    Args:
+        segments (list of dict): Segments with "id", "inference_text", "is_valid"
+            and "reference_text" keys
+        max_syllable_cer (float, optional): See `get_local_corrected_text`, None
+            sends every segment to the LLM
+
+    Returns:
+        tuple: (corrected text by segment id for the segments corrected locally,
+            segments left to the LLM)
+    """
+    if max_syllable_cer is None:
+        return {}, list(segments)
+    corrected_texts = {}
+    llm_segments = []
+    for segment in segments:
+        corrected_text = None
+        if segment["is_valid"] and segment.get("reference_text"):
+            corrected_text = get_local_corrected_text(
+                segment["inference_text"], segment["reference_text"], max_syllable_cer
+            )
+        if corrected_text is None:
+            llm_segments.append(segment)
+        else:
+            corrected_texts[segment["id"]] = corrected_text
+    increment("local_corrections_total", len(corrected_texts), result="resolved")
+    increment("local_corrections_total", len(llm_segments), result="sent_to_llm")
+    if corrected_texts:
+        logging.info(
+            f"{len(corrected_texts)} of {len(corrected_texts) + len(llm_segments)} "
+            "segments corrected locally"
+        )
+    return corrected_texts, llm_segments
@@ -1,28 +1,76 @@
+import collections
 import logging
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
 
-from fast_antx.core import transfer
-
-from stt_data_with_llm.audio_parser import get_audio, get_split_audio
-from stt_data_with_llm.catalog_parser import parse_catalog
+from stt_data_with_llm.audio_downloader import download_audio, prefetch_ahead
+from stt_data_with_llm.audio_parser import (
+    decode_to_16K_pcm,
+    get_split_audio,
+    pcm_buffer,
+    split_audio_from_sample_ranges,
+    warm_vad_pipelines,
+)
+from stt_data_with_llm.catalog_parser import iter_catalog
 from stt_data_with_llm.config import (
     AUDIO_SEG_LOWER_LIMIT,
     AUDIO_SEG_UPPER_LIMIT,
     CER_THRESHOLD,
+    DATASET_DIR,
+    DATASET_SHARD_FORMAT,
+    DOWNLOAD_MAX_WORKERS,
+    EARLY_REJECT_MARGIN,
+    EARLY_REJECT_MIN_CHARS,
+    EARLY_REJECT_SAMPLE_SEGMENTS,
+    LOCAL_CORRECTION_MAX_SYLLABLE_CER,
+    MANIFEST_PATH,
+    METRICS_PATH,
+    PIPELINE_START_METHOD,
+    PIPELINE_WORKERS,
+    SAMPLE_RATE,
+    SAMPLE_WIDTH,
+    STAGE_LOG_INTERVAL,
+    STAGE_QUEUE_SIZE,
+    STAGE_WORKERS,
+    WORKER_TORCH_THREADS,
+)
+from stt_data_with_llm.dataset_writer import ShardedDatasetWriter, build_segment_records
+from stt_data_with_llm.inference_transcript import get_audio_inference_texts
+from stt_data_with_llm.LLM_post_corrector import get_LLM_corrected_texts
+from stt_data_with_llm.local_corrector import split_local_corrections
+from stt_data_with_llm.manifest import entry_fingerprint, get_manifest
+from stt_data_with_llm.metrics import (
+    AudioTrace,
+    finish_trace,
+    get_registry,
+    increment,
+    timed,
+    use_trace,
+    write_metrics,
 )
-from stt_data_with_llm.inference_transcript import get_audio_inference_text
-from stt_data_with_llm.LLM_post_corrector import get_LLM_corrected_text
+from stt_data_with_llm.rate_limiter import set_rate_limit_share
+from stt_data_with_llm.segmentation_transfer import transfer_segmentation_windowed
+from stt_data_with_llm.staged_pipeline import Stage, StagedPipeline
 from stt_data_with_llm.util import (
     calculate_cer,
+    calculate_prefix_cer,
+    forward_worker_logs,
     get_inference_transcript,
     get_original_text,
+    setup_logging,
 )
 
-logging.basicConfig(filename="./pipeline.log", level=logging.INFO)
-
 
+@timed("transfer_segmentation")
 def transfer_segmentation(inference_transcript, reference_transcript):
     """Transfers the segmentation patterns from the inference transcript to the reference transcript.
 
+    Long transcripts are aligned in windows between anchors, see
+    `transfer_segmentation_windowed`.
+
     Args:
         inference_transcript (str): The transcript generated by the inference model.
         reference_transcript (str): original reference text
@@ -31,9 +79,8 @@ def transfer_segmentation(inference_transcript, reference_transcript):
         str: The reference transcript with segmentation from the inference transcript applied.
     """
     reference_transcript = reference_transcript.replace("\n", " ")
-    patterns = [["segmentation", "(\n)"]]
-    reference_transcript_with_inference_segmentation = transfer(
-        inference_transcript, patterns, reference_transcript
+    reference_transcript_with_inference_segmentation = transfer_segmentation_windowed(
+        inference_transcript, reference_transcript
     )
     return reference_transcript_with_inference_segmentation
 
@@ -52,76 +99,761 @@ def is_valid_transcript(inference_transcript, reference_transcript):
             -`False` otherwise
     """
 
-    cer_value = calculate_cer(inference_transcript, reference_transcript)
+    cer_value = calculate_cer(
+        inference_transcript, reference_transcript, max_cer=CER_THRESHOLD
+    )
     logging.info(f"Cer Value: {cer_value}")
     return cer_value <= CER_THRESHOLD
 
 
-def post_process_audio_transcript_pairs(audio_data_info):
-    post_processed_audio_transcript_pairs = {}
-    inference_transcript = ""
-    audio_url = audio_data_info.get("audio_url", "")
+def is_clearly_invalid_start(inference_transcript, reference_transcript):
+    """Checks whether the transcript of the first segments already fails validation.
+
+    The partial transcript is compared with the reference prefix it matches best.
+    The full CER can still pass when this partial CER is a bit over `CER_THRESHOLD`,
+    so the audio is only rejected once it exceeds it by `EARLY_REJECT_MARGIN`.
+
+    Args:
+        inference_transcript (str): Transcript of the first segments of the audio
+        reference_transcript (str): Full reference transcript
+
+    Returns:
+        tuple: (whether the audio can be rejected, partial CER or None when the
+            transcript is shorter than `EARLY_REJECT_MIN_CHARS` or the CER failed)
+    """
+    inference_transcript = get_inference_transcript(inference_transcript)
+    if len(inference_transcript.strip()) < EARLY_REJECT_MIN_CHARS:
+        return False, None
+    cer_value = calculate_prefix_cer(
+        get_original_text(reference_transcript), inference_transcript
+    )
+    if cer_value is None:
+        # Never reject on a failed CER, the full transcript is still validated.
+        increment("failures_total", operation="early_rejection")
+        logging.warning("Partial CER failed, the audio is not rejected early")
+        return False, None
+    logging.info(f"Partial Cer Value: {cer_value}")
+    return cer_value > CER_THRESHOLD + EARLY_REJECT_MARGIN, cer_value
+
+
+def _get_segment_audio(manifest, manifest_id, full_audio_id, audio_path):
+    """Runs the segment stage, or rebuilds the recorded segments from the audio.
+
+    The manifest entry is looked up by `manifest_id`, the segments are named after
+    `full_audio_id`.
+    """
+    audio_data = decode_to_16K_pcm(audio_path)
+    if manifest.get_stage(manifest_id, "segment") is not None:
+        sample_ranges = {
+            segment_id: (artifact["start"], artifact["end"])
+            for segment_id, artifact in manifest.get_segments(
+                manifest_id, "segment"
+            ).items()
+        }
+        return split_audio_from_sample_ranges(audio_data, sample_ranges, full_audio_id)
+
+    # The segments are saved to the dataset shards, no WAV file per segment.
+    split_audio_data = get_split_audio(
+        audio_data,
+        full_audio_id,
+        AUDIO_SEG_LOWER_LIMIT,
+        AUDIO_SEG_UPPER_LIMIT,
+        save_segments=False,
+    )
+    manifest.complete_stage(
+        manifest_id,
+        "segment",
+        {"num_segments": len(split_audio_data)},
+        {
+            segment_id: {"start": start, "end": end}
+            for segment_id, (start, end) in split_audio_data.sample_ranges.items()
+        },
+    )
+    return split_audio_data
+
+
+def _new_audio_job(audio_data_info, manifest_path, data_id=None):
+    """Returns the state of an audio passed from one pipeline stage to the next."""
     full_audio_id = audio_data_info.get("full_audio_id", "")
-    reference_transcript = audio_data_info.get("reference_transcript", "")
+    return {
+        "data_id": data_id,
+        "audio_data_info": audio_data_info,
+        "full_audio_id": full_audio_id,
+        "manifest_path": manifest_path,
+        "trace": AudioTrace(full_audio_id),
+        "post_processed_audio_transcript_pairs": None,
+    }
+
+
+def _run_stage(name, stage, job):
+    """Runs a stage of `AUDIO_STAGES` on a job, timed in the trace of the audio.
+
+    Once the audio is finished, the job drops its decoded audio and segments, only
+    the post processed pairs keep the segments they need.
+    """
+    forward = False
+    try:
+        with use_trace(job["trace"]), timed(f"stage_{name}"):
+            forward = stage(job)
+        return forward
+    finally:
+        if not forward or name == AUDIO_STAGES[-1][0]:
+            job.pop("split_audio_data", None)
+
+
+def _download_stage(job):
+    """Downloads the audio, unless it has no URL or was rejected by validation."""
+    audio_data_info = job["audio_data_info"]
+    audio_url = audio_data_info.get("audio_url", "")
     if not audio_url:
-        return None, full_audio_id
+        return False
 
-    audio_data = get_audio(audio_url)
-    split_audio_data = get_split_audio(
-        audio_data, full_audio_id, AUDIO_SEG_LOWER_LIMIT, AUDIO_SEG_UPPER_LIMIT
+    manifest = get_manifest(job["manifest_path"])
+    manifest_id = job["manifest_id"] = get_manifest_id(audio_data_info)
+    manifest.start_audio(manifest_id, entry_fingerprint(audio_data_info))
+    validation = manifest.get_stage(manifest_id, "validate")
+    if validation is not None and not validation["is_valid"]:
+        return False
+
+    download = manifest.get_stage(manifest_id, "download")
+    if download is None or not os.path.exists(download["path"]):
+        download = {"path": download_audio(audio_url)}
+        manifest.complete_stage(manifest_id, "download", download)
+    job["audio_path"] = download["path"]
+    return True
+
+
+def _segment_stage(job):
+    manifest = get_manifest(job["manifest_path"])
+    job["split_audio_data"] = _get_segment_audio(
+        manifest, job["manifest_id"], job["full_audio_id"], job["audio_path"]
     )
-    for audio_seg_id, audio_seg_data in split_audio_data.items():
-        audio_seg_inference_transcript = get_audio_inference_text(audio_seg_data)
-        inference_transcript += f"{audio_seg_inference_transcript}\n"
+    return True
+
+
+def _transcribe_stage(job):
+    manifest = get_manifest(job["manifest_path"])
+    manifest_id = job["manifest_id"]
+    split_audio_data = job["split_audio_data"]
+    if manifest.get_stage(manifest_id, "transcribe") is None:
+        segment_ids = list(split_audio_data)
+        sample_size = EARLY_REJECT_SAMPLE_SEGMENTS
+        if not 0 < sample_size < len(segment_ids):
+            sample_size = 0
+        inference_texts = []
+        if sample_size:
+            inference_texts = get_audio_inference_texts(
+                split_audio_data[audio_seg_id]
+                for audio_seg_id in segment_ids[:sample_size]
+            )
+            if _reject_early(job, segment_ids, inference_texts):
+                return False
+        inference_texts += get_audio_inference_texts(
+            split_audio_data[audio_seg_id] for audio_seg_id in segment_ids[sample_size:]
+        )
+        manifest.complete_stage(
+            manifest_id,
+            "transcribe",
+            segments={
+                audio_seg_id: {"inference_text": audio_seg_inference_transcript}
+                for audio_seg_id, audio_seg_inference_transcript in zip(
+                    segment_ids, inference_texts
+                )
+            },
+        )
+    inference_transcript = ""
+    for artifact in manifest.get_segments(manifest_id, "transcribe").values():
+        inference_transcript += f"{artifact['inference_text']}\n"
+    job["inference_transcript"] = inference_transcript
+    return True
+
+
+def _reject_early(job, segment_ids, sample_inference_texts):
+    """Rejects an audio whose first segments clearly fail validation.
+
+    Returns:
+        bool: Whether the audio was rejected, the remaining segments are then
+            never transcribed
+    """
+    reject, cer_value = is_clearly_invalid_start(
+        "\n".join(sample_inference_texts),
+        job["audio_data_info"].get("reference_transcript", ""),
+    )
+    if not reject:
+        return False
+    skipped_segment_ids = segment_ids[len(sample_inference_texts) :]  # noqa: E203
+    skipped_seconds = sum(
+        len(pcm_buffer(job["split_audio_data"][audio_seg_id]))
+        for audio_seg_id in skipped_segment_ids
+    ) / (SAMPLE_RATE * SAMPLE_WIDTH)
+    get_manifest(job["manifest_path"]).complete_stage(
+        job["manifest_id"],
+        "validate",
+        {
+            "is_valid": False,
+            "early_rejection": {
+                "sample_segments": len(sample_inference_texts),
+                "partial_cer": cer_value,
+                "skipped_segments": len(skipped_segment_ids),
+                "skipped_audio_seconds": skipped_seconds,
+            },
+        },
+    )
+    increment("early_rejections_total")
+    increment("inference_saved_total", len(skipped_segment_ids), unit="segments")
+    increment("inference_saved_total", skipped_seconds, unit="audio_seconds")
+    logging.info(
+        f"Rejected {job['full_audio_id']} after {len(sample_inference_texts)} segments "
+        f"(partial CER {cer_value:.2f}), skipped inference of "
+        f"{len(skipped_segment_ids)} segments ({skipped_seconds:.0f} s of audio)"
+    )
+    return True
+
+
+def _validate_stage(job):
+    """Validates the transcript of the audio and of every segment."""
+    manifest = get_manifest(job["manifest_path"])
+    manifest_id = job["manifest_id"]
+    if manifest.get_stage(manifest_id, "validate") is not None:
+        return True
+
+    inference_transcript = job["inference_transcript"]
+    reference_transcript = job["audio_data_info"].get("reference_transcript", "")
     validation_original_text = get_original_text(reference_transcript)
     validation_inference_transcript = get_inference_transcript(inference_transcript)
     if not is_valid_transcript(
         validation_inference_transcript, validation_original_text
     ):
-        return None, full_audio_id
+        manifest.complete_stage(manifest_id, "validate", {"is_valid": False})
+        return False
     reference_transcript_with_inference_segmentation = transfer_segmentation(
         inference_transcript, reference_transcript
     )
     inference_transcripts = inference_transcript.split("\n")
     reference_transcripts = reference_transcript_with_inference_segmentation.split("\n")
-
-    for seg_walker, (audio_seg_id, audio_seg_data) in enumerate(
-        split_audio_data.items()
-    ):
+    segment_validations = {}
+    for seg_walker, audio_seg_id in enumerate(job["split_audio_data"]):
         seg_inference_text = inference_transcripts[seg_walker]
         seg_reference_text = reference_transcripts[seg_walker]
-        if not is_valid_transcript(seg_inference_text, seg_reference_text):
-            seg_LLM_corrected_text = get_LLM_corrected_text(seg_inference_text, False)
+        segment_validations[audio_seg_id] = {
+            "reference_text": seg_reference_text,
+            "is_valid": is_valid_transcript(seg_inference_text, seg_reference_text),
+        }
+    manifest.complete_stage(
+        manifest_id, "validate", {"is_valid": True}, segment_validations
+    )
+    return True
+
+
+def _correct_stage(job):
+    """Corrects the segment transcripts and builds the post processed pairs.
+
+    When a correction fails the stage is not recorded and the audio ends without
+    pairs, so nothing is saved before every segment is corrected on a later run.
+    """
+    manifest = get_manifest(job["manifest_path"])
+    manifest_id = job["manifest_id"]
+    split_audio_data = job["split_audio_data"]
+    inference_texts = manifest.get_segments(manifest_id, "transcribe")
+    correction_segments = [
+        {
+            "id": audio_seg_id,
+            "inference_text": inference_texts[audio_seg_id]["inference_text"],
+            "reference_text": segment_validation["reference_text"],
+            "is_valid": segment_validation["is_valid"],
+        }
+        for audio_seg_id, segment_validation in manifest.get_segments(
+            manifest_id, "validate"
+        ).items()
+    ]
+
+    seg_LLM_corrected_texts = {
+        audio_seg_id: artifact["LLM_corrected_text"]
+        for audio_seg_id, artifact in manifest.get_segments(
+            manifest_id, "correct"
+        ).items()
+    }
+    if manifest.get_stage(manifest_id, "correct") is None:
+        seg_LLM_corrected_texts, llm_segments = split_local_corrections(
+            correction_segments, LOCAL_CORRECTION_MAX_SYLLABLE_CER
+        )
+        local_segment_ids = set(seg_LLM_corrected_texts)
+        if llm_segments:
+            seg_LLM_corrected_texts.update(get_LLM_corrected_texts(llm_segments))
+        if all(text is not None for text in seg_LLM_corrected_texts.values()):
+            manifest.complete_stage(
+                manifest_id,
+                "correct",
+                segments={
+                    audio_seg_id: {
+                        "LLM_corrected_text": corrected_text,
+                        "corrected_by": "local"
+                        if audio_seg_id in local_segment_ids
+                        else "llm",
+                    }
+                    for audio_seg_id, corrected_text in seg_LLM_corrected_texts.items()
+                },
+            )
         else:
-            seg_LLM_corrected_text = get_LLM_corrected_text(
-                seg_inference_text, True, seg_reference_text
+            logging.warning(
+                f"LLM correction incomplete for {job['full_audio_id']}, it is retried on the next run"  # noqa: E501
             )
-        post_process_audio_transcript_pairs[audio_seg_id] = {
-            "audio_seg_data": audio_seg_data,
-            "inference_transcript": seg_inference_text,
-            "reference_transcript": seg_reference_text,
-            "LLM_corrected_text": seg_LLM_corrected_text,
+            increment("failures_total", operation="stage_correct")
+            return False
+
+    post_processed_audio_transcript_pairs = {}
+    for segment in correction_segments:
+        audio_seg_id = segment["id"]
+        post_processed_audio_transcript_pairs[audio_seg_id] = {
+            "audio_seg_data": split_audio_data[audio_seg_id],
+            "inference_transcript": segment["inference_text"],
+            "reference_transcript": segment["reference_text"],
+            "LLM_corrected_text": seg_LLM_corrected_texts[audio_seg_id],
         }
-    return post_processed_audio_transcript_pairs, full_audio_id
+    job["post_processed_audio_transcript_pairs"] = post_processed_audio_transcript_pairs
+    return True
+
+
+# Stages of `post_process_audio_transcript_pairs`, each one returns False when the
+# audio is finished early, without post processed pairs.
+AUDIO_STAGES = (
+    ("download", _download_stage),
+    ("segment", _segment_stage),
+    ("transcribe", _transcribe_stage),
+    ("validate", _validate_stage),
+    ("correct", _correct_stage),
+)
+
+
+def post_process_audio_transcript_pairs(audio_data_info, manifest_path=MANIFEST_PATH):
+    """Runs the download, segment, transcribe, validate and correct stages on an audio.
+
+    Every stage is recorded in the pipeline manifest once complete, a later call
+    resumes at the first incomplete stage and reuses the recorded artifacts.
+
+    Args:
+        audio_data_info (dict): Catalog entry
+        manifest_path (str): Path of the pipeline manifest
+
+    Returns:
+        tuple: (post processed audio transcript pairs, or None if the audio has no
+            URL or an invalid transcript, full audio id)
+    """
+    job = _new_audio_job(audio_data_info, manifest_path)
+    try:
+        for name, stage in AUDIO_STAGES:
+            if not _run_stage(name, stage, job):
+                break
+    finally:
+        finish_trace(job["trace"])
+    return job["post_processed_audio_transcript_pairs"], job["full_audio_id"]
 
 
 def save_post_processed_audio_transcript_pairs(
-    post_processed_audio_transcript_pairs, audio_data_info
+    post_processed_audio_transcript_pairs, audio_data_info, writer, on_saved=None
 ):
-    # Save post processed audio transcript pairs in csv
-    pass
+    """Appends the post processed segments of an audio to the dataset shards.
+
+    Args:
+        post_processed_audio_transcript_pairs (dict): Segment data and texts by segment id
+        audio_data_info (dict): Catalog entry of the audio
+        writer (ShardedDatasetWriter): Writer of the output dataset
+        on_saved (callable, optional): Called once the segments are durably written
+    """
+    writer.write(
+        build_segment_records(post_processed_audio_transcript_pairs, audio_data_info),
+        on_saved,
+    )
+
+
+def get_manifest_id(audio_data_info):
+    """Returns the key of a catalog entry in the pipeline manifest.
+
+    Args:
+        audio_data_info (dict): Catalog entry
+
+    Returns:
+        str: The full audio id, or the audio URL for entries without one
+    """
+    return audio_data_info.get("full_audio_id", "") or audio_data_info.get(
+        "audio_url", ""
+    )
+
+
+def is_audio_finished(manifest, audio_data_info):
+    """Checks whether the manifest records an audio as saved or rejected.
+
+    Args:
+        manifest (PipelineManifest): Pipeline manifest
+        audio_data_info (dict): Catalog entry
+
+    Returns:
+        bool: Whether there is nothing left to run for the audio
+    """
+    manifest_id = get_manifest_id(audio_data_info)
+    manifest.start_audio(manifest_id, entry_fingerprint(audio_data_info))
+    validation = manifest.get_stage(manifest_id, "validate")
+    if validation is not None and not validation["is_valid"]:
+        return True
+    return manifest.get_stage(manifest_id, "save") is not None
+
 
+def process_catalog_entry(data_id, audio_data_info, manifest_path=MANIFEST_PATH):
+    """Runs the pipeline on one catalog entry, a failure only affects this entry.
+
+    Args:
+        data_id (str): Key of the entry in the catalog
+        audio_data_info (dict): Catalog entry
+        manifest_path (str): Path of the pipeline manifest
 
-def get_audio_transcript_pairs(audio_transcription_catalog_url):
-    audio_transcription_datas = parse_catalog(audio_transcription_catalog_url)
-    for data_id, audio_data_info in audio_transcription_datas.items():
+    Returns:
+        tuple: (data_id, post processed audio transcript pairs or None, full audio id,
+            error message or None)
+    """
+    try:
         (
             post_processed_audio_transcript_pairs,
             full_audio_id,
-        ) = post_process_audio_transcript_pairs(audio_data_info)
-        if post_processed_audio_transcript_pairs:
-            save_post_processed_audio_transcript_pairs(
-                post_processed_audio_transcript_pairs, audio_data_info
+        ) = post_process_audio_transcript_pairs(audio_data_info, manifest_path)
+        return data_id, post_processed_audio_transcript_pairs, full_audio_id, None
+    except Exception as e:
+        full_audio_id = audio_data_info.get("full_audio_id", "")
+        logging.exception(f"Audio data with ID {full_audio_id} failed: {e}")
+        return data_id, None, full_audio_id, str(e)
+
+
+def _catalog_items(audio_transcription_datas):
+    """Returns the (key, entry) pairs of a catalog dict, or the pairs themselves."""
+    if isinstance(audio_transcription_datas, dict):
+        return iter(audio_transcription_datas.items())
+    return iter(audio_transcription_datas)
+
+
+def iter_staged_catalog(
+    audio_transcription_datas,
+    stage_workers=STAGE_WORKERS,
+    queue_size=STAGE_QUEUE_SIZE,
+    manifest_path=MANIFEST_PATH,
+    log_interval=STAGE_LOG_INTERVAL,
+):
+    """Runs the pipeline stages of every catalog entry concurrently in this process.
+
+    Every stage of `AUDIO_STAGES` runs on its own threads with a bounded queue in
+    front of it, so the next audios are downloaded and segmented while the current
+    one is transcribed and corrected. The queue depths are logged every
+    `log_interval` seconds, audios pile up in front of the slowest stage.
+
+    Args:
+        audio_transcription_datas (dict or iterable): Catalog entries by key, or
+            (key, entry) pairs consumed as the first stage has room
+        stage_workers (dict): Number of threads by stage name, 1 for missing stages
+        queue_size (int): Audios waiting in front of each stage, and finished audios
+            waiting to be yielded
+        manifest_path (str): Path of the pipeline manifest
+        log_interval (float, optional): Seconds between two logs of the queue depths
+
+    Yields:
+        tuple: `process_catalog_entry` results, in completion order
+    """
+    pipeline = StagedPipeline(
+        [
+            Stage(
+                name,
+                partial(_run_stage, name, stage),
+                stage_workers.get(name, 1),
+                queue_size,
+            )
+            for name, stage in AUDIO_STAGES
+        ],
+        results_size=queue_size,
+    )
+    jobs = (
+        _new_audio_job(audio_data_info, manifest_path, data_id)
+        for data_id, audio_data_info in _catalog_items(audio_transcription_datas)
+    )
+    for job, error in pipeline.run(jobs, log_interval):
+        finish_trace(job["trace"])
+        if error is not None:
+            logging.error(
+                f"Audio data with ID {job['full_audio_id']} failed: {error}",
+                exc_info=error,
             )
+            yield job["data_id"], None, job["full_audio_id"], str(error)
         else:
-            logging.info(f"Audio data with ID {full_audio_id} has invalid transcript")
+            yield (
+                job["data_id"],
+                job["post_processed_audio_transcript_pairs"],
+                job["full_audio_id"],
+                None,
+            )
+
+
+def _init_catalog_worker(log_queue, rate_limit_share=1.0):
+    """Sets up a worker process with its own logging, torch threads and VAD pipeline.
+
+    Args:
+        log_queue (multiprocessing.Queue): Queue forwarding the logs to the parent
+        rate_limit_share (float): Share of the endpoint rate limits of the worker
+    """
+    # A forked worker starts with a copy of the metrics of the parent.
+    get_registry().reset()
+    setup_logging(log_queue=log_queue)
+    set_rate_limit_share(rate_limit_share)
+    import torch
+
+    torch.set_num_threads(WORKER_TORCH_THREADS)
+    try:
+        warm_vad_pipelines()
+    except Exception as e:
+        logging.warning(f"Could not preload the VAD pipeline: {e}")
+
+
+def _process_catalog_entry_in_worker(data_id, audio_data_info, manifest_path):
+    """Runs `process_catalog_entry` in a worker process.
+
+    Returns:
+        tuple: (`process_catalog_entry` result, snapshot of the metrics of the
+            worker since its previous entry, to merge in the parent registry)
+    """
+    result = process_catalog_entry(data_id, audio_data_info, manifest_path)
+    return result, get_registry().snapshot(reset=True)
+
+
+def _undownloaded_audio_url(manifest, entry):
+    """Returns the audio URL of a catalog entry, empty once its download is recorded."""
+    audio_data_info = entry[1]
+    if manifest.get_stage(get_manifest_id(audio_data_info), "download") is not None:
+        return ""
+    return audio_data_info.get("audio_url", "")
+
+
+def iter_processed_catalog(
+    audio_transcription_datas,
+    workers=PIPELINE_WORKERS,
+    start_method=PIPELINE_START_METHOD,
+    manifest_path=MANIFEST_PATH,
+    prefetch_workers=0,
+):
+    """Runs the pipeline on every catalog entry and yields the results as they finish.
+
+    With more than one worker the entries are processed by a pool of worker processes,
+    each holding its own VAD pipeline and HTTP sessions, and the results come back in
+    completion order. At most two entries per worker are queued at a time. If a worker
+    process dies, the pool is restarted and the entries it was holding are retried once.
+    The metrics of every entry are merged into the registry of the current process.
+    With `prefetch_workers`, the audios of the next few entries are downloaded while
+    the workers process the current ones.
+
+    Args:
+        audio_transcription_datas (dict or iterable): Catalog entries by key, or
+            (key, entry) pairs consumed as the workers have room
+        workers (int): Number of worker processes, 1 processes the entries in order in
+            the current process
+        start_method (str, optional): multiprocessing start method of the workers
+        manifest_path (str): Path of the pipeline manifest
+        prefetch_workers (int): Number of audios downloaded ahead of the workers, 0
+            lets every worker download its own audio
+
+    Yields:
+        tuple: `process_catalog_entry` results
+    """
+    entries = _catalog_items(audio_transcription_datas)
+    if prefetch_workers:
+        entries = prefetch_ahead(
+            entries,
+            partial(_undownloaded_audio_url, get_manifest(manifest_path)),
+            prefetch_workers,
+        )
+    if workers <= 1:
+        for data_id, audio_data_info in entries:
+            yield process_catalog_entry(data_id, audio_data_info, manifest_path)
+        return
+
+    context = multiprocessing.get_context(start_method)
+    log_queue = context.Queue()
+    log_listener = forward_worker_logs(log_queue)
+    retries = collections.deque()
+    retried = set()
+    pending = {}
+    executor = None
+    try:
+        while True:
+            if executor is None:
+                executor = ProcessPoolExecutor(
+                    workers,
+                    mp_context=context,
+                    initializer=_init_catalog_worker,
+                    initargs=(log_queue, 1 / workers),
+                )
+            while len(pending) < 2 * workers:
+                entry = retries.popleft() if retries else next(entries, None)
+                if entry is None:
+                    break
+                try:
+                    future = executor.submit(
+                        _process_catalog_entry_in_worker, *entry, manifest_path
+                    )
+                    pending[future] = entry
+                except BrokenProcessPool:
+                    retries.appendleft(entry)
+                    break
+            if not pending:
+                if not retries:
+                    break
+                executor.shutdown(wait=False)
+                executor = None
+                continue
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            broken = any(isinstance(f.exception(), BrokenProcessPool) for f in done)
+            if broken:
+                # Every entry held by the dead pool fails, collect all of them.
+                done = set(pending)
+                wait(done)
+            for future in done:
+                data_id, audio_data_info = pending.pop(future)
+                try:
+                    result, worker_metrics = future.result()
+                except BrokenProcessPool as e:
+                    full_audio_id = audio_data_info.get("full_audio_id", "")
+                    if data_id in retried:
+                        logging.error(f"Audio data with ID {full_audio_id} failed: {e}")
+                        yield data_id, None, full_audio_id, str(e)
+                    else:
+                        retried.add(data_id)
+                        retries.append((data_id, audio_data_info))
+                else:
+                    get_registry().merge(worker_metrics)
+                    yield result
+            if broken:
+                executor.shutdown(wait=False)
+                executor = None
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        log_listener.stop()
+
+
+def get_audio_transcript_pairs(
+    audio_transcription_catalog_url,
+    prefetch_workers=DOWNLOAD_MAX_WORKERS,
+    workers=PIPELINE_WORKERS,
+    manifest_path=MANIFEST_PATH,
+    rerun_stage=None,
+    dataset_dir=DATASET_DIR,
+    shard_format=DATASET_SHARD_FORMAT,
+    stage_workers=STAGE_WORKERS,
+    metrics_path=METRICS_PATH,
+):
+    """Runs the pipeline on a catalog, resuming from the stages recorded in the manifest.
+
+    The catalog is read lazily, see `iter_catalog`. Audios already saved or rejected
+    by validation are skipped, the others resume at their first incomplete stage.
+    With a single worker process the stages of consecutive audios overlap, see
+    `iter_staged_catalog`.
+
+    Args:
+        audio_transcription_catalog_url (str): Google Spreadsheet ID or local catalog path
+        prefetch_workers (int): Number of audios downloaded ahead of the worker
+            processes, see `iter_processed_catalog`. The staged runner downloads
+            in its own "download" stage instead.
+        workers (int): Number of worker processes
+        manifest_path (str): Path of the pipeline manifest
+        rerun_stage (str, optional): Stage to run again for every audio, along with
+            the stages after it, e.g. "correct" after a prompt change
+        dataset_dir (str): Directory of the output dataset shards
+        shard_format (str): "tar" for WebDataset style shards or "parquet"
+        stage_workers (dict, optional): Threads by stage name of the staged runner
+            used with a single worker process, None runs the audios one after another
+        metrics_path (str, optional): File receiving the metrics of the run, see
+            `write_metrics`, including the ones of the worker processes
+    """
+    setup_logging("pipeline.log")
+    manifest = get_manifest(manifest_path)
+    if rerun_stage is not None:
+        manifest.reset_stage(rerun_stage)
+    # Entries handed to the runner and not finished yet, by key.
+    audio_transcription_datas = {}
+    finished_audios = [0]
+
+    def unfinished_entries():
+        for data_id, audio_data_info in iter_catalog(audio_transcription_catalog_url):
+            if is_audio_finished(manifest, audio_data_info):
+                finished_audios[0] += 1
+                continue
+            audio_transcription_datas[data_id] = audio_data_info
+            yield data_id, audio_data_info
+
+    entries = unfinished_entries()
+    processed_audios = 0
+    if workers <= 1 and stage_workers:
+        results = iter_staged_catalog(
+            entries, stage_workers, manifest_path=manifest_path
+        )
+    else:
+        results = iter_processed_catalog(
+            entries,
+            workers,
+            manifest_path=manifest_path,
+            prefetch_workers=prefetch_workers,
+        )
+    with ShardedDatasetWriter(dataset_dir, shard_format) as writer:
+        for (
+            data_id,
+            post_processed_audio_transcript_pairs,
+            full_audio_id,
+            error,
+        ) in results:
+            audio_data_info = audio_transcription_datas.pop(data_id)
+            manifest_id = get_manifest_id(audio_data_info)
+            processed_audios += 1
+            if post_processed_audio_transcript_pairs and (
+                manifest.get_stage(manifest_id, "correct") is not None
+            ):
+                # A saved audio replaces its earlier records in the dataset index.
+                save_post_processed_audio_transcript_pairs(
+                    post_processed_audio_transcript_pairs,
+                    audio_data_info,
+                    writer,
+                    partial(manifest.complete_stage, manifest_id, "save"),
+                )
+            elif error is None:
+                validation = manifest.get_stage(manifest_id, "validate")
+                if validation is not None and not validation["is_valid"]:
+                    logging.info(
+                        f"Audio data with ID {full_audio_id} has invalid transcript"
+                    )
+                else:
+                    logging.info(
+                        f"Audio data with ID {full_audio_id} is not complete, "
+                        "it is resumed on the next run"
+                    )
+    logging.info(
+        f"Processed {processed_audios} audios, {finished_audios[0]} were already "
+        "saved or rejected"
+    )
+    registry = get_registry()
+    early_rejections = registry.get_counter("early_rejections_total")
+    if early_rejections:
+        saved_segments = registry.get_counter("inference_saved_total", unit="segments")
+        saved_seconds = registry.get_counter(
+            "inference_saved_total", unit="audio_seconds"
+        )
+        logging.info(
+            f"Early rejection of {early_rejections} audios saved the inference of "
+            f"{saved_segments} segments ({saved_seconds / 3600:.2f} h of audio)"
+        )
+    local_corrections = registry.get_counter(
+        "local_corrections_total", result="resolved"
+    )
+    if local_corrections:
+        llm_corrections = registry.get_counter(
+            "local_corrections_total", result="sent_to_llm"
+        )
+        logging.info(
+            f"Local correction avoided the LLM for {local_corrections} of "
+            f"{local_corrections + llm_corrections} segments"
+        )
+    if metrics_path is not None:
+        write_metrics(metrics_path)
+        logging.info(f"Wrote pipeline metrics to {metrics_path}")
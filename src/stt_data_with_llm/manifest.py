@@ -0,0 +1,252 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from stt_data_with_llm.cache import make_cache_key
+from stt_data_with_llm.config import MANIFEST_PATH
+
+# Pipeline stages in execution order, each one only depends on the ones before it
+STAGES = ("download", "segment", "transcribe", "validate", "correct", "save")
+
+
+def entry_fingerprint(audio_data_info):
+    """Returns the fingerprint of the catalog entry fields the pipeline depends on.
+
+    Args:
+        audio_data_info (dict): Catalog entry
+
+    Returns:
+        str: Hash of the audio URL and reference transcript
+    """
+    return make_cache_key(
+        str(audio_data_info.get("audio_url", "")),
+        str(audio_data_info.get("reference_transcript", "")),
+    )
+
+
+class PipelineManifest:
+    """Durable record of the pipeline stages completed for each audio and segment.
+
+    Every completed stage stores a JSON artifact for the audio and optionally one
+    per segment, written in a single transaction so a crash never leaves a stage
+    half recorded. The manifest can be shared by several worker processes.
+
+    Args:
+        path (str): Path of the SQLite database file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = None
+        self._pid = None
+
+    def _connect(self):
+        if self._connection is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._connection = sqlite3.connect(
+                self.path, timeout=30, check_same_thread=False
+            )
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS audios ("
+                "full_audio_id TEXT PRIMARY KEY, fingerprint TEXT NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS audio_stages ("
+                "full_audio_id TEXT NOT NULL, stage TEXT NOT NULL, "
+                "artifact TEXT NOT NULL, completed_at REAL NOT NULL, "
+                "PRIMARY KEY (full_audio_id, stage))"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS segment_stages ("
+                "full_audio_id TEXT NOT NULL, segment_id TEXT NOT NULL, "
+                "stage TEXT NOT NULL, position INTEGER NOT NULL, "
+                "artifact TEXT NOT NULL, "
+                "PRIMARY KEY (full_audio_id, stage, segment_id))"
+            )
+            self._connection.commit()
+            self._pid = os.getpid()
+        return self._connection
+
+    def start_audio(self, full_audio_id, fingerprint):
+        """Registers an audio, forgetting its stages if its catalog entry changed.
+
+        Args:
+            full_audio_id (str): Identifier of the audio
+            fingerprint (str): `entry_fingerprint` of its catalog entry
+
+        Returns:
+            bool: Whether previously recorded stages were dropped
+        """
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute(
+                "SELECT fingerprint FROM audios WHERE full_audio_id = ?",
+                (full_audio_id,),
+            ).fetchone()
+            if row is not None and row[0] == fingerprint:
+                return False
+            if row is not None:
+                self._delete_stages(connection, STAGES, full_audio_id)
+            connection.execute(
+                "INSERT OR REPLACE INTO audios (full_audio_id, fingerprint) "
+                "VALUES (?, ?)",
+                (full_audio_id, fingerprint),
+            )
+            connection.commit()
+            return row is not None
+
+    def complete_stage(self, full_audio_id, stage, artifact=None, segments=None):
+        """Records that a stage finished for an audio.
+
+        Args:
+            full_audio_id (str): Identifier of the audio
+            stage (str): One of `STAGES`
+            artifact (dict, optional): JSON serializable result of the stage
+            segments (dict, optional): JSON serializable result by segment id
+        """
+        if stage not in STAGES:
+            raise ValueError(f"Unknown pipeline stage: {stage}")
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute(
+                    "DELETE FROM segment_stages WHERE full_audio_id = ? AND stage = ?",
+                    (full_audio_id, stage),
+                )
+                connection.executemany(
+                    "INSERT INTO segment_stages (full_audio_id, segment_id, stage, "
+                    "position, artifact) VALUES (?, ?, ?, ?, ?)",
+                    (
+                        (full_audio_id, segment_id, stage, position, json.dumps(value))
+                        for position, (segment_id, value) in enumerate(
+                            (segments or {}).items()
+                        )
+                    ),
+                )
+                connection.execute(
+                    "INSERT OR REPLACE INTO audio_stages "
+                    "(full_audio_id, stage, artifact, completed_at) VALUES (?, ?, ?, ?)",
+                    (full_audio_id, stage, json.dumps(artifact or {}), time.time()),
+                )
+
+    def get_stage(self, full_audio_id, stage):
+        """Returns the artifact of a completed stage, or None if it is not complete."""
+        with self._lock:
+            row = (
+                self._connect()
+                .execute(
+                    "SELECT artifact FROM audio_stages "
+                    "WHERE full_audio_id = ? AND stage = ?",
+                    (full_audio_id, stage),
+                )
+                .fetchone()
+            )
+        return json.loads(row[0]) if row is not None else None
+
+    def get_segments(self, full_audio_id, stage):
+        """Returns the per segment artifacts of a stage, in the order they were recorded.
+
+        Returns:
+            dict: Artifact by segment id, empty if the stage is not complete
+        """
+        with self._lock:
+            rows = (
+                self._connect()
+                .execute(
+                    "SELECT segment_id, artifact FROM segment_stages "
+                    "WHERE full_audio_id = ? AND stage = ? ORDER BY position",
+                    (full_audio_id, stage),
+                )
+                .fetchall()
+            )
+        return {segment_id: json.loads(artifact) for segment_id, artifact in rows}
+
+    def completed_stages(self, full_audio_id):
+        """Returns the stages completed for an audio, in pipeline order."""
+        with self._lock:
+            rows = (
+                self._connect()
+                .execute(
+                    "SELECT stage FROM audio_stages WHERE full_audio_id = ?",
+                    (full_audio_id,),
+                )
+                .fetchall()
+            )
+        completed = {stage for (stage,) in rows}
+        return [stage for stage in STAGES if stage in completed]
+
+    def next_stage(self, full_audio_id):
+        """Returns the first stage left to run for an audio, or None if all are done."""
+        completed = self.completed_stages(full_audio_id)
+        for stage in STAGES:
+            if stage not in completed:
+                return stage
+        return None
+
+    def reset_stage(self, stage, full_audio_id=None):
+        """Forgets a stage and every later stage so the next run redoes them.
+
+        Earlier stages are kept, e.g. resetting "correct" after a prompt change
+        reruns the LLM correction from the recorded transcripts.
+
+        Args:
+            stage (str): One of `STAGES`
+            full_audio_id (str, optional): Audio to reset, all audios by default
+        """
+        if stage not in STAGES:
+            raise ValueError(f"Unknown pipeline stage: {stage}")
+        with self._lock:
+            connection = self._connect()
+            later_stages = STAGES[STAGES.index(stage) :]  # noqa: E203
+            self._delete_stages(connection, later_stages, full_audio_id)
+            connection.commit()
+
+    @staticmethod
+    def _delete_stages(connection, stages, full_audio_id=None):
+        placeholders = ", ".join("?" * len(stages))
+        condition = f"stage IN ({placeholders})"
+        parameters = list(stages)
+        if full_audio_id is not None:
+            condition += " AND full_audio_id = ?"
+            parameters.append(full_audio_id)
+        connection.execute(f"DELETE FROM audio_stages WHERE {condition}", parameters)
+        connection.execute(f"DELETE FROM segment_stages WHERE {condition}", parameters)
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None and self._pid == os.getpid():
+                self._connection.close()
+            self._connection = None
+
+
+# Open manifests of the process, keyed by path.
+_manifests = {}
+_manifests_lock = threading.Lock()
+
+
+def get_manifest(path=MANIFEST_PATH):
+    """Returns the pipeline manifest stored at `path`, opening it on first use.
+
+    Args:
+        path (str): Path of the SQLite database file
+
+    Returns:
+        PipelineManifest: The manifest
+    """
+    with _manifests_lock:
+        manifest = _manifests.get(path)
+        if manifest is None:
+            manifest = _manifests[path] = PipelineManifest(path)
+        return manifest
+
+
+def close_manifests():
+    """Closes every open manifest, they are reopened on next use."""
+    with _manifests_lock:
+        for manifest in _manifests.values():
+            manifest.close()
+        _manifests.clear()
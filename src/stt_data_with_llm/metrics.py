@@ -0,0 +1,346 @@
+import bisect
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+from stt_data_with_llm.config import METRICS_LATENCY_BUCKETS, TRACE_PATH
+
+METRIC_PREFIX = "stt_"
+
+
+def _labels_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class MetricsRegistry:
+    """Thread safe counters and latency histograms of the pipeline operations.
+
+    Args:
+        buckets (tuple of float): Upper bounds in seconds of the histogram buckets
+    """
+
+    def __init__(self, buckets=METRICS_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def increment(self, name, value=1, **labels):
+        """Adds `value` to the counter `name` with the given labels."""
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        """Records a duration in the histogram `name` with the given labels."""
+        key = (name, _labels_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {
+                    "buckets": [0] * len(self.buckets),
+                    "count": 0,
+                    "sum": 0.0,
+                }
+            bucket = bisect.bisect_left(self.buckets, seconds)
+            if bucket < len(self.buckets):
+                histogram["buckets"][bucket] += 1
+            histogram["count"] += 1
+            histogram["sum"] += seconds
+
+    def get_counter(self, name, **labels):
+        """Returns the value of a counter, 0 if it was never incremented."""
+        with self._lock:
+            return self._counters.get((name, _labels_key(labels)), 0)
+
+    def snapshot(self, reset=False):
+        """Returns the current values, JSON serializable.
+
+        Args:
+            reset (bool): Whether to clear the values in the same step, so the
+                next snapshot only holds what happened after this one
+
+        Returns:
+            dict: "counters" and "histograms" lists, the histogram buckets are
+                cumulative like in the Prometheus format
+        """
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            histograms = []
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                cumulative = 0
+                buckets = {}
+                for bound, count in zip(self.buckets, histogram["buckets"]):
+                    cumulative += count
+                    buckets[str(bound)] = cumulative
+                buckets["+Inf"] = histogram["count"]
+                histograms.append(
+                    {
+                        "name": name,
+                        "labels": dict(labels),
+                        "count": histogram["count"],
+                        "sum": histogram["sum"],
+                        "buckets": buckets,
+                    }
+                )
+            if reset:
+                self._counters.clear()
+                self._histograms.clear()
+        return {"counters": counters, "histograms": histograms}
+
+    def merge(self, snapshot):
+        """Adds the values of a snapshot, e.g. one taken in a worker process.
+
+        Args:
+            snapshot (dict): Value returned by `snapshot` of a registry with the
+                same buckets
+        """
+        with self._lock:
+            for counter in snapshot["counters"]:
+                key = (counter["name"], _labels_key(counter["labels"]))
+                self._counters[key] = self._counters.get(key, 0) + counter["value"]
+            for merged in snapshot["histograms"]:
+                key = (merged["name"], _labels_key(merged["labels"]))
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = {
+                        "buckets": [0] * len(self.buckets),
+                        "count": 0,
+                        "sum": 0.0,
+                    }
+                previous = 0
+                for index, bound in enumerate(self.buckets):
+                    cumulative = merged["buckets"][str(bound)]
+                    histogram["buckets"][index] += cumulative - previous
+                    previous = cumulative
+                histogram["count"] += merged["count"]
+                histogram["sum"] += merged["sum"]
+
+    def to_prometheus(self):
+        """Returns the current values in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = []
+        declared = set()
+        for counter in snapshot["counters"]:
+            name = METRIC_PREFIX + counter["name"]
+            if name not in declared:
+                lines.append(f"# TYPE {name} counter")
+                declared.add(name)
+            labels = _format_labels(sorted(counter["labels"].items()))
+            lines.append(f"{name}{labels} {counter['value']}")
+        for histogram in snapshot["histograms"]:
+            name = METRIC_PREFIX + histogram["name"]
+            if name not in declared:
+                lines.append(f"# TYPE {name} histogram")
+                declared.add(name)
+            labels = sorted(histogram["labels"].items())
+            for bound, count in histogram["buckets"].items():
+                lines.append(
+                    f"{name}_bucket{_format_labels(labels, [('le', bound)])} {count}"
+                )
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram['sum']}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+class AudioTrace:
+    """Operation timings and counters of a single audio.
+
+    Every metric recorded while the trace is active, see `use_trace`, is also
+    added to the trace, so its summary shows where the time of the audio went.
+
+    Args:
+        full_audio_id (str): Identifier of the audio
+    """
+
+    def __init__(self, full_audio_id):
+        self.full_audio_id = full_audio_id
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        self.operations = {}
+        self.counters = {}
+
+    def add_operation(self, operation, seconds):
+        with self._lock:
+            count, total, longest = self.operations.get(operation, (0, 0.0, 0.0))
+            self.operations[operation] = (
+                count + 1,
+                total + seconds,
+                max(longest, seconds),
+            )
+
+    def add_counter(self, name, value):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self):
+        """Returns the trace as a JSON serializable dict.
+
+        Returns:
+            dict: "full_audio_id", "wall_seconds", "operations" with the "count",
+                "seconds" and "max_seconds" of every operation, and "counters"
+        """
+        with self._lock:
+            return {
+                "full_audio_id": self.full_audio_id,
+                "wall_seconds": round(time.monotonic() - self.started, 6),
+                "operations": {
+                    operation: {
+                        "count": count,
+                        "seconds": round(total, 6),
+                        "max_seconds": round(longest, 6),
+                    }
+                    for operation, (count, total, longest) in sorted(
+                        self.operations.items()
+                    )
+                },
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+
+_registry = MetricsRegistry()
+_current_trace = contextvars.ContextVar("audio_trace", default=None)
+
+
+def get_registry():
+    """Returns the metrics registry of the current process."""
+    return _registry
+
+
+def increment(name, value=1, **labels):
+    """Adds `value` to a counter of the registry and of the current audio trace.
+
+    Args:
+        name (str): Counter name, e.g. "bytes_total"
+        value (float): Amount to add
+        **labels: Label values of the counter
+    """
+    _registry.increment(name, value, **labels)
+    trace = _current_trace.get()
+    if trace is not None:
+        label_values = (str(label) for _, label in sorted(labels.items()))
+        trace.add_counter(".".join([name, *label_values]), value)
+
+
+@contextlib.contextmanager
+def timed(operation):
+    """Measures the wall time of an operation, also usable as a decorator.
+
+    The duration goes to the "operation_seconds" histogram and the current audio
+    trace. An exception leaving the block also increments "errors_total".
+
+    Args:
+        operation (str): Name of the operation, e.g. "get_split_audio"
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        increment("errors_total", operation=operation)
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        _registry.observe("operation_seconds", seconds, operation=operation)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_operation(operation, seconds)
+
+
+@contextlib.contextmanager
+def use_trace(trace):
+    """Makes `trace` the current audio trace of the calling thread for the block."""
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def bind_trace(func):
+    """Wraps `func` to run with the audio trace current when it was wrapped.
+
+    Threads of an executor do not inherit the trace of the thread submitting the
+    work, wrap the submitted function with `bind_trace` to keep their metrics in
+    the trace.
+    """
+    trace = _current_trace.get()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with use_trace(trace):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def export_prometheus():
+    """Returns the metrics of the current process in the Prometheus text format."""
+    return _registry.to_prometheus()
+
+
+def export_json():
+    """Returns a JSON snapshot of the metrics of the current process."""
+    return json.dumps(_registry.snapshot(), indent=2)
+
+
+def write_metrics(path):
+    """Writes the metrics of the current process to `path`.
+
+    Args:
+        path (str): Output file, JSON when it ends with ".json" and Prometheus text
+            otherwise, e.g. for the node exporter textfile collector
+    """
+    content = export_json() if path.endswith(".json") else export_prometheus()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        file.write(content)
+    os.replace(temp_path, path)
+
+
+def finish_trace(trace, path=TRACE_PATH):
+    """Logs the summary of an audio trace and appends it to the trace file.
+
+    Args:
+        trace (AudioTrace): Trace of a finished audio
+        path (str, optional): JSON lines file of the summaries, None does nothing
+    """
+    if path is None:
+        return
+    summary = trace.summary()
+    slowest = sorted(
+        summary["operations"].items(), key=lambda item: -item[1]["seconds"]
+    )[:3]
+    logging.info(
+        f"Trace of {trace.full_audio_id}: {summary['wall_seconds']:.1f} s, "
+        + ", ".join(
+            f"{operation} {stats['seconds']:.1f} s" for operation, stats in slowest
+        )
+    )
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a", encoding="utf-8") as file:
+        file.write(json.dumps(summary, ensure_ascii=False) + "\n")
@@ -0,0 +1,289 @@
+import logging
+import os
+import random
+import threading
+import time
+
+from stt_data_with_llm.config import (
+    RATE_LIMITS,
+    RETRY_ATTEMPTS,
+    RETRY_BACKOFF_BASE,
+    RETRY_BACKOFF_MAX,
+    RETRY_BUDGET_MIN,
+    RETRY_BUDGET_RATIO,
+)
+from stt_data_with_llm.metrics import increment
+
+# HTTP statuses telling the client to slow down, as opposed to other server errors
+OVERLOAD_STATUSES = (429, 503, 529)
+
+
+class RetryableError(Exception):
+    """A request failed in a way that may succeed when retried.
+
+    Args:
+        message (str): Description of the failure
+        overloaded (bool): Whether the endpoint asked the client to slow down
+        retry_after (float, optional): Seconds the endpoint asked to wait
+    """
+
+    def __init__(self, message, overloaded=False, retry_after=None):
+        super().__init__(message)
+        self.overloaded = overloaded
+        self.retry_after = retry_after
+
+
+def parse_retry_after(headers):
+    """Returns the seconds of a `Retry-After` header, None if absent or a date."""
+    value = (headers or {}).get("retry-after") or (headers or {}).get("Retry-After")
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def check_status(status_code, headers=None):
+    """Raises `RetryableError` for a 429 or 5xx status.
+
+    Args:
+        status_code (int): HTTP status of a response
+        headers (dict, optional): Headers of the response
+    """
+    if status_code == 429 or status_code >= 500:
+        raise RetryableError(
+            f"HTTP {status_code}",
+            overloaded=status_code in OVERLOAD_STATUSES,
+            retry_after=parse_retry_after(headers),
+        )
+
+
+class RateLimiter:
+    """Client side rate control of one endpoint, shared by the threads of a process.
+
+    Requests are spaced by a token bucket sized to the endpoint quota, and the
+    number of requests in flight adapts to the endpoint (AIMD): it starts at
+    `max_concurrency`, is halved when the endpoint answers 429/503/529, reduced
+    when requests get slower than `target_latency`, and grows back by one per
+    window of successful requests.
+    Failed requests are retried with jittered exponential backoff, a `Retry-After`
+    pauses every thread, and a retry budget earned by successful requests stops
+    retries from multiplying the load while the endpoint is down.
+
+    Args:
+        name (str): Name of the endpoint, used in logs and metrics
+        requests_per_second (float): Sustained request rate of the token bucket
+        burst (int): Capacity of the token bucket
+        max_concurrency (int): Upper bound of the requests in flight
+        min_concurrency (int): Lower bound of the requests in flight
+        target_latency (float, optional): Seconds over which a request counts as
+            a congestion signal
+        retry_attempts (int): Maximum number of attempts of a request
+        backoff_base (float): Backoff in seconds of the first retry
+        backoff_max (float): Maximum backoff in seconds
+        retry_budget_ratio (float): Retries earned by every successful request
+        retry_budget_min (float): Retries available before any success
+    """
+
+    def __init__(
+        self,
+        name,
+        requests_per_second,
+        burst=1,
+        max_concurrency=8,
+        min_concurrency=1,
+        target_latency=None,
+        retry_attempts=RETRY_ATTEMPTS,
+        backoff_base=RETRY_BACKOFF_BASE,
+        backoff_max=RETRY_BACKOFF_MAX,
+        retry_budget_ratio=RETRY_BUDGET_RATIO,
+        retry_budget_min=RETRY_BUDGET_MIN,
+    ):
+        self.name = name
+        self.requests_per_second = requests_per_second
+        self.burst = max(burst, 1)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.target_latency = target_latency
+        self.retry_attempts = retry_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_budget_ratio = retry_budget_ratio
+        self.retry_budget_min = retry_budget_min
+
+        self._condition = threading.Condition()
+        self._tokens = float(self.burst)
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+        self.concurrency = float(max_concurrency)
+        self.in_flight = 0
+        self._retry_credits = float(retry_budget_min)
+
+    def _refill(self, now):
+        elapsed = now - self._refilled_at
+        self._tokens = min(
+            self.burst, self._tokens + elapsed * self.requests_per_second
+        )
+        self._refilled_at = now
+
+    def acquire(self):
+        """Waits for a free concurrency slot and a token of the bucket."""
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._paused_until - now
+                if wait <= 0 and self.in_flight >= int(self.concurrency):
+                    wait = None
+                elif wait <= 0 and self._tokens < 1:
+                    wait = (1 - self._tokens) / self.requests_per_second
+                elif wait <= 0:
+                    self._tokens -= 1
+                    self.in_flight += 1
+                    return
+                self._condition.wait(wait)
+
+    def release(self, latency=None, overloaded=False, retry_after=None):
+        """Frees the slot of a finished request and adapts the concurrency.
+
+        Args:
+            latency (float, optional): Seconds the request took, None if it failed
+            overloaded (bool): Whether the endpoint asked the client to slow down
+            retry_after (float, optional): Seconds the endpoint asked to wait
+        """
+        with self._condition:
+            self.in_flight -= 1
+            if overloaded:
+                self.concurrency = max(self.min_concurrency, self.concurrency / 2)
+                logging.warning(
+                    f"{self.name} is overloaded, concurrency lowered to "
+                    f"{int(self.concurrency)}"
+                )
+            elif latency is not None:
+                if self.target_latency is not None and latency > self.target_latency:
+                    self.concurrency = max(self.min_concurrency, self.concurrency * 0.9)
+                else:
+                    self.concurrency = min(
+                        self.max_concurrency, self.concurrency + 1 / self.concurrency
+                    )
+                self._retry_credits = min(
+                    self._retry_credits + self.retry_budget_ratio,
+                    self.retry_budget_min + self.max_concurrency,
+                )
+            if retry_after:
+                self._paused_until = max(
+                    self._paused_until, time.monotonic() + retry_after
+                )
+            self._condition.notify_all()
+
+    def _take_retry_credit(self):
+        with self._condition:
+            if self._retry_credits < 1:
+                return False
+            self._retry_credits -= 1
+            return True
+
+    def backoff(self, attempt, retry_after=None):
+        """Returns the jittered delay before retry number `attempt`, from 1."""
+        delay = random.uniform(
+            0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        )
+        return max(delay, retry_after or 0.0)
+
+    def call(self, func, *args, **kwargs):
+        """Calls `func` within the limits, retrying on `RetryableError`.
+
+        Args:
+            func (callable): Sends the request and raises `RetryableError` for
+                failures worth retrying
+            *args: Positional arguments of `func`
+            **kwargs: Keyword arguments of `func`
+
+        Returns:
+            The result of `func`
+
+        Raises:
+            RetryableError: The last failure once the attempts or the retry budget
+                are exhausted
+            Exception: Any other error of `func`, which is not retried
+        """
+        attempt = 1
+        while True:
+            self.acquire()
+            start = time.monotonic()
+            try:
+                result = func(*args, **kwargs)
+            except RetryableError as e:
+                self.release(overloaded=e.overloaded, retry_after=e.retry_after)
+                if e.overloaded:
+                    increment("rate_limited_total", endpoint=self.name)
+                if attempt >= self.retry_attempts:
+                    raise
+                if not self._take_retry_credit():
+                    logging.warning(f"Retry budget of {self.name} exhausted: {e}")
+                    raise
+                delay = self.backoff(attempt, e.retry_after)
+                logging.warning(
+                    f"{self.name} request failed ({e}), retry {attempt} in {delay:.1f} s"
+                )
+                increment("retries_total", operation=self.name)
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                self.release()
+                raise
+            self.release(latency=time.monotonic() - start)
+            return result
+
+
+# Rate limiters of the current process, keyed by endpoint name.
+_limiters = {}
+_limiters_pid = os.getpid()
+_limiters_lock = threading.Lock()
+_limits_share = 1.0
+
+
+def set_rate_limit_share(share):
+    """Gives the current process a share of every endpoint quota.
+
+    Worker processes of the process pool runner each take `1 / workers` of the
+    quota so that together they stay within it.
+
+    Args:
+        share (float): Fraction of the request rate, burst and concurrency, up to 1
+    """
+    global _limits_share
+    with _limiters_lock:
+        _limits_share = share
+        _limiters.clear()
+
+
+def get_rate_limiter(name):
+    """Returns the rate limiter of the endpoint `name` configured in `RATE_LIMITS`.
+
+    Args:
+        name (str): Endpoint name, e.g. "inference" or "llm"
+
+    Returns:
+        RateLimiter: Limiter shared by every thread of the current process
+    """
+    global _limiters_pid
+    with _limiters_lock:
+        if _limiters_pid != os.getpid():
+            _limiters.clear()
+            _limiters_pid = os.getpid()
+        limiter = _limiters.get(name)
+        if limiter is None:
+            limits = dict(RATE_LIMITS[name])
+            limits["requests_per_second"] *= _limits_share
+            for key in ("burst", "max_concurrency"):
+                if key in limits:
+                    limits[key] = max(1, int(limits[key] * _limits_share))
+            limiter = _limiters[name] = RateLimiter(name, **limits)
+        return limiter
+
+
+def reset_rate_limiters():
+    """Drops the limiters of the process, they are recreated on next use."""
+    with _limiters_lock:
+        _limiters.clear()
@@ -0,0 +1,194 @@
+import bisect
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from stt_data_with_llm.config import (
+    TRANSFER_ANCHOR_CHARS,
+    TRANSFER_WINDOW_CHARS,
+    TRANSFER_WORKERS,
+)
+from stt_data_with_llm.metrics import increment
+
+SEGMENT_SEPARATOR = "\n"
+
+
+def transfer_newlines(source, target):
+    """Copies the line breaks of `source` into `target` with fast-antx.
+
+    Args:
+        source (str): Text whose line breaks are transferred
+        target (str): Text receiving the line breaks
+
+    Returns:
+        str: `target` with the line breaks of `source`
+    """
+    from fast_antx.core import transfer
+
+    patterns = [["segmentation", "(\n)"]]
+    return transfer(source, patterns, target)
+
+
+def _unique_kgrams(text, size):
+    """Returns the position of every k-gram occurring exactly once in `text`."""
+    positions = {}
+    for position in range(len(text) - size + 1):
+        kgram = text[position : position + size]  # noqa: E203
+        positions[kgram] = -1 if kgram in positions else position
+    return {kgram: position for kgram, position in positions.items() if position >= 0}
+
+
+def find_anchors(source, target, size=TRANSFER_ANCHOR_CHARS):
+    """Finds high confidence matches between two versions of a text.
+
+    Anchors are k-grams of `size` characters occurring exactly once in each text,
+    kept when they are in the same order in both texts (longest increasing
+    subsequence, like patience diff) and when the anchor before or after them lies
+    on the same diagonal, so that the exact match spans more than one k-gram.
+
+    Args:
+        source (str): First text
+        target (str): Second text
+        size (int): Length of the matched k-grams
+
+    Returns:
+        list of tuple: (source position, target position) of the anchors, increasing
+            in both texts
+    """
+    target_kgrams = _unique_kgrams(target, size)
+    matches = sorted(
+        (source_position, target_kgrams[kgram])
+        for kgram, source_position in _unique_kgrams(source, size).items()
+        if kgram in target_kgrams
+    )
+
+    # Longest chain of matches increasing in both texts.
+    tails, tail_indices, previous = [], [], [None] * len(matches)
+    for index, (_, target_position) in enumerate(matches):
+        rank = bisect.bisect_left(tails, target_position)
+        if rank:
+            previous[index] = tail_indices[rank - 1]
+        if rank == len(tails):
+            tails.append(target_position)
+            tail_indices.append(index)
+        else:
+            tails[rank] = target_position
+            tail_indices[rank] = index
+    chain = []
+    index = tail_indices[-1] if tail_indices else None
+    while index is not None:
+        chain.append(matches[index])
+        index = previous[index]
+    chain.reverse()
+
+    def diagonal(anchor):
+        return anchor[0] - anchor[1]
+
+    return [
+        anchor
+        for position, anchor in enumerate(chain)
+        if (position and diagonal(chain[position - 1]) == diagonal(anchor))
+        or (
+            position + 1 < len(chain)
+            and diagonal(chain[position + 1]) == diagonal(anchor)
+        )
+    ]
+
+
+def _window_cuts(anchors, size, window_chars):
+    """Picks anchors about `window_chars` source characters apart to cut windows at.
+
+    A cut lies in the middle of its anchor, where both texts are equal.
+    """
+    cuts = []
+    last_cut = 0
+    for source_position, target_position in anchors:
+        middle = size // 2
+        if source_position + middle - last_cut >= window_chars:
+            cuts.append((source_position + middle, target_position + middle))
+            last_cut = source_position + middle
+    return cuts
+
+
+def transfer_segmentation_windowed(
+    inference_transcript,
+    reference_transcript,
+    align=transfer_newlines,
+    window_chars=TRANSFER_WINDOW_CHARS,
+    anchor_chars=TRANSFER_ANCHOR_CHARS,
+    workers=TRANSFER_WORKERS,
+):
+    """Transfers the line breaks of the inference transcript to the reference one.
+
+    Transcripts up to `window_chars` characters are aligned in a single `align`
+    call. Longer ones are cut into windows of about `window_chars` characters at
+    anchors, see `find_anchors`, where both transcripts match exactly, so the
+    aligner cost grows with the transcript length instead of its square. The
+    windows are independent and aligned by `workers` threads, fast-antx runs its
+    diff in a subprocess. Windows without a line break are copied as is.
+
+    Args:
+        inference_transcript (str): Transcript with one line per segment
+        reference_transcript (str): Transcript receiving the segmentation
+        align (callable): Aligner taking (source, target) and returning the target
+            with the line breaks of the source
+        window_chars (int): Target number of source characters per window
+        anchor_chars (int): Length of the anchors
+        workers (int): Number of windows aligned at the same time
+
+    Returns:
+        str: The reference transcript with the segmentation of the inference one
+    """
+    source = inference_transcript.replace(SEGMENT_SEPARATOR, "")
+    if max(len(source), len(reference_transcript)) <= window_chars:
+        return align(inference_transcript, reference_transcript)
+
+    cuts = _window_cuts(
+        find_anchors(source, reference_transcript, anchor_chars),
+        anchor_chars,
+        window_chars,
+    )
+    if not cuts:
+        return align(inference_transcript, reference_transcript)
+
+    # Source positions of the line breaks, in the text without them.
+    breaks = []
+    position = 0
+    for line in inference_transcript.split(SEGMENT_SEPARATOR)[:-1]:
+        position += len(line)
+        breaks.append(position)
+
+    bounds = [(0, 0)] + cuts + [(len(source), len(reference_transcript))]
+    windows = []
+    break_index = 0
+    for (source_start, target_start), (source_end, target_end) in zip(
+        bounds, bounds[1:]
+    ):
+        # A line break on a cut belongs to the window it ends.
+        window_breaks = []
+        while break_index < len(breaks) and breaks[break_index] <= source_end:
+            window_breaks.append(breaks[break_index] - source_start)
+            break_index += 1
+        window_source = source[source_start:source_end]
+        for offset in reversed(window_breaks):
+            window_source = (
+                window_source[:offset] + SEGMENT_SEPARATOR + window_source[offset:]
+            )
+        windows.append((window_source, reference_transcript[target_start:target_end]))
+
+    def align_window(window):
+        window_source, window_target = window
+        if SEGMENT_SEPARATOR not in window_source:
+            return window_target
+        return align(window_source, window_target)
+
+    increment("transfer_windows_total", len(windows))
+    logging.info(
+        f"Transferring the segmentation of {len(source)} characters in "
+        f"{len(windows)} windows"
+    )
+    if workers <= 1:
+        return "".join(map(align_window, windows))
+    with ThreadPoolExecutor(
+        max_workers=min(workers, len(windows)), thread_name_prefix="transfer"
+    ) as executor:
+        return "".join(executor.map(align_window, windows))
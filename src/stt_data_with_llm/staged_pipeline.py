@@ -0,0 +1,199 @@
+import logging
+import queue
+import threading
+import time
+
+from stt_data_with_llm.config import STAGE_LOG_INTERVAL, STAGE_QUEUE_SIZE
+
+# Seconds a blocked worker waits before checking whether the pipeline was closed
+_POLL_INTERVAL = 0.1
+
+
+class Stage:
+    """A step of a `StagedPipeline`.
+
+    Args:
+        name (str): Name of the stage, used in the queue depths and logs
+        func (callable): Called with an item, returns True to pass the item to the
+            next stage or False when the item is finished
+        workers (int): Number of threads running the stage
+        queue_size (int): Number of items waiting in front of the stage before the
+            previous stage blocks
+    """
+
+    __slots__ = ("name", "func", "workers", "queue_size")
+
+    def __init__(self, name, func, workers=1, queue_size=STAGE_QUEUE_SIZE):
+        if workers < 1 or queue_size < 1:
+            raise ValueError(f"Stage {name} needs at least one worker and queue slot")
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.queue_size = queue_size
+
+
+class StagedPipeline:
+    """Streams items through stages that each run on their own worker threads.
+
+    Stages are connected by bounded queues, a stage whose next queue is full blocks
+    until the next stage catches up, so a slow stage holds back the ones before it
+    instead of letting items pile up in memory. Finished items wait in a bounded
+    queue too, so a slow consumer of the results holds back every stage. The queue
+    depths show which stage is the bottleneck: items accumulate in front of it.
+
+    Args:
+        stages (list of Stage): Stages in execution order
+        results_size (int): Number of finished items waiting to be yielded before
+            the stages block
+    """
+
+    def __init__(self, stages, results_size=STAGE_QUEUE_SIZE):
+        self.stages = list(stages)
+        if not self.stages:
+            raise ValueError("A staged pipeline needs at least one stage")
+        if results_size < 1:
+            raise ValueError("A staged pipeline needs at least one result slot")
+        self._queues = [queue.Queue(stage.queue_size) for stage in self.stages]
+        self._results = queue.Queue(results_size)
+        self._lock = threading.Lock()
+        self._busy = [0] * len(self.stages)
+        self._processed = [0] * len(self.stages)
+        self._closed = threading.Event()
+        self._started = False
+
+    def queue_depths(self):
+        """Returns the number of items waiting in front of every stage.
+
+        Returns:
+            dict: Queue depth by stage name
+        """
+        return {
+            stage.name: stage_queue.qsize()
+            for stage, stage_queue in zip(self.stages, self._queues)
+        }
+
+    def stats(self):
+        """Returns the queue depth, busy workers and processed items of every stage.
+
+        Returns:
+            dict: {"queued", "busy", "workers", "processed"} by stage name
+        """
+        with self._lock:
+            return {
+                stage.name: {
+                    "queued": self._queues[index].qsize(),
+                    "busy": self._busy[index],
+                    "workers": stage.workers,
+                    "processed": self._processed[index],
+                }
+                for index, stage in enumerate(self.stages)
+            }
+
+    def run(self, items, log_interval=STAGE_LOG_INTERVAL):
+        """Runs every item through the stages and yields them as they finish.
+
+        Items come back in completion order, once each, after the last stage or the
+        stage that finished them early. An exception raised by a stage finishes the
+        item and is yielded with it. Closing the generator early stops the workers.
+
+        Args:
+            items (iterable): Items to process, consumed as the first queue has room
+            log_interval (float, optional): Seconds between two logs of the queue
+                depths, None disables them
+
+        Yields:
+            tuple: (item, exception raised by a stage or None)
+        """
+        if self._started:
+            raise RuntimeError("A staged pipeline can only run once")
+        self._started = True
+        submitted = [0]
+        feeding = threading.Event()
+        feeding.set()
+        feed_errors = []
+
+        def feed():
+            try:
+                for item in items:
+                    if not self._put(self._queues[0], item):
+                        return
+                    with self._lock:
+                        submitted[0] += 1
+            except Exception as e:
+                feed_errors.append(e)
+            finally:
+                feeding.clear()
+
+        threads = [threading.Thread(target=feed, name="stage-feed", daemon=True)]
+        for index, stage in enumerate(self.stages):
+            threads += [
+                threading.Thread(
+                    target=self._work,
+                    args=(index,),
+                    name=f"stage-{stage.name}-{worker}",
+                    daemon=True,
+                )
+                for worker in range(stage.workers)
+            ]
+        for thread in threads:
+            thread.start()
+
+        finished = 0
+        last_log = time.monotonic()
+        try:
+            while True:
+                with self._lock:
+                    if not feeding.is_set() and finished == submitted[0]:
+                        break
+                try:
+                    yield self._results.get(timeout=_POLL_INTERVAL)
+                    finished += 1
+                except queue.Empty:
+                    pass
+                if log_interval is not None and (
+                    time.monotonic() - last_log >= log_interval
+                ):
+                    logging.info(f"Stage queue depths: {self.queue_depths()}")
+                    last_log = time.monotonic()
+            if feed_errors:
+                raise feed_errors[0]
+        finally:
+            self._closed.set()
+            for thread in threads:
+                thread.join()
+
+    def _put(self, stage_queue, item):
+        """Puts an item in a queue, waiting for room unless the pipeline is closed."""
+        while not self._closed.is_set():
+            try:
+                stage_queue.put(item, timeout=_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _work(self, index):
+        stage = self.stages[index]
+        stage_queue = self._queues[index]
+        is_last = index == len(self.stages) - 1
+        while not self._closed.is_set():
+            try:
+                item = stage_queue.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                continue
+            with self._lock:
+                self._busy[index] += 1
+            try:
+                forward = stage.func(item)
+                error = None
+            except Exception as e:
+                forward = False
+                error = e
+            finally:
+                with self._lock:
+                    self._busy[index] -= 1
+                    self._processed[index] += 1
+            if forward and not is_last:
+                self._put(self._queues[index + 1], item)
+            else:
+                self._put(self._results, (item, error))
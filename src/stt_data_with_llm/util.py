@@ -1,53 +1,137 @@
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
-
-from evaluate import load
+import os
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
+from stt_data_with_llm import cer
 from stt_data_with_llm.config import BACKUP_COUNT, MAX_BYTES
+from stt_data_with_llm.metrics import timed
+
+# Logging state of the current process
+_log_handler = None
+_log_file_handler = None
+_log_listener = None
+_log_pid = None
+_log_lock = threading.Lock()
 
-# Load the CER metric from the "evaluate" library
-cer_metric = load("cer")
 
+def setup_logging(filename="pipeline.log", log_queue=None):
+    """This function configures logging once for the whole process.
 
-# Configure logging
-def setup_logging(filename):
-    """This function sets up a logger with file handlers.
+    Records are handed to a queue by the root logger and written to a rotating
+    log file by a background listener thread, so logging never blocks on disk.
+    Calling it again is a no-op, except in a forked worker process which gets
+    its own queue and listener.
 
     Args:
         filename (str): The name of the log file to be created or appended to.
+        log_queue (multiprocessing.Queue, optional): Queue of the parent process
+            returned by `forward_worker_logs`. Records are sent there instead of
+            being written to `filename` by this process.
     """
-    logger = logging.getLogger()
-    logger.setLevel(logging.INFO)
-
-    # Create a formatter
-    formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-
-    # Create a file handler for a rotating log file
-    file_handler = RotatingFileHandler(
-        filename,
-        MAX_BYTES,
-        BACKUP_COUNT,
-    )
-    file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
+    global _log_handler, _log_file_handler, _log_listener, _log_pid
+    with _log_lock:
+        if _log_pid == os.getpid():
+            return
+        logger = logging.getLogger()
+        if _log_handler is not None:
+            # Inherited from the parent process, whose listener thread is not running here.
+            logger.removeHandler(_log_handler)
+        logger.setLevel(logging.INFO)
+        _log_pid = os.getpid()
+
+        if log_queue is not None:
+            _log_handler = QueueHandler(log_queue)
+            _log_file_handler = _log_listener = None
+            logger.addHandler(_log_handler)
+            return
+
+        # Create a formatter
+        formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+
+        # Create a file handler for a rotating log file
+        _log_file_handler = RotatingFileHandler(
+            filename,
+            MAX_BYTES,
+            BACKUP_COUNT,
+        )
+        _log_file_handler.setFormatter(formatter)
+
+        log_queue = queue.SimpleQueue()
+        _log_handler = QueueHandler(log_queue)
+        _log_listener = QueueListener(log_queue, _log_file_handler)
+        _log_listener.start()
+        logger.addHandler(_log_handler)
+        atexit.register(shutdown_logging)
+
+
+def forward_worker_logs(log_queue, filename="pipeline.log"):
+    """Writes the records that worker processes put on `log_queue` to the log file.
+
+    A single process owns the rotating log file, workers configured with
+    `setup_logging(log_queue=log_queue)` only send records to it.
 
+    Args:
+        log_queue (multiprocessing.Queue): Queue shared with the worker processes
+        filename (str): Log file used if logging is not set up yet
 
-def calculate_cer(reference, prediction):
-    """Calculate the Character Error Rate (CER) using the evaluate library.
+    Returns:
+        QueueListener: Started listener, stop it once the workers are done
+    """
+    setup_logging(filename)
+    handlers = [_log_file_handler] if _log_file_handler is not None else []
+    listener = QueueListener(log_queue, *handlers)
+    listener.start()
+    return listener
+
+
+def shutdown_logging():
+    """Flushes the queued log records and detaches the queue handler."""
+    global _log_handler, _log_file_handler, _log_listener, _log_pid
+    with _log_lock:
+        if _log_listener is not None and _log_pid == os.getpid():
+            _log_listener.stop()
+        if _log_handler is not None:
+            logging.getLogger().removeHandler(_log_handler)
+        _log_handler = _log_file_handler = _log_listener = _log_pid = None
+
+
+@timed("calculate_cer")
+def calculate_cer(reference, prediction, max_cer=None):
+    """Calculate the Character Error Rate (CER) with the native edit distance engine.
     args:
         reference(str): reference_transcript
         prediction(str): inference_transcript
+        max_cer(float, optional): stop early once the CER is known to exceed it
     Returns:
         float: The calculated CER value, bounded between 0.0 and 1.0.
     """
     try:
-        cer = cer_metric.compute(references=[reference], predictions=[prediction])
-        return min(cer, 1.0)  # Ensure CER does not exceed 1.0
+        return cer.calculate_cer(reference, prediction, max_cer)
     except Exception as e:
         print(f"Error calculating CER: {e}")
         return 1.0  # Return a high CER for safety
 
 
+@timed("calculate_prefix_cer")
+def calculate_prefix_cer(reference, prediction):
+    """Calculate the CER of a partial transcript against the reference prefix it matches.
+    args:
+        reference(str): full reference_transcript
+        prediction(str): inference_transcript of the start of the audio
+    Returns:
+        float: The calculated CER value, bounded between 0.0 and 1.0, or None when
+            it cannot be calculated
+    """
+    try:
+        return cer.calculate_prefix_cer(reference, prediction)
+    except Exception as e:
+        logging.error(f"Error calculating prefix CER: {e}")
+        return None
+
+
 def get_original_text(original_text):
     """reads the original text and removes unwanted characters
 
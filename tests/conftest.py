@@ -0,0 +1,21 @@
+import pytest
+
+from stt_data_with_llm.cache import reset_caches
+from stt_data_with_llm.rate_limiter import reset_rate_limiters
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache_dir(tmp_path, monkeypatch):
+    """Keeps the on-disk caches of every test in its own temporary directory."""
+    monkeypatch.setenv("STT_CACHE_DIR", str(tmp_path / "cache"))
+    reset_caches()
+    yield
+    reset_caches()
+
+
+@pytest.fixture(autouse=True)
+def isolated_rate_limiters():
+    """Gives every test fresh rate limiters, without the state of earlier tests."""
+    reset_rate_limiters()
+    yield
+    reset_rate_limiters()
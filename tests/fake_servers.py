@@ -0,0 +1,323 @@
+"""Local stand-ins for the remote services used by the pipeline."""
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class LocalServer(ThreadingHTTPServer):
+    """Threaded HTTP server bound to a free local port, usable as a context manager."""
+
+    daemon_threads = True
+
+    def __init__(self, handler_class, **attributes):
+        super().__init__(("127.0.0.1", 0), handler_class)
+        for name, value in attributes.items():
+            setattr(self, name, value)
+        self.lock = threading.Lock()
+        self.requests_served = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.client_ports = set()
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+
+class JSONHandler(BaseHTTPRequestHandler):
+    """Keep-alive handler with in-flight and connection bookkeeping."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length) if length else b""
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_queued_failure(self):
+        """Answers with the next status of `server.fail_statuses`, if any.
+
+        Statuses are popped in order, a (status, retry_after) tuple also sends a
+        Retry-After header. Returns True when a failure was sent.
+        """
+        with self.server.lock:
+            statuses = getattr(self.server, "fail_statuses", None)
+            if not statuses:
+                return False
+            status = statuses.pop(0)
+        status, retry_after = status if isinstance(status, tuple) else (status, None)
+        body = json.dumps({"error": {"type": "fake_error"}}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if retry_after is not None:
+            self.send_header("Retry-After", str(retry_after))
+        self.end_headers()
+        self.wfile.write(body)
+        return True
+
+    def track(self, handle):
+        server = self.server
+        with server.lock:
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            server.client_ports.add(self.client_address[1])
+        try:
+            handle()
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+                server.requests_served += 1
+
+
+class FakeASRHandler(JSONHandler):
+    """Mimics the Hugging Face inference endpoint behind `API_URL`.
+
+    The server attributes `latency` (seconds) and `transcribe` (callable taking
+    the posted WAV bytes) control the response, `fail_statuses` lists error
+    statuses answered before any transcript.
+    """
+
+    def do_POST(self):
+        def handle():
+            body = self.read_body()
+            time.sleep(getattr(self.server, "latency", 0.0))
+            if self.send_queued_failure():
+                return
+            transcribe = getattr(self.server, "transcribe", lambda wav: str(len(wav)))
+            self.send_json({"text": transcribe(body)})
+
+        self.track(handle)
+
+
+def fake_asr_server(latency=0.0, transcribe=None, fail_statuses=()):
+    """Returns a fake ASR endpoint, start it with a `with` block."""
+    attributes = {"latency": latency, "fail_statuses": list(fail_statuses)}
+    if transcribe is not None:
+        attributes["transcribe"] = transcribe
+    return LocalServer(FakeASRHandler, **attributes)
+
+
+def correct_segments_payload(prompt):
+    """Answers a multi-segment correction prompt by copying each reference."""
+    start = prompt.index("Segments: ") + len("Segments: ")
+    segments = json.JSONDecoder().raw_decode(prompt[start:])[0]
+    return json.dumps(
+        [
+            {
+                "id": segment["id"],
+                "corrected_text": segment["reference"] or segment["colloquial"],
+            }
+            for segment in segments
+        ],
+        ensure_ascii=False,
+    )
+
+
+def fake_message(text, model="fake-claude", stop_reason="end_turn"):
+    return {
+        "id": "msg_fake",
+        "type": "message",
+        "role": "assistant",
+        "model": model,
+        "content": [{"type": "text", "text": text}],
+        "stop_reason": stop_reason,
+        "stop_sequence": None,
+        "usage": {"input_tokens": 0, "output_tokens": 0},
+    }
+
+
+class FakeAnthropicHandler(JSONHandler):
+    """Anthropic-compatible Messages and Message Batches endpoints.
+
+    The server attribute `respond` (callable taking the prompt) produces the
+    assistant text, or a (text, stop_reason) tuple, `latency` delays every messages
+    call and `fail_statuses` lists error statuses answered before any message.
+    Submitted batches end after they have been polled `batch_polls` times. The
+    max_tokens of every answered request are recorded in `server.max_tokens`.
+    """
+
+    def answer(self, params):
+        prompt = params["messages"][-1]["content"]
+        respond = getattr(self.server, "respond", correct_segments_payload)
+        with self.server.lock:
+            self.server.__dict__.setdefault("max_tokens", []).append(
+                params["max_tokens"]
+            )
+        answer = respond(prompt)
+        text, stop_reason = (
+            answer if isinstance(answer, tuple) else (answer, "end_turn")
+        )
+        return fake_message(text, params.get("model", "fake-claude"), stop_reason)
+
+    def batch_object(self, batch_id):
+        batch = self.server.batches[batch_id]
+        ended = batch["polls"] >= getattr(self.server, "batch_polls", 1)
+        return {
+            "id": batch_id,
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {
+                "processing": 0 if ended else len(batch["requests"]),
+                "succeeded": len(batch["requests"]) if ended else 0,
+                "errored": 0,
+                "canceled": 0,
+                "expired": 0,
+            },
+            "created_at": "2024-01-01T00:00:00Z",
+            "expires_at": "2024-01-02T00:00:00Z",
+            "ended_at": "2024-01-01T00:01:00Z" if ended else None,
+            "archived_at": None,
+            "cancel_initiated_at": None,
+            "results_url": f"{self.server.url}/v1/messages/batches/{batch_id}/results"
+            if ended
+            else None,
+        }
+
+    def do_POST(self):
+        def handle():
+            params = json.loads(self.read_body())
+            time.sleep(getattr(self.server, "latency", 0.0))
+            if self.path.startswith("/v1/messages/batches"):
+                with self.server.lock:
+                    batches = self.server.__dict__.setdefault("batches", {})
+                    batch_id = f"msgbatch_{len(batches):04}"  # noqa: E231
+                    batches[batch_id] = {"requests": params["requests"], "polls": 0}
+                self.send_json(self.batch_object(batch_id))
+            elif self.send_queued_failure():
+                return
+            elif self.path.startswith("/v1/messages"):
+                self.server.message_calls = getattr(self.server, "message_calls", 0) + 1
+                self.send_json(self.answer(params))
+            else:
+                self.send_json({"error": "not found"}, status=404)
+
+        self.track(handle)
+
+    def do_GET(self):
+        parts = self.path.strip("/").split("/")
+        if parts[:3] != ["v1", "messages", "batches"] or len(parts) < 4:
+            self.send_json({"error": "not found"}, status=404)
+            return
+        batch_id = parts[3]
+        if len(parts) == 4:
+            self.server.batches[batch_id]["polls"] += 1
+            self.send_json(self.batch_object(batch_id))
+            return
+        lines = [
+            json.dumps(
+                {
+                    "custom_id": request["custom_id"],
+                    "result": {
+                        "type": "succeeded",
+                        "message": self.answer(request["params"]),
+                    },
+                }
+            )
+            for request in self.server.batches[batch_id]["requests"]
+        ]
+        body = ("\n".join(lines) + "\n").encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/binary")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def fake_anthropic_server(latency=0.0, respond=None, batch_polls=1, fail_statuses=()):
+    """Returns a fake Anthropic API, start it with a `with` block."""
+    attributes = {
+        "latency": latency,
+        "batch_polls": batch_polls,
+        "batches": {},
+        "fail_statuses": list(fail_statuses),
+    }
+    if respond is not None:
+        attributes["respond"] = respond
+    return LocalServer(FakeAnthropicHandler, **attributes)
+
+
+class FakeAudioFileHandler(JSONHandler):
+    """Serves the bytes of `server.files` by path with ETag and Range support.
+
+    A Range starting at or past the end of a file is answered with 416.
+
+    `server.latency` delays every response and `server.truncate_next` makes the
+    next full response stop after that many bytes, as if the connection dropped. Every request is recorded in
+    `server.request_log` as (status, request headers).
+    """
+
+    def do_GET(self):
+        def handle():
+            time.sleep(getattr(self.server, "latency", 0.0))
+            content = self.server.files.get(self.path)
+            if content is None:
+                self.send_json({"error": "not found"}, status=404)
+                self.server.request_log.append((404, dict(self.headers)))
+                return
+            etag = f'"{hashlib.sha256(content).hexdigest()[:16]}"'
+            status, body = 200, content
+            if self.headers.get("If-None-Match") == etag:
+                status, body = 304, b""
+            elif self.headers.get("Range") and self.headers.get("If-Range") in (
+                None,
+                etag,
+            ):
+                start = int(self.headers["Range"].split("=")[1].rstrip("-"))
+                status, body = (
+                    (206, content[start:]) if start < len(content) else (416, b"")
+                )
+            self.server.request_log.append((status, dict(self.headers)))
+
+            self.send_response(status)
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", "Mon, 01 Jan 2024 00:00:00 GMT")
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Content-Length", str(len(body)))
+            if status == 206:
+                self.send_header(
+                    "Content-Range",
+                    f"bytes {len(content) - len(body)}-{len(content) - 1}/{len(content)}",
+                )
+            elif status == 416:
+                self.send_header("Content-Range", f"bytes */{len(content)}")
+            self.end_headers()
+            truncate = getattr(self.server, "truncate_next", None)
+            if truncate is not None and status == 200:
+                self.server.truncate_next = None
+                self.wfile.write(body[:truncate])
+                self.wfile.flush()
+                self.close_connection = True
+                return
+            self.wfile.write(body)
+
+        self.track(handle)
+
+
+def fake_audio_file_server(files, latency=0.0):
+    """Returns a fake audio host serving `files` (path -> bytes)."""
+    return LocalServer(
+        FakeAudioFileHandler, files=dict(files), latency=latency, request_log=[]
+    )
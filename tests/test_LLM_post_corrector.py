@@ -0,0 +1,195 @@
+from unittest import mock
+
+from stt_data_with_llm import LLM_post_corrector
+from stt_data_with_llm.config import LLM_BATCH_MAX_TOKENS, RETRY_ATTEMPTS
+from stt_data_with_llm.LLM_post_corrector import (
+    build_batch_correction_prompt,
+    get_anthropic_client,
+    get_correction_cache,
+    get_LLM_corrected_texts,
+    get_LLM_corrected_texts_with_message_batch,
+    parse_batch_correction_response,
+    reset_anthropic_client,
+)
+from stt_data_with_llm.metrics import get_registry
+from tests.fake_servers import correct_segments_payload, fake_anthropic_server
+
+SEGMENTS = [
+    {
+        "id": f"NW_001_{index:04}",
+        "inference_text": f"ལྷག་པར་དགན་སྡེ་{index}",
+        "reference_text": f"ལྷག་པར་དགོན་སྡེ་{index}",
+        "is_valid": index % 3 != 0,
+    }
+    for index in range(1, 8)
+]
+
+
+def expected_corrections(segments):
+    return {
+        segment["id"]: segment["reference_text"]
+        if segment["is_valid"]
+        else segment["inference_text"]
+        for segment in segments
+    }
+
+
+FAST_RETRIES = {
+    "llm": {"requests_per_second": 1000, "burst": 100, "backoff_base": 0.01}
+}
+
+
+def use_server(server):
+    return mock.patch.dict(
+        "os.environ", {"ANTHROPIC_BASE_URL": server.url, "ANTHROPIC_API_KEY": "test"}
+    )
+
+
+def test_get_LLM_corrected_texts_groups_segments():
+    with fake_anthropic_server() as server, use_server(server):
+        reset_anthropic_client()
+        assert get_anthropic_client() is get_anthropic_client()
+        corrected_texts = get_LLM_corrected_texts(SEGMENTS, batch_size=3)
+        reset_anthropic_client()
+
+    assert corrected_texts == expected_corrections(SEGMENTS)
+    assert server.message_calls == 3
+
+
+def test_missing_segments_are_corrected_alone():
+    def answer_without_segments(prompt):
+        return "[]" if "Segments: " in prompt else "single"
+
+    with fake_anthropic_server(respond=answer_without_segments) as server, use_server(
+        server
+    ):
+        reset_anthropic_client()
+        corrected_texts = get_LLM_corrected_texts(SEGMENTS[:2], batch_size=2)
+        reset_anthropic_client()
+
+    assert corrected_texts == {segment["id"]: "single" for segment in SEGMENTS[:2]}
+
+
+def test_truncated_batch_answer_is_logged(caplog):
+    def truncated_answer(prompt):
+        if "Segments: " not in prompt:
+            return "single"
+        # The JSON list is cut in the middle of the second segment.
+        payload = correct_segments_payload(prompt)
+        return payload[: payload.index("}, {") + 10], "max_tokens"
+
+    truncated_before = get_registry().get_counter("llm_truncated_responses_total")
+    with fake_anthropic_server(respond=truncated_answer) as server, use_server(server):
+        reset_anthropic_client()
+        corrected_texts = get_LLM_corrected_texts(SEGMENTS[:3], batch_size=3)
+        reset_anthropic_client()
+
+    assert corrected_texts == {segment["id"]: "single" for segment in SEGMENTS[:3]}
+    assert server.message_calls == 4
+    assert "stopped at max_tokens" in caplog.text
+    assert (
+        get_registry().get_counter("llm_truncated_responses_total")
+        == truncated_before + 1
+    )
+
+
+def test_max_tokens_grow_with_the_segments():
+    long_segments = [
+        dict(segment, inference_text=segment["inference_text"] * 100)
+        for segment in SEGMENTS
+    ]
+    with fake_anthropic_server() as server, use_server(server), mock.patch(
+        "stt_data_with_llm.rate_limiter.RATE_LIMITS", FAST_RETRIES
+    ):
+        reset_anthropic_client()
+        get_LLM_corrected_texts(SEGMENTS[:2], batch_size=20)
+        get_LLM_corrected_texts(SEGMENTS[2:], batch_size=20)
+        corrected_texts = get_LLM_corrected_texts(long_segments, batch_size=20)
+        reset_anthropic_client()
+
+    assert corrected_texts == expected_corrections(long_segments)
+    short_two, short_five, *long_chunks = server.max_tokens
+    assert short_two < short_five < LLM_BATCH_MAX_TOKENS
+    # Long segments are split so that every answer fits in the output limit.
+    assert len(long_chunks) > 1
+    assert all(max_tokens <= LLM_BATCH_MAX_TOKENS for max_tokens in long_chunks)
+
+
+def test_get_LLM_corrected_texts_with_message_batch():
+    with fake_anthropic_server(batch_polls=2) as server, use_server(server):
+        reset_anthropic_client()
+        corrected_texts = get_LLM_corrected_texts_with_message_batch(
+            SEGMENTS, batch_size=4, poll_interval=0
+        )
+        reset_anthropic_client()
+
+    assert corrected_texts == expected_corrections(SEGMENTS)
+    assert len(server.batches) == 1
+    assert not getattr(server, "message_calls", 0)
+
+
+def test_parse_batch_correction_response_ignores_unknown_ids():
+    response_text = 'Here you go: [{"id": "a", "corrected_text": " x "}, {"id": "b"}, {"id": "z", "corrected_text": "y"}]'  # noqa: E501
+    assert parse_batch_correction_response(response_text, ["a", "b"]) == {"a": "x"}
+    assert parse_batch_correction_response("no json", ["a"]) == {}
+
+
+def test_rerun_makes_no_LLM_calls():
+    with fake_anthropic_server() as server, use_server(server):
+        reset_anthropic_client()
+        first_run = get_LLM_corrected_texts(SEGMENTS, batch_size=3)
+        calls_after_first_run = server.message_calls
+        second_run = get_LLM_corrected_texts(SEGMENTS, batch_size=5)
+        batch_run = get_LLM_corrected_texts_with_message_batch(
+            SEGMENTS, poll_interval=0
+        )
+        reset_anthropic_client()
+
+    assert first_run == second_run == batch_run
+    assert server.message_calls == calls_after_first_run
+    assert not server.batches
+    assert get_correction_cache().stats()["hits"] == 2 * len(SEGMENTS)
+
+
+def test_editing_the_batch_prompt_invalidates_cached_corrections(monkeypatch):
+    with fake_anthropic_server() as server, use_server(server):
+        reset_anthropic_client()
+        get_LLM_corrected_texts(SEGMENTS, batch_size=len(SEGMENTS))
+        monkeypatch.setattr(
+            LLM_post_corrector,
+            "build_batch_correction_prompt",
+            lambda segments: build_batch_correction_prompt(segments) + "Be brief.",
+        )
+        corrected_texts = get_LLM_corrected_texts(SEGMENTS, batch_size=len(SEGMENTS))
+        reset_anthropic_client()
+
+    assert corrected_texts == expected_corrections(SEGMENTS)
+    assert server.message_calls == 2
+    assert get_correction_cache().stats()["hits"] == 0
+
+
+def test_overloaded_api_is_retried():
+    with fake_anthropic_server(fail_statuses=[529, (429, 0)]) as server, use_server(
+        server
+    ), mock.patch("stt_data_with_llm.rate_limiter.RATE_LIMITS", FAST_RETRIES):
+        reset_anthropic_client()
+        corrected_texts = get_LLM_corrected_texts(SEGMENTS, batch_size=len(SEGMENTS))
+        reset_anthropic_client()
+
+    assert corrected_texts == expected_corrections(SEGMENTS)
+    assert server.message_calls == 1
+    assert server.requests_served == 3
+
+
+def test_failed_chunk_is_not_corrected_segment_by_segment():
+    with fake_anthropic_server(fail_statuses=[529] * 10) as server, use_server(
+        server
+    ), mock.patch("stt_data_with_llm.rate_limiter.RATE_LIMITS", FAST_RETRIES):
+        reset_anthropic_client()
+        corrected_texts = get_LLM_corrected_texts(SEGMENTS, batch_size=len(SEGMENTS))
+        reset_anthropic_client()
+
+    assert corrected_texts == dict.fromkeys(segment["id"] for segment in SEGMENTS)
+    # Only the retries of the one chunk request, no request per segment.
+    assert server.requests_served == RETRY_ATTEMPTS
+    assert get_correction_cache().stats()["entries"] == 0
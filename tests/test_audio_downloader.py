@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import threading
+
+from stt_data_with_llm import audio_downloader
+from stt_data_with_llm.audio_downloader import (
+    _url_key,
+    download_audio,
+    get_download_dir,
+    prefetch_ahead,
+    prefetch_audios,
+)
+from stt_data_with_llm.http_session import close_sessions
+from tests.fake_servers import fake_audio_file_server
+
+AUDIO_BYTES = bytes(range(256)) * 4096
+
+
+def statuses(server):
+    return [status for status, _ in server.request_log]
+
+
+def test_download_audio_resumes_and_revalidates():
+    with fake_audio_file_server({"/news.mp3": AUDIO_BYTES}) as server:
+        close_sessions()
+        server.truncate_next = 12 * 8192
+        audio_path = download_audio(f"{server.url}/news.mp3", chunk_size=8192)
+        with open(audio_path, "rb") as file:
+            assert file.read() == AUDIO_BYTES
+        # The dropped download is resumed where it stopped instead of restarted.
+        assert statuses(server) == [200, 206]
+        assert server.request_log[1][1]["Range"] == f"bytes={12 * 8192}-"
+
+        assert download_audio(f"{server.url}/news.mp3") == audio_path
+        assert statuses(server)[-1] == 304
+
+        server.files["/news.mp3"] = AUDIO_BYTES[::-1]
+        changed_path = download_audio(f"{server.url}/news.mp3")
+        close_sessions()
+
+    assert changed_path != audio_path
+    with open(changed_path, "rb") as file:
+        assert file.read() == AUDIO_BYTES[::-1]
+    assert os.path.basename(audio_path) in os.listdir(os.path.dirname(changed_path))
+
+
+def test_prefetch_audios_isolates_failures():
+    files = {f"/audio_{index}.mp3": bytes([index]) * 1000 for index in range(6)}
+    with fake_audio_file_server(files) as server:
+        close_sessions()
+        urls = [f"{server.url}{path}" for path in files] + [f"{server.url}/missing"]
+        downloads = prefetch_audios(urls, max_workers=3)
+        close_sessions()
+
+    assert downloads[f"{server.url}/missing"] is None
+    for path, content in files.items():
+        with open(downloads[f"{server.url}{path}"], "rb") as file:
+            assert file.read() == content
+    assert server.max_in_flight <= 3
+
+
+def test_prefetch_ahead_stays_a_few_audios_ahead(monkeypatch):
+    downloads = []
+    lock = threading.Lock()
+
+    def download(audio_url):
+        with lock:
+            downloads.append(audio_url)
+        return audio_url
+
+    monkeypatch.setattr(audio_downloader, "download_audio", download)
+    items = [f"https://example.com/{index}.mp3" for index in range(10)] + [""]
+    prefetched = prefetch_ahead(items, lambda item: item, max_workers=2)
+
+    assert next(prefetched) == items[0]
+    assert sorted(downloads) == items[:3]
+    assert list(prefetched) == items[1:]
+    assert sorted(downloads) == sorted(items[:-1])
+
+
+def write_partial_download(audio_url, content):
+    """Leaves a partial download as if the process stopped before finalizing it."""
+    part_path = os.path.join(
+        get_download_dir(), "partial", f"{_url_key(audio_url)}.part"
+    )
+    os.makedirs(os.path.dirname(part_path), exist_ok=True)
+    with open(part_path, "wb") as file:
+        file.write(content)
+    # The ETag of the fake server.
+    etag = f'"{hashlib.sha256(AUDIO_BYTES).hexdigest()[:16]}"'
+    with open(f"{part_path}.json", "w", encoding="utf-8") as file:
+        json.dump({"etag": etag, "last_modified": None}, file)
+    return part_path
+
+
+def test_complete_partial_download_is_finalized():
+    with fake_audio_file_server({"/news.mp3": AUDIO_BYTES}) as server:
+        close_sessions()
+        part_path = write_partial_download(f"{server.url}/news.mp3", AUDIO_BYTES)
+        audio_path = download_audio(f"{server.url}/news.mp3")
+        close_sessions()
+
+    assert statuses(server) == [416]
+    assert not os.path.exists(part_path)
+    with open(audio_path, "rb") as file:
+        assert file.read() == AUDIO_BYTES
+
+
+def test_oversized_partial_download_is_restarted():
+    with fake_audio_file_server({"/news.mp3": AUDIO_BYTES}) as server:
+        close_sessions()
+        write_partial_download(f"{server.url}/news.mp3", AUDIO_BYTES * 2)
+        audio_path = download_audio(f"{server.url}/news.mp3")
+        close_sessions()
+
+    assert statuses(server) == [416, 200]
+    assert "Range" not in server.request_log[1][1]
+    with open(audio_path, "rb") as file:
+        assert file.read() == AUDIO_BYTES
@@ -1,15 +1,94 @@
+import io
 import json
 import logging
+import os
+import pickle
+import wave
 from unittest import TestCase, mock
 
-from stt_data_with_llm.audio_parser import get_audio, get_split_audio
-from stt_data_with_llm.config import AUDIO_SEG_LOWER_LIMIT, AUDIO_SEG_UPPER_LIMIT
+import numpy as np
+import pytest
+
+from stt_data_with_llm.audio_parser import (
+    FrameEnergy,
+    SegmentView,
+    VADSpan,
+    chop_long_segment,
+    decode_audio_buffer,
+    decode_to_16K_pcm,
+    get_audio,
+    get_split_audio,
+    get_vad_cache,
+    pcm_to_float,
+    sec_to_sample,
+    vad_cache_key,
+)
+from stt_data_with_llm.config import (
+    AUDIO_SEG_LOWER_LIMIT,
+    AUDIO_SEG_UPPER_LIMIT,
+    HYPER_PARAMETERS,
+    SAMPLE_RATE,
+    VAD_MODEL_ID,
+)
+
+
+def make_wav(duration, sampling_rate=SAMPLE_RATE, seed=0):
+    """Builds a synthetic 16-bit mono WAV file with bursts of noise and silence."""
+    rng = np.random.default_rng(seed)
+    time = np.arange(int(duration * sampling_rate)) / sampling_rate
+    envelope = (np.sin(2 * np.pi * 0.3 * time) > -0.2) * (
+        0.5 + 0.5 * np.sin(2 * np.pi * 3 * time) ** 2
+    )
+    samples = (rng.normal(0, 0.3, len(time)) * envelope * 8000).astype(np.int16)
+    wav_buffer = io.BytesIO()
+    with wave.open(wav_buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sampling_rate)
+        wav_file.writeframes(samples.tobytes())
+    return wav_buffer.getvalue(), samples
+
+
+def load_vad_timeline(seg_id, max_end=None):
+    """Loads a stored VAD timeline as objects with `start` and `end` attributes."""
+    with open(f"./tests/vad_output/{seg_id}_vad_output.json", encoding="utf-8") as file:
+        timeline = json.load(file)["timeline"]
+    return [
+        type("Segment", (), {"start": seg["start"], "end": seg["end"]})
+        for seg in timeline
+        if max_end is None or seg["end"] <= max_end
+    ]
+
+
+class MockTimeline:
+    def __init__(self, timeline):
+        self.timeline = timeline
+
+    def support(self):
+        return self.timeline
+
+
+class MockTimelineResult:
+    def __init__(self, timeline):
+        self.timeline = timeline
+
+    def get_timeline(self):
+        return MockTimeline(self.timeline)
+
+
+class MockTimelinePipeline:
+    def __init__(self, timeline):
+        self.timeline = timeline
+        self.inputs = []
+
+    def __call__(self, audio):
+        self.inputs.append(audio)
+        return MockTimelineResult(self.timeline)
 
 
 class TestGetSplitAudio(TestCase):
     @mock.patch("stt_data_with_llm.audio_parser.initialize_vad_pipeline")
-    @mock.patch("stt_data_with_llm.audio_parser.Pipeline")
-    def test_get_split_audio(self, mock_pipeline, mock_initialize_vad):
+    def test_get_split_audio(self, mock_initialize_vad):
         """
         Test function for the get_split_audio functionality.
         """
@@ -88,5 +167,200 @@ class TestGetSplitAudio(TestCase):
         assert num_of_seg_in_audios == expected_num_split
 
 
+@mock.patch("stt_data_with_llm.audio_parser.initialize_vad_pipeline")
+def test_get_split_audio_reads_single_buffer(mock_initialize_vad, tmp_path):
+    """Segments are sliced from the decoded buffer and no temporary WAV is written."""
+    wav_data, samples = make_wav(60)
+    timeline = load_vad_timeline("NW_001", max_end=60)
+    mock_pipeline = MockTimelinePipeline(timeline)
+    mock_initialize_vad.return_value = mock_pipeline
+
+    cwd = os.getcwd()
+    os.chdir(tmp_path)
+    try:
+        split_audio_data = get_split_audio(wav_data, "SYNTH")
+    finally:
+        os.chdir(cwd)
+
+    assert not (tmp_path / "temp_audio_in_memory.wav").exists()
+    assert np.array_equal(decode_audio_buffer(wav_data), samples)
+    assert mock_pipeline.inputs[0]["sample_rate"] == SAMPLE_RATE
+    assert len(split_audio_data) == len(os.listdir(tmp_path / "data/split_audio/SYNTH"))
+    first_span = timeline[0]
+    assert (
+        split_audio_data["SYNTH_0001"]
+        == samples[
+            sec_to_sample(first_span.start, SAMPLE_RATE) : sec_to_sample(  # noqa: E203
+                first_span.end, SAMPLE_RATE
+            )
+        ].tobytes()
+    )
+
+
+def test_decode_to_16K_pcm_streams_into_buffer(tmp_path):
+    wav_data, samples = make_wav(5)
+    audio_path = tmp_path / "audio.wav"
+    audio_path.write_bytes(wav_data)
+
+    assert np.array_equal(decode_to_16K_pcm(str(audio_path), chunk_size=1000), samples)
+    assert np.array_equal(decode_to_16K_pcm(wav_data), samples)
+    mapped = decode_to_16K_pcm(str(audio_path), output_path=str(tmp_path / "audio.pcm"))
+    assert isinstance(mapped, np.memmap)
+    assert np.array_equal(mapped, samples)
+
+
+@mock.patch("stt_data_with_llm.audio_parser.initialize_vad_pipeline")
+def test_segment_files_are_written_without_ffmpeg(mock_initialize_vad, tmp_path):
+    wav_data, _ = make_wav(60)
+    mock_initialize_vad.return_value = MockTimelinePipeline(
+        load_vad_timeline("NW_001", max_end=60)
+    )
+
+    cwd = os.getcwd()
+    os.chdir(tmp_path)
+    try:
+        with mock.patch(
+            "pydub.AudioSegment.export", side_effect=AssertionError("ffmpeg")
+        ), mock.patch("stt_data_with_llm.audio_parser.subprocess"):
+            split_audio_data = get_split_audio(wav_data, "SYNTH")
+            in_memory_split_audio_data = get_split_audio(
+                wav_data, "MEMORY", save_segments=False
+            )
+    finally:
+        os.chdir(cwd)
+
+    assert list(in_memory_split_audio_data.values()) == list(split_audio_data.values())
+    assert not (tmp_path / "data/split_audio/MEMORY").exists()
+    segment_files = sorted((tmp_path / "data/split_audio/SYNTH").iterdir())
+    assert len(segment_files) == len(split_audio_data)
+    for segment_file, segment_data in zip(segment_files, split_audio_data.values()):
+        with wave.open(str(segment_file)) as wav_file:
+            assert wav_file.getframerate() == SAMPLE_RATE
+            assert wav_file.getnchannels() == 1
+            assert wav_file.getsampwidth() == 2
+            assert wav_file.readframes(wav_file.getnframes()) == segment_data
+
+
+@mock.patch("stt_data_with_llm.audio_parser.initialize_vad_pipeline")
+def test_segments_are_views_on_the_decoded_buffer(mock_initialize_vad):
+    samples = np.random.default_rng(0).integers(
+        -(2**15), 2**15, 60 * SAMPLE_RATE, dtype=np.int16
+    )
+    mock_initialize_vad.return_value = MockTimelinePipeline(
+        load_vad_timeline("NW_001", max_end=60)
+    )
+
+    split_audio_data = get_split_audio(samples, "SYNTH", save_segments=False)
+
+    segment = split_audio_data["SYNTH_0001"]
+    assert isinstance(segment, SegmentView)
+    assert np.shares_memory(np.asarray(segment.samples), samples)
+    assert segment == samples[segment.start : segment.end].tobytes()  # noqa: E203
+    assert bytes(segment) == segment.tobytes() and segment.nbytes == len(bytes(segment))
+    assert split_audio_data.sample_ranges["SYNTH_0001"] == (segment.start, segment.end)
+    # Pickling sends the shared buffer once, not once per segment.
+    pickled = pickle.dumps(split_audio_data)
+    assert len(pickled) < samples.nbytes + 64 * len(split_audio_data) + 4096
+    unpickled = pickle.loads(pickled)
+    assert list(unpickled.values()) == list(split_audio_data.values())
+    assert np.shares_memory(
+        np.asarray(unpickled["SYNTH_0001"].samples),
+        np.asarray(unpickled["SYNTH_0002"].samples.obj),
+    )
+
+
+def test_non_mute_intervals_match_librosa():
+    librosa = pytest.importorskip("librosa")
+    _, samples = make_wav(120)
+    energy = FrameEnergy(samples)
+    rng = np.random.default_rng(1)
+    ranges = [(0, len(samples)), (12345, len(samples)), (100, 100 + 700)]
+    for _ in range(30):
+        start = int(rng.integers(0, len(samples) - 1))
+        ranges.append((start, int(rng.integers(start + 1, len(samples) + 1))))
+
+    for start, end in ranges:
+        intervals, _ = energy.non_mute_intervals(start, end)
+        assert np.array_equal(
+            intervals,
+            librosa.effects.split(pcm_to_float(samples[start:end]), top_db=30),
+        )
+
+
+def test_long_segments_are_cut_at_quiet_points():
+    rng = np.random.default_rng(0)
+    samples = (rng.normal(0, 3000, 20 * SAMPLE_RATE)).astype(np.int16)
+    # Short dips between syllables, not long or deep enough to be silences.
+    dips = [4.6, 10.3, 14.8]
+    for dip in dips:
+        dip_start = int(dip * SAMPLE_RATE)
+        samples[dip_start : dip_start + 1600] //= 8  # noqa: E203
+    energy = FrameEnergy(samples)
+    intervals, frame_power = energy.non_mute_intervals(0, len(samples))
+    assert intervals.tolist() == [[0, len(samples)]]
+
+    boundaries = chop_long_segment(
+        frame_power,
+        0,
+        len(samples),
+        AUDIO_SEG_LOWER_LIMIT,
+        AUDIO_SEG_UPPER_LIMIT,
+        SAMPLE_RATE,
+    )
+
+    assert len(boundaries) == 5 and boundaries[0] == 0
+    assert boundaries[-1] == len(samples)
+    for cut, dip in zip(boundaries[1:-1], dips):
+        assert dip <= cut / SAMPLE_RATE <= dip + 0.1
+    durations = np.diff(boundaries) / SAMPLE_RATE
+    assert (durations >= AUDIO_SEG_LOWER_LIMIT).all()
+    assert (durations <= AUDIO_SEG_UPPER_LIMIT).all()
+
+
+@mock.patch("stt_data_with_llm.audio_parser.initialize_vad_pipeline")
+def test_vad_timeline_is_reused_from_the_cache(mock_initialize_vad, monkeypatch):
+    _, samples = make_wav(60)
+    timeline = load_vad_timeline("NW_001", max_end=60)
+    mock_pipeline = MockTimelinePipeline(timeline)
+    mock_initialize_vad.return_value = mock_pipeline
+
+    first = get_split_audio(samples, "SYNTH", save_segments=False)
+    again = get_split_audio(samples, "SYNTH", save_segments=False)
+    # Only the segment duration limits changed, the timeline is still valid.
+    tuned = get_split_audio(samples, "SYNTH", 1, 6, save_segments=False)
+
+    assert len(mock_pipeline.inputs) == 1
+    assert mock_initialize_vad.call_count == 1
+    assert list(again.values()) == list(first.values())
+    assert len(tuned) != len(first)
+    cached = json.loads(
+        get_vad_cache().get(vad_cache_key(samples, VAD_MODEL_ID, HYPER_PARAMETERS))
+    )
+    with open("./tests/vad_output/NW_001_vad_output.json", encoding="utf-8") as file:
+        stored = json.load(file)["timeline"]
+    assert cached == {"timeline": stored[: len(timeline)]}
+
+    monkeypatch.setattr(
+        "stt_data_with_llm.audio_parser.HYPER_PARAMETERS",
+        dict(HYPER_PARAMETERS, min_duration_on=1.0),
+    )
+    get_split_audio(samples, "SYNTH", save_segments=False)
+    get_split_audio(samples[: 30 * SAMPLE_RATE], "SHORT", save_segments=False)
+    assert len(mock_pipeline.inputs) == 3
+
+
+def test_vad_cache_key_depends_on_audio_model_and_hyper_parameters():
+    samples = np.zeros(SAMPLE_RATE, dtype=np.int16)
+    key = vad_cache_key(samples, VAD_MODEL_ID, HYPER_PARAMETERS)
+
+    assert key == vad_cache_key(samples.copy(), VAD_MODEL_ID, dict(HYPER_PARAMETERS))
+    assert key != vad_cache_key(samples[:-1], VAD_MODEL_ID, HYPER_PARAMETERS)
+    assert key != vad_cache_key(samples, "other/model", HYPER_PARAMETERS)
+    assert key != vad_cache_key(
+        samples, VAD_MODEL_ID, dict(HYPER_PARAMETERS, onset=0.6)
+    )
+    assert VADSpan(1.0, 2.5) == VADSpan(1.0, 2.5) != VADSpan(1.0, 3.0)
+
+
 if __name__ == "__main__":
     TestGetSplitAudio().test_get_split_audio()
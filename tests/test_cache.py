@@ -0,0 +1,23 @@
+from stt_data_with_llm.cache import SQLiteCache, make_cache_key
+
+
+def test_sqlite_cache_counts_hits_and_evicts_least_recently_used(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "test.sqlite"), max_bytes=10)
+    assert cache.get("a") is None
+    cache.set("a", "1234")
+    cache.set("b", "5678")
+    assert cache.get("a") == "1234"
+    cache.set("c", "9012")  # over 10 bytes, "b" is the least recently used
+
+    assert cache.get("b") is None
+    assert cache.get("c") == "9012"
+    assert cache.stats() == {"hits": 2, "misses": 2, "entries": 2, "size_bytes": 8}
+
+    reopened = SQLiteCache(cache.path, max_bytes=10)
+    assert reopened.get("a") == "1234"
+
+
+def test_make_cache_key_separates_parts():
+    assert make_cache_key("ab", "c") != make_cache_key("a", "bc")
+    assert make_cache_key("model", "prompt") == make_cache_key(b"model", b"prompt")
+    assert make_cache_key(memoryview(b"pcm")) == make_cache_key(b"pcm")
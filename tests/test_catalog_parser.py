@@ -1,6 +1,16 @@
 import json
 
-from stt_data_with_llm.catalog_parser import parse_catalog
+import pandas as pd
+import pytest
+
+from stt_data_with_llm import catalog_parser
+from stt_data_with_llm.catalog_parser import (
+    CATALOG_COLUMNS,
+    iter_catalog,
+    parse_catalog,
+    parse_catalog_chunk,
+    read_catalog_chunks,
+)
 
 
 def test_catalog_parser():
@@ -22,5 +32,114 @@ def test_catalog_parser():
     assert audio_transcription_catalog == expected_output_json
 
 
+def write_local_catalog(path):
+    """Writes the expected catalog back to a spreadsheet-like local file."""
+    with open("tests/data/expected_catalog_data.json", encoding="utf-8") as file:
+        expected_output_json = json.load(file)
+    rows = [
+        {
+            column: entry[field] if entry[field] != "" else None
+            for field, column in CATALOG_COLUMNS.items()
+        }
+        for entry in expected_output_json.values()
+    ]
+    catalog_df = pd.DataFrame(rows)
+    if path.suffix == ".csv":
+        catalog_df.to_csv(path, index=False)
+    elif path.suffix == ".parquet":
+        catalog_df.to_parquet(path, index=False)
+    else:
+        catalog_df.to_json(path, orient="records", lines=True, force_ascii=False)
+    return expected_output_json
+
+
+@pytest.mark.parametrize("extension", [".csv", ".parquet", ".jsonl"])
+@pytest.mark.parametrize("chunk_size", [1, 2, 50_000])
+def test_parse_local_catalog(tmp_path, extension, chunk_size):
+    path = tmp_path / f"catalog{extension}"
+    expected_output_json = write_local_catalog(path)
+
+    audio_transcription_catalog = parse_catalog(str(path), chunk_size=chunk_size)
+
+    assert audio_transcription_catalog == expected_output_json
+    assert list(audio_transcription_catalog) == list(expected_output_json)
+
+
+def test_iter_catalog_reads_in_chunks(tmp_path):
+    path = tmp_path / "catalog.csv"
+    write_local_catalog(path)
+
+    chunk_lengths = [len(chunk) for chunk in read_catalog_chunks(str(path), 2)]
+    entries = iter_catalog(str(path), chunk_size=2)
+
+    assert max(chunk_lengths) == 2
+    assert next(entries)[0] == "0"
+    assert sum(1 for _ in entries) == sum(chunk_lengths) - 1
+
+
+def test_parse_catalog_fills_missing_columns(tmp_path):
+    path = tmp_path / "catalog.csv"
+    path.write_text("ID,Audio URL\nSTT_NW0001,\n,https://example.com/a.mp3\n")
+
+    audio_transcription_catalog = parse_catalog(str(path))
+
+    assert audio_transcription_catalog["0"]["full_audio_id"] == "STT_NW0001"
+    assert audio_transcription_catalog["0"]["audio_url"] == ""
+    assert audio_transcription_catalog["1"]["full_audio_id"] == ""
+    assert audio_transcription_catalog["1"]["speaker_name"] == ""
+
+
+def test_parse_catalog_only_drops_the_rows_that_fail(tmp_path, monkeypatch):
+    path = tmp_path / "catalog.csv"
+    path.write_text("ID\nSTT_NW0001\nbroken\nSTT_NW0003\nSTT_NW0004\n")
+
+    def parse_chunk(catalog_df):
+        if "broken" in catalog_df["ID"].tolist():
+            raise ValueError("broken row")
+        return parse_catalog_chunk(catalog_df)
+
+    monkeypatch.setattr(catalog_parser, "parse_catalog_chunk", parse_chunk)
+
+    audio_transcription_catalog = parse_catalog(str(path), chunk_size=3)
+
+    assert list(audio_transcription_catalog) == ["0", "2", "3"]
+
+
+def test_parse_catalog_keeps_the_rows_read_before_an_error(tmp_path, monkeypatch):
+    path = tmp_path / "catalog.csv"
+    path.write_text("ID\nSTT_NW0001\nSTT_NW0002\nSTT_NW0003\n")
+
+    def read_chunks(source, chunk_size):
+        chunks = read_catalog_chunks(source, chunk_size)
+        yield next(chunks)
+        raise OSError("connection lost")
+
+    monkeypatch.setattr(catalog_parser, "read_catalog_chunks", read_chunks)
+
+    assert list(parse_catalog(str(path), chunk_size=2)) == ["0", "1"]
+
+
+def test_parse_catalog_unsupported_file(tmp_path):
+    path = tmp_path / "catalog.xlsx"
+    path.write_bytes(b"")
+
+    assert parse_catalog(str(path)) == {}
+
+
+@pytest.mark.parametrize("name", ["catalog.csv", "catalogs/catalog"])
+def test_missing_local_catalog_is_not_read_as_a_spreadsheet(
+    tmp_path, monkeypatch, name
+):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(
+        catalog_parser,
+        "get_spreadsheet_url",
+        lambda sheet_id: pytest.fail("read as a Google Spreadsheet"),
+    )
+
+    with pytest.raises(FileNotFoundError):
+        parse_catalog(name)
+
+
 if __name__ == "__main__":
     test_catalog_parser()
@@ -0,0 +1,65 @@
+from stt_data_with_llm.cer import (
+    calculate_cer,
+    calculate_cers,
+    calculate_prefix_cer,
+    levenshtein_distance,
+    max_errors_for_cer,
+    prefix_levenshtein_distance,
+)
+
+
+def reference_distance(source, target):
+    previous = list(range(len(target) + 1))
+    for row, source_char in enumerate(source, 1):
+        current = [row] + [0] * len(target)
+        for column, target_char in enumerate(target, 1):
+            current[column] = min(
+                previous[column] + 1,
+                current[column - 1] + 1,
+                previous[column - 1] + (source_char != target_char),
+            )
+        previous = current
+    return previous[-1]
+
+
+def test_levenshtein_distance_matches_dynamic_programming():
+    words = ["", "ཀ", "རྒྱ་ནག་", "རྒྱ་ནག་གཞུང་གིས་", "མགོ་ལོག་ཁུལ", "kitten", "sitting"]
+    for source in words:
+        for target in words:
+            expected = reference_distance(source, target)
+            assert levenshtein_distance(source, target) == expected
+            assert levenshtein_distance(source, target, max_distance=2) == min(
+                expected, 3
+            )
+
+
+def test_calculate_cer():
+    assert calculate_cer("kitten", "sitting") == 3 / 6
+    assert calculate_cer("  a  b ", "a b") == 0.0
+    assert calculate_cer("", "anything") == 1.0
+    assert calculate_cer("ab", "abcdef") == 1.0
+    assert calculate_cer("kitten", "sitting", max_cer=0.4) > 0.4
+    assert calculate_cers([("kitten", "sitting"), ("ab", "ab")]) == [0.5, 0.0]
+    assert max_errors_for_cer(15, 0.4) == 6
+    assert max_errors_for_cer(7, 0.4) == 2
+
+
+def test_prefix_levenshtein_distance_matches_dynamic_programming():
+    words = ["", "ཀ", "རྒྱ་ནག་", "རྒྱ་ནག་གཞུང་གིས་", "མགོ་ལོག་ཁུལ", "kitten", "sitting"]
+    for pattern in words:
+        for text in words:
+            expected = min(
+                reference_distance(pattern, text[:length])
+                for length in range(len(text) + 1)
+            )
+            assert prefix_levenshtein_distance(pattern, text)[0] == expected
+
+
+def test_calculate_prefix_cer():
+    reference = "རྒྱ་ནག་གཞུང་གིས་མགོ་ལོག་ཁུལ་དུ་"
+    assert prefix_levenshtein_distance("རྒྱ་ནག་", reference) == (0, 7)
+    assert calculate_prefix_cer(reference, "རྒྱ་ནག་") == 0.0
+    assert calculate_prefix_cer(reference, "རྒྱ་ནམ་") == 1 / 7
+    assert calculate_prefix_cer(reference, "abcdefg") == 1.0
+    assert calculate_prefix_cer(reference, "") == 1.0
+    assert calculate_prefix_cer("", "") == 0.0
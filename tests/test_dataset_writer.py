@@ -0,0 +1,168 @@
+import io
+import os
+import tarfile
+import wave
+
+import numpy as np
+import pytest
+
+from stt_data_with_llm.audio_parser import encode_wav
+from stt_data_with_llm.dataset_writer import (
+    ShardedDatasetWriter,
+    build_segment_records,
+    read_dataset_index,
+    read_dataset_record,
+)
+
+AUDIO_DATA_INFO = {
+    "full_audio_id": "STT_NW0001",
+    "sr_no": 1,
+    "audio_url": "https://example.com/STT_NW0001.mp3",
+    "reference_transcript": "full reference",
+    "speaker_name": "བཀྲ་ཤིས།",
+    "speaker_gender": "",
+    "news_channel": "RFA",
+    "publishing_year": "2024.08.20",
+}
+
+
+def make_pcm(seed, num_samples):
+    rng = np.random.default_rng(seed)
+    return rng.integers(-(2**15), 2**15, num_samples, dtype=np.int16).tobytes()
+
+
+def make_records(full_audio_id="STT_NW0001", num_segments=3, num_samples=16000):
+    audio_data_info = dict(AUDIO_DATA_INFO, full_audio_id=full_audio_id)
+    pairs = {
+        f"{full_audio_id}_{i:04}": {
+            "audio_seg_data": make_pcm(i, num_samples),
+            "inference_transcript": f"inference {i}",
+            "reference_transcript": f"reference {i}",
+            "LLM_corrected_text": f"corrected {i}" if i != 2 else None,
+        }
+        for i in range(1, num_segments + 1)
+    }
+    return build_segment_records(pairs, audio_data_info)
+
+
+def test_build_segment_records():
+    records = make_records()
+
+    assert [record["key"] for record in records] == [
+        "STT_NW0001_0001",
+        "STT_NW0001_0002",
+        "STT_NW0001_0003",
+    ]
+    record = records[0]
+    assert record["duration"] == 1.0
+    assert record["sr_no"] == "1"
+    assert record["speaker_name"] == "བཀྲ་ཤིས།"
+    assert "audio_url" in record and "parent_pid" not in record
+    assert record["audio"] == make_pcm(1, 16000)
+    with wave.open(io.BytesIO(encode_wav(record["audio"]))) as wav:
+        assert (wav.getframerate(), wav.getnchannels(), wav.getsampwidth()) == (
+            16000,
+            1,
+            2,
+        )
+        assert wav.readframes(wav.getnframes()) == make_pcm(1, 16000)
+
+
+@pytest.mark.parametrize("shard_format", ["tar", "parquet"])
+def test_writer_round_trip(tmp_path, shard_format):
+    records = make_records()
+    saved = []
+    with ShardedDatasetWriter(str(tmp_path), shard_format) as writer:
+        writer.write(records, on_durable=lambda: saved.append("STT_NW0001"))
+
+    assert saved == ["STT_NW0001"]
+    index = read_dataset_index(str(tmp_path))
+    assert [entry["key"] for entry in index] == [record["key"] for record in records]
+    for entry, record in zip(index, records):
+        assert read_dataset_record(entry, str(tmp_path)) == dict(
+            record, audio=encode_wav(record["audio"])
+        )
+
+
+def test_tar_shards_follow_webdataset_layout(tmp_path):
+    with ShardedDatasetWriter(str(tmp_path), "tar") as writer:
+        writer.write(make_records(num_segments=2))
+
+    with tarfile.open(tmp_path / "shard-000000.tar") as tar:
+        assert tar.getnames() == [
+            "STT_NW0001_0001.wav",
+            "STT_NW0001_0001.json",
+            "STT_NW0001_0002.wav",
+            "STT_NW0001_0002.json",
+        ]
+
+
+@pytest.mark.parametrize("shard_format", ["tar", "parquet"])
+def test_writer_rotates_shards(tmp_path, shard_format):
+    saved = []
+    with ShardedDatasetWriter(
+        str(tmp_path), shard_format, max_shard_bytes=64 * 1024
+    ) as writer:
+        for i in range(4):
+            full_audio_id = f"STT_NW000{i}"
+            writer.write(
+                make_records(full_audio_id),
+                on_durable=lambda full_audio_id=full_audio_id: saved.append(
+                    full_audio_id
+                ),
+            )
+
+    shards = sorted(name for name in os.listdir(tmp_path) if name.startswith("shard"))
+    assert len(shards) == 4
+    assert saved == ["STT_NW0000", "STT_NW0001", "STT_NW0002", "STT_NW0003"]
+    index = read_dataset_index(str(tmp_path))
+    assert len(index) == 12
+    assert {entry["shard"] for entry in index} == set(shards)
+    assert read_dataset_record(index[-1], str(tmp_path))["key"] == "STT_NW0003_0003"
+
+
+def test_writer_discards_incomplete_shard_and_continues_numbering(tmp_path):
+    with ShardedDatasetWriter(str(tmp_path)) as writer:
+        writer.write(make_records())
+    (tmp_path / "shard-000001.tar.tmp").write_bytes(b"interrupted")
+
+    with ShardedDatasetWriter(str(tmp_path)) as writer:
+        writer.write(make_records("STT_NW0002"))
+
+    assert sorted(os.listdir(tmp_path)) == [
+        "index.jsonl",
+        "shard-000000.tar",
+        "shard-000001.tar",
+    ]
+    assert len(read_dataset_index(str(tmp_path))) == 6
+
+
+def test_rewritten_audio_replaces_its_records(tmp_path):
+    with ShardedDatasetWriter(str(tmp_path)) as writer:
+        writer.write(make_records("STT_NW0001"))
+        writer.write(make_records("STT_NW0002"))
+    with ShardedDatasetWriter(str(tmp_path)) as writer:
+        writer.write(make_records("STT_NW0001", num_segments=2))
+
+    index = read_dataset_index(str(tmp_path))
+
+    assert [entry["key"] for entry in index] == [
+        "STT_NW0002_0001",
+        "STT_NW0002_0002",
+        "STT_NW0002_0003",
+        "STT_NW0001_0001",
+        "STT_NW0001_0002",
+    ]
+    assert [entry["shard"] for entry in index] == ["shard-000000.tar"] * 3 + [
+        "shard-000001.tar"
+    ] * 2
+
+
+def test_writer_reports_background_errors(tmp_path):
+    writer = ShardedDatasetWriter(str(tmp_path))
+    writer.write([{"full_audio_id": "STT_NW0001"}])
+
+    with pytest.raises(KeyError):
+        writer.close()
+    with pytest.raises(ValueError):
+        ShardedDatasetWriter(str(tmp_path), "zip")
@@ -0,0 +1,104 @@
+import io
+import wave
+from unittest import mock
+
+import pytest
+
+from stt_data_with_llm.config import RETRY_ATTEMPTS
+from stt_data_with_llm.http_session import close_sessions
+from stt_data_with_llm.inference_transcript import (
+    get_audio_inference_texts,
+    get_transcript_cache,
+)
+from stt_data_with_llm.rate_limiter import RetryableError
+from tests.fake_servers import fake_asr_server
+
+
+def read_frames(wav_data):
+    with wave.open(io.BytesIO(wav_data), "rb") as wav_file:
+        return wav_file.readframes(wav_file.getnframes())
+
+
+def test_get_audio_inference_texts_keeps_segment_order():
+    raw_audios = [bytes([index]) * (2 * (40 - index)) for index in range(40)]
+    server = fake_asr_server(
+        latency=0.02, transcribe=lambda wav: str(read_frames(wav)[0])
+    )
+    with server, mock.patch(
+        "stt_data_with_llm.inference_transcript.API_URL", server.url
+    ):
+        close_sessions()
+        transcripts = get_audio_inference_texts(raw_audios, max_in_flight=4)
+        close_sessions()
+
+    assert transcripts == [str(index) for index in range(40)]
+    assert 1 < server.max_in_flight <= 4
+    # Connections are kept alive and reused instead of one per segment.
+    assert len(server.client_ports) <= 4
+
+
+def test_transcripts_are_cached_by_segment_audio():
+    raw_audios = [bytes([index]) * 320 for index in range(10)]
+    server = fake_asr_server(transcribe=lambda wav: str(read_frames(wav)[0]))
+    with server, mock.patch(
+        "stt_data_with_llm.inference_transcript.API_URL", server.url
+    ):
+        close_sessions()
+        first_run = get_audio_inference_texts(raw_audios, max_in_flight=4)
+        second_run = get_audio_inference_texts(raw_audios[::-1], max_in_flight=4)
+        close_sessions()
+
+    assert second_run == first_run[::-1]
+    assert server.requests_served == len(raw_audios)
+    assert get_transcript_cache().stats()["hits"] == len(raw_audios)
+
+
+FAST_RETRIES = {
+    "inference": {"requests_per_second": 1000, "burst": 100, "backoff_base": 0.01}
+}
+
+
+def test_rate_limited_segments_are_retried():
+    raw_audios = [bytes([index]) * 320 for index in range(4)]
+    server = fake_asr_server(
+        transcribe=lambda wav: str(read_frames(wav)[0]),
+        fail_statuses=[(429, 0), 503, 500],
+    )
+    with server, mock.patch(
+        "stt_data_with_llm.inference_transcript.API_URL", server.url
+    ), mock.patch("stt_data_with_llm.rate_limiter.RATE_LIMITS", FAST_RETRIES):
+        close_sessions()
+        transcripts = get_audio_inference_texts(raw_audios, max_in_flight=2)
+        close_sessions()
+
+    assert transcripts == ["0", "1", "2", "3"]
+    assert server.requests_served == len(raw_audios) + 3
+
+
+def test_failed_inference_raises_instead_of_an_empty_transcript():
+    server = fake_asr_server(fail_statuses=[503] * 10)
+    with server, mock.patch(
+        "stt_data_with_llm.inference_transcript.API_URL", server.url
+    ), mock.patch("stt_data_with_llm.rate_limiter.RATE_LIMITS", FAST_RETRIES):
+        close_sessions()
+        with pytest.raises(RetryableError):
+            get_audio_inference_texts([b"\0" * 320])
+        close_sessions()
+
+    assert server.requests_served == RETRY_ATTEMPTS
+    assert get_transcript_cache().stats()["entries"] == 0
+
+
+def test_stalled_inference_times_out():
+    server = fake_asr_server(latency=0.5)
+    with server, mock.patch(
+        "stt_data_with_llm.inference_transcript.API_URL", server.url
+    ), mock.patch(
+        "stt_data_with_llm.inference_transcript.INFERENCE_TIMEOUT", 0.05
+    ), mock.patch(
+        "stt_data_with_llm.rate_limiter.RATE_LIMITS", FAST_RETRIES
+    ):
+        close_sessions()
+        with pytest.raises(RetryableError, match="timed out"):
+            get_audio_inference_texts([b"\0" * 320])
+        close_sessions()
@@ -0,0 +1,83 @@
+import pytest
+
+from stt_data_with_llm.local_corrector import (
+    align_syllables,
+    get_local_corrected_text,
+    split_local_corrections,
+    split_syllables,
+)
+
+
+def test_split_syllables_drops_tsheg_shad_and_spaces():
+    assert split_syllables(" ལྷག་པར་དགོན་སྡེ། ཁྱེད་རང་།། ") == [
+        "ལྷག",
+        "པར",
+        "དགོན",
+        "སྡེ",
+        "ཁྱེད",
+        "རང",
+    ]
+    assert split_syllables("།") == []
+
+
+def test_misspelled_syllables_align_with_their_reference_spelling():
+    alignment = align_syllables(
+        ["ལྷག", "པར", "དགན", "སྡེ", "ཡིན"], ["ལྷག", "པར", "དགོན", "སྡེ"]
+    )
+
+    assert alignment == [
+        ("ལྷག", "ལྷག"),
+        ("པར", "པར"),
+        ("དགན", "དགོན"),
+        ("སྡེ", "སྡེ"),
+        ("ཡིན", None),
+    ]
+
+
+@pytest.mark.parametrize(
+    "inference_text, expected",
+    [
+        # Spelling variants take the reference spelling and punctuation.
+        ("ལྷག་པར་དགན་སྡེ", "ལྷག་པར་དགོན་སྡེ།"),
+        ("ལྷག་པར་དགོན་སྡེ།", "ལྷག་པར་དགོན་སྡེ།"),
+        # A spoken syllable missing from the reference.
+        ("ལྷག་པར་དགོན་སྡེ་ཡིན", None),
+        # A reference syllable that was not heard.
+        ("ལྷག་པར་སྡེ", None),
+        # A different word rather than a spelling variant.
+        ("ལྷག་པར་ཁྱེད་སྡེ", None),
+        ("", None),
+    ],
+)
+def test_get_local_corrected_text(inference_text, expected):
+    assert get_local_corrected_text(inference_text, " ལྷག་པར་དགོན་སྡེ། ") == expected
+
+
+def test_only_valid_unambiguous_segments_skip_the_llm():
+    segments = [
+        {
+            "id": "valid",
+            "inference_text": "ལྷག་པར་དགན་སྡེ",
+            "reference_text": "ལྷག་པར་དགོན་སྡེ",
+            "is_valid": True,
+        },
+        {
+            "id": "invalid",
+            "inference_text": "ལྷག་པར་དགན་སྡེ",
+            "reference_text": "ལྷག་པར་དགོན་སྡེ",
+            "is_valid": False,
+        },
+        {
+            "id": "ambiguous",
+            "inference_text": "ལྷག་པར་སྡེ",
+            "reference_text": "ལྷག་པར་དགོན་སྡེ",
+            "is_valid": True,
+        },
+    ]
+
+    corrected_texts, llm_segments = split_local_corrections(segments)
+    assert corrected_texts == {"valid": "ལྷག་པར་དགོན་སྡེ"}
+    assert [segment["id"] for segment in llm_segments] == ["invalid", "ambiguous"]
+
+    corrected_texts, llm_segments = split_local_corrections(segments, None)
+    assert corrected_texts == {} and llm_segments == segments
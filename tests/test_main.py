@@ -0,0 +1,482 @@
+import os
+from functools import partial
+
+import numpy as np
+import pytest
+
+from stt_data_with_llm import audio_downloader, main, util
+from stt_data_with_llm.audio_parser import split_audio_from_sample_ranges
+from stt_data_with_llm.dataset_writer import read_dataset_index, read_dataset_record
+from stt_data_with_llm.manifest import get_manifest
+from stt_data_with_llm.metrics import get_registry, increment
+
+
+def fake_post_process(audio_data_info, manifest_path=None):
+    full_audio_id = audio_data_info["full_audio_id"]
+    if full_audio_id == "raises":
+        raise ValueError("broken audio")
+    if full_audio_id == "crashes" and os.getpid() != audio_data_info["parent_pid"]:
+        os._exit(1)
+    if full_audio_id == "invalid":
+        return None, full_audio_id
+    increment("segments_total")
+    return {f"{full_audio_id}_0001": {"pid": os.getpid()}}, full_audio_id
+
+
+@pytest.fixture
+def catalog(monkeypatch):
+    monkeypatch.setattr(main, "post_process_audio_transcript_pairs", fake_post_process)
+    monkeypatch.setattr(main, "warm_vad_pipelines", lambda: None)
+    return {
+        str(i): {"full_audio_id": f"STT_{i:04}", "parent_pid": os.getpid()}
+        for i in range(8)
+    }
+
+
+def run(catalog, workers):
+    return {
+        data_id: (pairs, full_audio_id, error)
+        for data_id, pairs, full_audio_id, error in main.iter_processed_catalog(
+            catalog, workers=workers, start_method="fork"
+        )
+    }
+
+
+def test_serial_runner_keeps_catalog_order(catalog):
+    results = list(main.iter_processed_catalog(catalog, workers=1))
+
+    assert [result[0] for result in results] == list(catalog)
+    assert all(
+        result[1][f"{result[2]}_0001"]["pid"] == os.getpid() for result in results
+    )
+
+
+def test_process_pool_runner_merges_worker_metrics(catalog):
+    get_registry().reset()
+    get_registry().increment("segments_total", 100)
+
+    run(catalog, workers=2)
+
+    assert get_registry().get_counter("segments_total") == 100 + len(catalog)
+    get_registry().reset()
+
+
+def test_process_pool_runner_matches_serial(catalog):
+    serial = run(catalog, workers=1)
+    parallel = run(catalog, workers=2)
+
+    assert parallel.keys() == serial.keys()
+    for data_id, (pairs, full_audio_id, error) in parallel.items():
+        assert full_audio_id == serial[data_id][1]
+        assert error is None
+        assert pairs[f"{full_audio_id}_0001"]["pid"] != os.getpid()
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_runner_isolates_failures(catalog, workers):
+    catalog["3"]["full_audio_id"] = "raises"
+    catalog["5"]["full_audio_id"] = "invalid"
+
+    results = run(catalog, workers)
+
+    assert len(results) == len(catalog)
+    assert results["3"] == (None, "raises", "broken audio")
+    assert results["5"] == (None, "invalid", None)
+    assert all(results[data_id][0] for data_id in catalog if data_id not in "35")
+
+
+def test_process_pool_runner_survives_worker_crash(catalog):
+    catalog["2"]["full_audio_id"] = "crashes"
+
+    results = run(catalog, workers=2)
+
+    assert len(results) == len(catalog)
+    pairs, full_audio_id, error = results["2"]
+    assert pairs is None and full_audio_id == "crashes" and error
+    assert all(results[data_id][0] for data_id in catalog if data_id != "2")
+
+
+REFERENCE = "བཀྲ་ཤིས་བདེ་ལེགས། ཁྱེད་རང་སྐུ་གཟུགས་བདེ་པོ་ཡིན་པས།"
+
+
+class FakeStages:
+    """Offline stand-ins of the pipeline stages counting how often each one runs."""
+
+    def __init__(self, monkeypatch, tmp_path):
+        self.calls = {"download": 0, "segment": 0, "transcribe": 0, "correct": 0}
+        self.fail_correction = False
+        self.audio_path = tmp_path / "audio.mp3"
+        self.audio_path.write_bytes(b"audio")
+        self.pcm = np.arange(48000, dtype=np.int16)
+        monkeypatch.setattr(main, "download_audio", self.download_audio)
+        monkeypatch.setattr(main, "decode_to_16K_pcm", lambda path: self.pcm)
+        monkeypatch.setattr(main, "get_split_audio", self.get_split_audio)
+        monkeypatch.setattr(main, "get_audio_inference_texts", self.transcribe)
+        monkeypatch.setattr(main, "get_LLM_corrected_texts", self.correct)
+        # The inference transcript already follows the reference word for word.
+        monkeypatch.setattr(
+            main, "transfer_segmentation", lambda inference, reference: inference
+        )
+        # Every segment goes to the LLM stand-in.
+        monkeypatch.setattr(main, "LOCAL_CORRECTION_MAX_SYLLABLE_CER", None)
+
+    def download_audio(self, audio_url):
+        self.calls["download"] += 1
+        return str(self.audio_path)
+
+    def get_split_audio(
+        self, audio_data, full_audio_id, lower_limit, upper_limit, save_segments
+    ):
+        assert not save_segments
+        self.calls["segment"] += 1
+        sample_ranges = {
+            f"{full_audio_id}_{counter:04}": sample_range
+            for counter, sample_range in enumerate([(0, 16000), (20000, 40000)], 1)
+        }
+        return split_audio_from_sample_ranges(audio_data, sample_ranges, full_audio_id)
+
+    def transcribe(self, raw_audios):
+        self.calls["transcribe"] += 1
+        texts = dict(zip((0, 20000), REFERENCE.split(" ")))
+        return [texts[raw_audio.start] for raw_audio in raw_audios]
+
+    def correct(self, segments):
+        self.calls["correct"] += 1
+        if self.fail_correction:
+            raise RuntimeError("LLM unavailable")
+        return {
+            segment["id"]: f"corrected {self.calls['correct']}" for segment in segments
+        }
+
+
+@pytest.fixture
+def stages(monkeypatch, tmp_path):
+    return FakeStages(monkeypatch, tmp_path)
+
+
+AUDIO_DATA_INFO = {
+    "full_audio_id": "STT_NW0001",
+    "audio_url": "https://example.com/STT_NW0001.mp3",
+    "reference_transcript": REFERENCE,
+}
+
+
+def test_post_process_resumes_at_first_incomplete_stage(stages, tmp_path):
+    manifest_path = str(tmp_path / "manifest.sqlite")
+    stages.fail_correction = True
+    with pytest.raises(RuntimeError):
+        main.post_process_audio_transcript_pairs(AUDIO_DATA_INFO, manifest_path)
+    stages.fail_correction = False
+
+    pairs, full_audio_id = main.post_process_audio_transcript_pairs(
+        AUDIO_DATA_INFO, manifest_path
+    )
+
+    assert stages.calls == {"download": 1, "segment": 1, "transcribe": 1, "correct": 2}
+    assert full_audio_id == "STT_NW0001"
+    assert list(pairs) == ["STT_NW0001_0001", "STT_NW0001_0002"]
+    assert (
+        pairs["STT_NW0001_0002"]["audio_seg_data"] == stages.pcm[20000:40000].tobytes()
+    )
+    assert pairs["STT_NW0001_0001"]["inference_transcript"] == REFERENCE.split(" ")[0]
+    assert pairs["STT_NW0001_0001"]["LLM_corrected_text"] == "corrected 2"
+    manifest = get_manifest(manifest_path)
+    assert manifest.next_stage("STT_NW0001") == "save"
+
+
+def test_incomplete_correction_saves_nothing(stages, tmp_path, monkeypatch):
+    manifest_path = str(tmp_path / "manifest.sqlite")
+    catalog_path = tmp_path / "catalog.csv"
+    catalog_path.write_text(
+        "ID,Audio URL,Audio Text\n"
+        f"STT_NW0001,{AUDIO_DATA_INFO['audio_url']},{REFERENCE}\n",
+        encoding="utf-8",
+    )
+    dataset_dir = tmp_path / "dataset"
+    run = partial(
+        main.get_audio_transcript_pairs,
+        str(catalog_path),
+        prefetch_workers=0,
+        manifest_path=manifest_path,
+        dataset_dir=str(dataset_dir),
+        metrics_path=None,
+    )
+
+    def correct_first_segment(segments):
+        stages.calls["correct"] += 1
+        return {segment["id"]: None for segment in segments} | {
+            segments[0]["id"]: "corrected"
+        }
+
+    monkeypatch.setattr(main, "get_LLM_corrected_texts", correct_first_segment)
+    pairs, _ = main.post_process_audio_transcript_pairs(AUDIO_DATA_INFO, manifest_path)
+    assert pairs is None
+    run()
+    assert read_dataset_index(str(dataset_dir)) == []
+
+    monkeypatch.setattr(main, "get_LLM_corrected_texts", stages.correct)
+    run()
+    index = read_dataset_index(str(dataset_dir))
+    assert [entry["key"] for entry in index] == ["STT_NW0001_0001", "STT_NW0001_0002"]
+    for entry in index:
+        record = read_dataset_record(entry, str(dataset_dir))
+        assert record["LLM_corrected_text"] == "corrected 3"
+    assert get_manifest(manifest_path).next_stage("STT_NW0001") is None
+
+
+def test_finished_audio_drops_its_segments(stages, tmp_path, monkeypatch):
+    jobs = []
+    new_audio_job = main._new_audio_job
+
+    def record_job(*args):
+        jobs.append(new_audio_job(*args))
+        return jobs[-1]
+
+    monkeypatch.setattr(main, "_new_audio_job", record_job)
+    manifest_path = str(tmp_path / "manifest.sqlite")
+    invalid_audio = dict(AUDIO_DATA_INFO, full_audio_id="STT_NW0002")
+    invalid_audio["reference_transcript"] = "abcdefghijklmnopqrstuvwxyz"
+
+    pairs, _ = main.post_process_audio_transcript_pairs(AUDIO_DATA_INFO, manifest_path)
+    main.post_process_audio_transcript_pairs(invalid_audio, manifest_path)
+
+    assert list(pairs) == ["STT_NW0001_0001", "STT_NW0001_0002"]
+    assert all("split_audio_data" not in job for job in jobs)
+
+
+def test_audio_without_id_is_not_named_after_its_url(stages, tmp_path, monkeypatch):
+    named_ids = []
+    get_split_audio = stages.get_split_audio
+
+    def record_name(audio_data, full_audio_id, *args, **kwargs):
+        named_ids.append(full_audio_id)
+        return get_split_audio(audio_data, full_audio_id, *args, **kwargs)
+
+    monkeypatch.setattr(main, "get_split_audio", record_name)
+    manifest_path = str(tmp_path / "manifest.sqlite")
+    audio_data_info = dict(AUDIO_DATA_INFO, full_audio_id="")
+
+    pairs, _ = main.post_process_audio_transcript_pairs(audio_data_info, manifest_path)
+    get_manifest(manifest_path).reset_stage("correct")
+    rerun_pairs, _ = main.post_process_audio_transcript_pairs(
+        audio_data_info, manifest_path
+    )
+
+    assert named_ids == [""]
+    assert list(pairs) == list(rerun_pairs) == ["_0001", "_0002"]
+    manifest = get_manifest(manifest_path)
+    assert manifest.next_stage(AUDIO_DATA_INFO["audio_url"]) == "save"
+
+
+def test_rerun_single_stage_keeps_earlier_stages(stages, tmp_path):
+    manifest_path = str(tmp_path / "manifest.sqlite")
+    main.post_process_audio_transcript_pairs(AUDIO_DATA_INFO, manifest_path)
+    get_manifest(manifest_path).reset_stage("correct")
+
+    pairs, _ = main.post_process_audio_transcript_pairs(AUDIO_DATA_INFO, manifest_path)
+
+    assert stages.calls == {"download": 1, "segment": 1, "transcribe": 1, "correct": 2}
+    assert pairs["STT_NW0001_0002"]["LLM_corrected_text"] == "corrected 2"
+
+
+def test_get_audio_transcript_pairs_skips_saved_audios(stages, tmp_path, monkeypatch):
+    manifest_path = str(tmp_path / "manifest.sqlite")
+    catalog_path = tmp_path / "catalog.csv"
+    catalog_path.write_text(
+        "ID,Audio URL,Audio Text\n"
+        f"STT_NW0001,{AUDIO_DATA_INFO['audio_url']},{REFERENCE}\n",
+        encoding="utf-8",
+    )
+    dataset_dir = tmp_path / "dataset"
+    run = partial(
+        main.get_audio_transcript_pairs,
+        str(catalog_path),
+        prefetch_workers=0,
+        manifest_path=manifest_path,
+        dataset_dir=str(dataset_dir),
+        metrics_path=str(tmp_path / "metrics.prom"),
+    )
+
+    run()
+    metrics = (tmp_path / "metrics.prom").read_text()
+    assert 'stt_operation_seconds_count{operation="stage_correct"}' in metrics
+    run()
+    index = read_dataset_index(str(dataset_dir))
+    assert [entry["key"] for entry in index] == ["STT_NW0001_0001", "STT_NW0001_0002"]
+    assert stages.calls["correct"] == 1
+
+    run(rerun_stage="correct")
+    index = read_dataset_index(str(dataset_dir))
+    assert [entry["key"] for entry in index] == ["STT_NW0001_0001", "STT_NW0001_0002"]
+    assert {entry["shard"] for entry in index} == {"shard-000001.tar"}
+    assert sorted(os.listdir(dataset_dir)) == [
+        "index.jsonl",
+        "shard-000000.tar",
+        "shard-000001.tar",
+    ]
+    record = read_dataset_record(index[-1], str(dataset_dir))
+    assert record["LLM_corrected_text"] == "corrected 2"
+    assert record["audio"][44:] == stages.pcm[20000:40000].tobytes()
+    assert stages.calls == {"download": 1, "segment": 1, "transcribe": 1, "correct": 2}
+
+
+def test_staged_runner_downloads_while_transcribing(stages, tmp_path, monkeypatch):
+    catalog_path = tmp_path / "catalog.csv"
+    catalog_path.write_text(
+        "ID,Audio URL,Audio Text\n"
+        + "".join(
+            f"STT_NW{i:04},https://example.com/STT_NW{i:04}.mp3,{REFERENCE}\n"
+            for i in range(12)
+        ),
+        encoding="utf-8",
+    )
+    events = []
+
+    def download_audio(audio_url):
+        events.append(("download", audio_url))
+        return stages.download_audio(audio_url)
+
+    def transcribe(raw_audios):
+        events.append(("transcribe", None))
+        return stages.transcribe(raw_audios)
+
+    monkeypatch.setattr(main, "download_audio", download_audio)
+    monkeypatch.setattr(audio_downloader, "download_audio", download_audio)
+    monkeypatch.setattr(main, "get_audio_inference_texts", transcribe)
+
+    main.get_audio_transcript_pairs(
+        str(catalog_path),
+        manifest_path=str(tmp_path / "manifest.sqlite"),
+        dataset_dir=str(tmp_path / "dataset"),
+        metrics_path=None,
+    )
+
+    assert events.count(("download", "https://example.com/STT_NW0011.mp3")) == 1
+    assert events.index(("transcribe", None)) < events.index(
+        ("download", "https://example.com/STT_NW0011.mp3")
+    )
+
+
+def test_staged_runner_isolates_audios(stages, tmp_path, monkeypatch):
+    manifest_path = str(tmp_path / "manifest.sqlite")
+    catalog = {
+        str(i): dict(AUDIO_DATA_INFO, full_audio_id=f"STT_NW000{i}") for i in range(4)
+    }
+    catalog["3"]["audio_url"] = ""
+
+    def correct(segments):
+        if segments[0]["id"].startswith("STT_NW0002"):
+            raise RuntimeError("LLM unavailable")
+        return stages.correct(segments)
+
+    monkeypatch.setattr(main, "get_LLM_corrected_texts", correct)
+
+    results = {
+        data_id: (pairs, full_audio_id, error)
+        for data_id, pairs, full_audio_id, error in main.iter_staged_catalog(
+            catalog, {"download": 2, "transcribe": 2}, manifest_path=manifest_path
+        )
+    }
+
+    assert results.keys() == catalog.keys()
+    assert results["2"] == (None, "STT_NW0002", "LLM unavailable")
+    assert results["3"] == (None, "STT_NW0003", None)
+    for data_id in "01":
+        pairs, full_audio_id, error = results[data_id]
+        assert error is None
+        assert list(pairs) == [f"{full_audio_id}_0001", f"{full_audio_id}_0002"]
+        assert (
+            pairs[f"{full_audio_id}_0002"]["audio_seg_data"]
+            == stages.pcm[20000:40000].tobytes()
+        )
+    assert stages.calls["segment"] == 3
+
+
+@pytest.mark.parametrize("reference", [REFERENCE, "abcdefghijklmnopqrstuvwxyz"])
+def test_early_rejection_skips_remaining_inference(
+    stages, tmp_path, monkeypatch, reference
+):
+    monkeypatch.setattr(main, "EARLY_REJECT_SAMPLE_SEGMENTS", 1)
+    monkeypatch.setattr(main, "EARLY_REJECT_MIN_CHARS", 1)
+    manifest_path = str(tmp_path / "manifest.sqlite")
+    audio_data_info = dict(AUDIO_DATA_INFO, reference_transcript=reference)
+    saved_before = get_registry().get_counter("inference_saved_total", unit="segments")
+
+    pairs, _ = main.post_process_audio_transcript_pairs(audio_data_info, manifest_path)
+
+    validation = get_manifest(manifest_path).get_stage("STT_NW0001", "validate")
+    saved = get_registry().get_counter("inference_saved_total", unit="segments")
+    if reference == REFERENCE:
+        assert list(pairs) == ["STT_NW0001_0001", "STT_NW0001_0002"]
+        assert stages.calls["transcribe"] == 2
+        assert "early_rejection" not in validation
+        assert saved == saved_before
+    else:
+        assert pairs is None
+        assert stages.calls == {
+            "download": 1,
+            "segment": 1,
+            "transcribe": 1,
+            "correct": 0,
+        }
+        assert validation["early_rejection"] == {
+            "sample_segments": 1,
+            "partial_cer": 1.0,
+            "skipped_segments": 1,
+            "skipped_audio_seconds": 1.25,
+        }
+        assert saved == saved_before + 1
+        manifest = get_manifest(manifest_path)
+        assert main.is_audio_finished(manifest, audio_data_info)
+
+
+def test_failed_partial_cer_does_not_reject_early(monkeypatch):
+    def broken_prefix_cer(reference, prediction):
+        raise ValueError("broken")
+
+    monkeypatch.setattr(main, "EARLY_REJECT_MIN_CHARS", 1)
+    monkeypatch.setattr(util.cer, "calculate_prefix_cer", broken_prefix_cer)
+    failures_before = get_registry().get_counter(
+        "failures_total", operation="early_rejection"
+    )
+
+    assert main.is_clearly_invalid_start("abc", "xyz") == (False, None)
+    assert (
+        get_registry().get_counter("failures_total", operation="early_rejection")
+        == failures_before + 1
+    )
+
+
+def test_unambiguous_segments_are_corrected_without_the_LLM(
+    stages, tmp_path, monkeypatch
+):
+    monkeypatch.setattr(main, "LOCAL_CORRECTION_MAX_SYLLABLE_CER", 0.5)
+    # A misspelled syllable, and a syllable missing from the reference.
+    texts = {0: "བཀྲ་ཤིས་བདེ་ལེག།", 20000: "ཁྱེད་རང་སྐུ་གཟུགས་བདེ་པོ་ཡིན་པས་ལགས།"}
+    monkeypatch.setattr(
+        main,
+        "get_audio_inference_texts",
+        lambda raw_audios: [texts[raw_audio.start] for raw_audio in raw_audios],
+    )
+    monkeypatch.setattr(
+        main,
+        "transfer_segmentation",
+        lambda inference, reference: reference.replace(" ", "\n") + "\n",
+    )
+    sent_to_llm = []
+
+    def correct(segments):
+        sent_to_llm.extend(segment["id"] for segment in segments)
+        return stages.correct(segments)
+
+    monkeypatch.setattr(main, "get_LLM_corrected_texts", correct)
+    manifest_path = str(tmp_path / "manifest.sqlite")
+
+    pairs, _ = main.post_process_audio_transcript_pairs(AUDIO_DATA_INFO, manifest_path)
+
+    assert sent_to_llm == ["STT_NW0001_0002"]
+    assert pairs["STT_NW0001_0001"]["LLM_corrected_text"] == "བཀྲ་ཤིས་བདེ་ལེགས།"
+    assert pairs["STT_NW0001_0002"]["LLM_corrected_text"] == "corrected 1"
+    corrections = get_manifest(manifest_path).get_segments("STT_NW0001", "correct")
+    assert corrections["STT_NW0001_0001"]["corrected_by"] == "local"
+    assert corrections["STT_NW0001_0002"]["corrected_by"] == "llm"
@@ -0,0 +1,72 @@
+import pytest
+
+from stt_data_with_llm.manifest import (
+    STAGES,
+    PipelineManifest,
+    entry_fingerprint,
+    get_manifest,
+)
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    manifest = PipelineManifest(str(tmp_path / "manifest.sqlite"))
+    yield manifest
+    manifest.close()
+
+
+def test_complete_stage_records_audio_and_segment_artifacts(manifest):
+    segments = {f"STT_NW0001_{i:04}": {"start": i, "end": i + 1} for i in (10, 2, 1)}
+
+    manifest.complete_stage("STT_NW0001", "download", {"path": "audio.mp3"})
+    manifest.complete_stage("STT_NW0001", "segment", {"num_segments": 3}, segments)
+
+    assert manifest.get_stage("STT_NW0001", "download") == {"path": "audio.mp3"}
+    assert manifest.get_stage("STT_NW0001", "transcribe") is None
+    assert list(manifest.get_segments("STT_NW0001", "segment")) == list(segments)
+    assert manifest.completed_stages("STT_NW0001") == ["download", "segment"]
+    assert manifest.next_stage("STT_NW0001") == "transcribe"
+
+
+def test_manifest_survives_reopening(manifest):
+    manifest.complete_stage("STT_NW0001", "download", {"path": "audio.mp3"})
+    manifest.close()
+
+    reopened = PipelineManifest(manifest.path)
+
+    assert reopened.get_stage("STT_NW0001", "download") == {"path": "audio.mp3"}
+
+
+def test_reset_stage_drops_later_stages_only(manifest):
+    for full_audio_id in ("STT_NW0001", "STT_NW0002"):
+        for stage in STAGES:
+            manifest.complete_stage(full_audio_id, stage, segments={"seg": {}})
+
+    manifest.reset_stage("correct", "STT_NW0001")
+    manifest.reset_stage("save")
+
+    assert manifest.next_stage("STT_NW0001") == "correct"
+    assert manifest.get_segments("STT_NW0001", "correct") == {}
+    assert manifest.get_segments("STT_NW0001", "validate") == {"seg": {}}
+    assert manifest.next_stage("STT_NW0002") == "save"
+    with pytest.raises(ValueError):
+        manifest.reset_stage("upload")
+
+
+def test_changed_catalog_entry_restarts_audio(manifest):
+    entry = {"audio_url": "https://example.com/a.mp3", "reference_transcript": "A"}
+    assert not manifest.start_audio("STT_NW0001", entry_fingerprint(entry))
+    manifest.complete_stage("STT_NW0001", "download", {"path": "audio.mp3"})
+
+    assert not manifest.start_audio("STT_NW0001", entry_fingerprint(entry))
+    assert manifest.next_stage("STT_NW0001") == "segment"
+
+    entry["reference_transcript"] = "B"
+    assert manifest.start_audio("STT_NW0001", entry_fingerprint(entry))
+    assert manifest.next_stage("STT_NW0001") == "download"
+
+
+def test_get_manifest_is_shared(tmp_path):
+    path = str(tmp_path / "manifest.sqlite")
+
+    assert get_manifest(path) is get_manifest(path)
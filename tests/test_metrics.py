@@ -0,0 +1,117 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from stt_data_with_llm import metrics
+from stt_data_with_llm.metrics import (
+    AudioTrace,
+    MetricsRegistry,
+    bind_trace,
+    finish_trace,
+    timed,
+    use_trace,
+)
+
+
+@pytest.fixture(autouse=True)
+def empty_registry():
+    metrics.get_registry().reset()
+    yield
+    metrics.get_registry().reset()
+
+
+def test_prometheus_export():
+    registry = MetricsRegistry(buckets=(0.1, 1))
+    registry.increment("bytes_total", 100, operation="download", direction="received")
+    registry.increment("bytes_total", 50, operation="download", direction="received")
+    registry.observe("operation_seconds", 0.05, operation='say "hi"')
+    registry.observe("operation_seconds", 0.5, operation='say "hi"')
+    registry.observe("operation_seconds", 5, operation='say "hi"')
+
+    assert registry.to_prometheus().splitlines() == [
+        "# TYPE stt_bytes_total counter",
+        'stt_bytes_total{direction="received",operation="download"} 150',
+        "# TYPE stt_operation_seconds histogram",
+        'stt_operation_seconds_bucket{operation="say \\"hi\\"",le="0.1"} 1',
+        'stt_operation_seconds_bucket{operation="say \\"hi\\"",le="1"} 2',
+        'stt_operation_seconds_bucket{operation="say \\"hi\\"",le="+Inf"} 3',
+        'stt_operation_seconds_sum{operation="say \\"hi\\""} 5.55',
+        'stt_operation_seconds_count{operation="say \\"hi\\""} 3',
+    ]
+    histogram = registry.snapshot()["histograms"][0]
+    assert histogram["buckets"] == {"0.1": 1, "1": 2, "+Inf": 3}
+
+
+def test_merge_adds_worker_snapshots():
+    registry = MetricsRegistry(buckets=(0.1, 1))
+    registry.increment("segments_total", 2)
+    registry.observe("operation_seconds", 0.05, operation="vad")
+    worker = MetricsRegistry(buckets=(0.1, 1))
+    worker.increment("segments_total", 3)
+    worker.observe("operation_seconds", 0.5, operation="vad")
+    worker.observe("operation_seconds", 5, operation="vad")
+
+    registry.merge(worker.snapshot(reset=True))
+
+    assert worker.snapshot() == {"counters": [], "histograms": []}
+    assert registry.get_counter("segments_total") == 5
+    (histogram,) = registry.snapshot()["histograms"]
+    assert histogram["buckets"] == {"0.1": 1, "1": 2, "+Inf": 3}
+    assert histogram["count"] == 3
+    assert histogram["sum"] == pytest.approx(5.55)
+
+
+def test_timed_records_durations_and_errors():
+    @timed("decorated")
+    def fail():
+        raise ValueError("failed")
+
+    with timed("block"):
+        pass
+    with pytest.raises(ValueError):
+        fail()
+
+    snapshot = metrics.get_registry().snapshot()
+    assert [
+        (histogram["labels"]["operation"], histogram["count"])
+        for histogram in snapshot["histograms"]
+    ] == [("block", 1), ("decorated", 1)]
+    assert snapshot["counters"] == [
+        {"name": "errors_total", "labels": {"operation": "decorated"}, "value": 1}
+    ]
+
+
+def test_audio_trace_follows_executor_threads(tmp_path):
+    trace = AudioTrace("STT_NW0001")
+
+    def transcribe(segment):
+        with timed("inference"):
+            metrics.increment("bytes_total", segment, direction="sent")
+
+    with use_trace(trace):
+        with ThreadPoolExecutor(2) as executor:
+            list(executor.map(bind_trace(transcribe), [10, 20, 30]))
+    with timed("inference"):
+        pass
+
+    trace_path = tmp_path / "traces.jsonl"
+    finish_trace(trace, str(trace_path))
+    finish_trace(trace, None)
+
+    (summary,) = [json.loads(line) for line in trace_path.read_text().splitlines()]
+    assert summary["full_audio_id"] == "STT_NW0001"
+    assert summary["operations"]["inference"]["count"] == 3
+    assert summary["counters"] == {"bytes_total.sent": 60}
+    assert metrics.get_registry().snapshot()["histograms"][0]["count"] == 4
+
+
+def test_write_metrics_picks_the_format(tmp_path):
+    metrics.increment("segments_total", 3)
+
+    metrics.write_metrics(str(tmp_path / "metrics.json"))
+    metrics.write_metrics(str(tmp_path / "out" / "metrics.prom"))
+
+    snapshot = json.loads((tmp_path / "metrics.json").read_text())
+    assert snapshot["counters"][0]["value"] == 3
+    assert "stt_segments_total 3" in (tmp_path / "out" / "metrics.prom").read_text()
@@ -0,0 +1,173 @@
+import threading
+import time
+
+import pytest
+
+from stt_data_with_llm.rate_limiter import (
+    RateLimiter,
+    RetryableError,
+    check_status,
+    get_rate_limiter,
+    set_rate_limit_share,
+)
+
+
+def fail(overloaded=False, retry_after=None):
+    raise RetryableError("failed", overloaded=overloaded, retry_after=retry_after)
+
+
+def test_token_bucket_paces_requests_after_the_burst():
+    limiter = RateLimiter("test", requests_per_second=20, burst=2)
+    start = time.monotonic()
+    for _ in range(6):
+        limiter.call(lambda: None)
+
+    # The burst goes out at once, the 4 other requests wait 1/20 s each.
+    assert time.monotonic() - start >= 0.19
+
+
+def test_requests_in_flight_stay_within_the_concurrency():
+    limiter = RateLimiter(
+        "test", requests_per_second=1000, burst=100, max_concurrency=3
+    )
+    lock = threading.Lock()
+    in_flight = [0, 0]
+
+    def request():
+        with lock:
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight[1], in_flight[0])
+        time.sleep(0.02)
+        with lock:
+            in_flight[0] -= 1
+
+    threads = [
+        threading.Thread(target=limiter.call, args=(request,)) for _ in range(12)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert in_flight[1] == 3
+
+
+def test_overload_halves_the_concurrency_and_successes_restore_it():
+    limiter = RateLimiter(
+        "test", requests_per_second=1000, burst=100, max_concurrency=8, retry_attempts=1
+    )
+    for _ in range(2):
+        with pytest.raises(RetryableError):
+            limiter.call(fail, overloaded=True)
+    assert limiter.concurrency == 2
+
+    for _ in range(20):
+        limiter.call(lambda: None)
+    assert 4 < limiter.concurrency <= 8
+
+
+def test_slow_requests_lower_the_concurrency():
+    limiter = RateLimiter(
+        "test", requests_per_second=1000, burst=100, target_latency=0.01
+    )
+    limiter.call(time.sleep, 0.02)
+
+    assert limiter.concurrency < 8
+
+
+def test_retries_stop_when_the_budget_is_spent():
+    limiter = RateLimiter(
+        "test",
+        requests_per_second=1000,
+        burst=100,
+        retry_attempts=5,
+        backoff_base=0.001,
+        retry_budget_ratio=0.5,
+        retry_budget_min=1,
+    )
+    calls = []
+
+    def request():
+        calls.append(None)
+        fail()
+
+    with pytest.raises(RetryableError):
+        limiter.call(request)
+    assert len(calls) == 2
+
+    # Two successes earn one more retry.
+    limiter.call(lambda: None)
+    limiter.call(lambda: None)
+    calls.clear()
+    with pytest.raises(RetryableError):
+        limiter.call(request)
+    assert len(calls) == 2
+
+
+def test_other_errors_are_not_retried():
+    limiter = RateLimiter("test", requests_per_second=1000, burst=100)
+    calls = []
+
+    def request():
+        calls.append(None)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        limiter.call(request)
+    assert calls == [None]
+    assert limiter.in_flight == 0
+
+
+def test_backoff_is_jittered_and_honours_retry_after():
+    limiter = RateLimiter("test", requests_per_second=1, backoff_base=1, backoff_max=10)
+    delays = [limiter.backoff(3) for _ in range(200)]
+
+    assert all(0 <= delay <= 4 for delay in delays)
+    assert len(set(delays)) > 1
+    assert max(limiter.backoff(10) for _ in range(200)) <= 10
+    assert limiter.backoff(1, retry_after=5) == 5
+
+
+def test_retry_after_pauses_every_request():
+    limiter = RateLimiter(
+        "test", requests_per_second=1000, burst=100, backoff_base=0.001
+    )
+    attempts = []
+
+    def request():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            fail(overloaded=True, retry_after=0.2)
+
+    limiter.call(request)
+    assert attempts[1] - attempts[0] >= 0.19
+
+
+@pytest.mark.parametrize(
+    "status, retryable, overloaded",
+    [(429, True, True), (529, True, True), (500, True, False), (404, False, False)],
+)
+def test_check_status(status, retryable, overloaded):
+    if not retryable:
+        check_status(status)
+        return
+    with pytest.raises(RetryableError) as error:
+        check_status(status, {"retry-after": "3"})
+    assert error.value.overloaded == overloaded
+    assert error.value.retry_after == 3
+
+
+def test_processes_share_the_configured_limits():
+    full = get_rate_limiter("inference")
+    assert get_rate_limiter("inference") is full
+
+    set_rate_limit_share(0.5)
+    try:
+        half = get_rate_limiter("inference")
+        assert half.requests_per_second == full.requests_per_second / 2
+        assert half.max_concurrency == full.max_concurrency // 2
+        assert half.burst == full.burst // 2
+        set_rate_limit_share(0.001)
+        assert get_rate_limiter("inference").burst == 1
+    finally:
+        set_rate_limit_share(1.0)
@@ -0,0 +1,117 @@
+import random
+
+import pytest
+
+from stt_data_with_llm.segmentation_transfer import (
+    find_anchors,
+    transfer_newlines,
+    transfer_segmentation_windowed,
+)
+
+SYLLABLES = ("བཀྲ", "ཤིས", "བདེ", "ལེགས", "ཁྱེད", "རང", "སྐུ", "གཟུགས", "ཡིན", "པས")
+SYLLABLES += ("དགོན", "སྡེ", "ལྷག", "པར", "བོད", "ཀྱི", "སྐད", "ཡིག", "མི", "རྣམས")
+
+
+def make_transcripts(num_chars, seed=0):
+    """Returns an inference transcript with one line per segment and its reference.
+
+    The inference drops or misspells some syllables and inserts a few others.
+    """
+    rng = random.Random(seed)
+    inference_lines, reference = [], ""
+    while len(reference) < num_chars:
+        syllables = [rng.choice(SYLLABLES) for _ in range(rng.randint(8, 25))]
+        reference += "་".join(syllables) + "། "
+        heard = []
+        for syllable in syllables:
+            draw = rng.random()
+            if draw < 0.05:
+                continue
+            heard.append(syllable[:-1] if draw < 0.15 else syllable)
+            if rng.random() < 0.03:
+                heard.append(rng.choice(SYLLABLES))
+        inference_lines.append("་".join(heard))
+    return "\n".join(inference_lines) + "\n", reference
+
+
+@pytest.fixture
+def offline_transfer(monkeypatch):
+    """Runs fast-antx with the Python port of the diff it downloads as a binary."""
+    diff_match_patch = pytest.importorskip("diff_match_patch")
+    fast_antx_core = pytest.importorskip("fast_antx.core")
+
+    class LocalDiffMatchPatch:
+        def diff_main(self, text1, text2):
+            dmp = diff_match_patch.diff_match_patch()
+            dmp.Diff_Timeout = 0
+            return dmp.diff_main(text1, text2)
+
+    monkeypatch.setattr(
+        fast_antx_core, "optimized_diff_match_patch", LocalDiffMatchPatch
+    )
+
+
+def test_short_transcripts_are_aligned_in_one_call():
+    calls = []
+
+    def align(source, target):
+        calls.append((source, target))
+        return target
+
+    inference, reference = make_transcripts(1000)
+    transfer_segmentation_windowed(inference, reference, align, window_chars=2000)
+
+    assert calls == [(inference, reference)]
+
+
+def test_windows_match_the_full_transfer(offline_transfer):
+    inference, reference = make_transcripts(10000)
+
+    windowed = transfer_segmentation_windowed(
+        inference, reference, window_chars=1000, workers=1
+    )
+
+    assert windowed == transfer_newlines(inference, reference)
+    assert windowed.replace("\n", "") == reference
+    assert windowed.count("\n") == inference.count("\n")
+
+
+def test_parallel_windows_give_the_same_segmentation(offline_transfer):
+    inference, reference = make_transcripts(5000, seed=1)
+
+    assert transfer_segmentation_windowed(
+        inference, reference, window_chars=500, workers=3
+    ) == transfer_segmentation_windowed(
+        inference, reference, window_chars=500, workers=1
+    )
+
+
+def test_anchors_are_ordered_exact_matches():
+    inference, reference = make_transcripts(5000, seed=2)
+    source = inference.replace("\n", "")
+
+    anchors = find_anchors(source, reference, size=16)
+
+    assert anchors
+    for (source_position, target_position), (next_source, next_target) in zip(
+        anchors, anchors[1:]
+    ):
+        assert next_source > source_position and next_target > target_position
+    for source_position, target_position in anchors:
+        assert (
+            source[source_position : source_position + 16]  # noqa: E203
+            == reference[target_position : target_position + 16]  # noqa: E203
+        )
+
+
+def test_unrelated_transcripts_fall_back_to_a_single_alignment():
+    calls = []
+
+    def align(source, target):
+        calls.append(source)
+        return target
+
+    inference = "\n".join("ཀ" * 50 for _ in range(100)) + "\n"
+    transfer_segmentation_windowed(inference, "ཁ" * 6000, align, window_chars=1000)
+
+    assert calls == [inference]
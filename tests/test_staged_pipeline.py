@@ -0,0 +1,120 @@
+import threading
+import time
+
+import pytest
+
+from stt_data_with_llm.staged_pipeline import Stage, StagedPipeline
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.01)
+
+
+def test_stages_overlap_on_consecutive_items():
+    second_item_started = threading.Event()
+
+    def first(item):
+        if item == 1:
+            second_item_started.set()
+        return True
+
+    def second(item):
+        # The first item only leaves the second stage once the next one has
+        # entered the first stage.
+        if item == 0:
+            assert second_item_started.wait(5)
+        return True
+
+    pipeline = StagedPipeline([Stage("first", first), Stage("second", second)])
+    results = list(pipeline.run(range(2), log_interval=None))
+
+    assert sorted(results) == [(0, None), (1, None)]
+    assert {name: stats["processed"] for name, stats in pipeline.stats().items()} == {
+        "first": 2,
+        "second": 2,
+    }
+
+
+def test_bounded_queues_hold_back_earlier_stages():
+    release = threading.Event()
+    consumed = []
+
+    def items():
+        for item in range(20):
+            consumed.append(item)
+            yield item
+
+    pipeline = StagedPipeline(
+        [
+            Stage("fast", lambda item: True, queue_size=1),
+            Stage("slow", lambda item: release.wait(5), queue_size=2),
+        ]
+    )
+    results = pipeline.run(items(), log_interval=None)
+    thread = threading.Thread(target=lambda: results.__next__())
+    thread.start()
+    wait_until(lambda: pipeline.queue_depths() == {"fast": 1, "slow": 2})
+    time.sleep(0.2)
+
+    # One item in each worker, the queues full and one blocked in the feeder.
+    assert len(consumed) <= 6
+    assert pipeline.stats()["slow"]["busy"] == 1
+    release.set()
+    thread.join()
+    assert len(list(results)) == 19
+
+
+def test_unconsumed_results_hold_back_the_stages():
+    consumed = []
+
+    def items():
+        for item in range(20):
+            consumed.append(item)
+            yield item
+
+    pipeline = StagedPipeline([Stage("fast", lambda item: True, queue_size=1)], 2)
+    results = pipeline.run(items(), log_interval=None)
+    next(results)
+    time.sleep(0.2)
+
+    # Two results waiting, one in the worker, one queued and one in the feeder.
+    assert len(consumed) <= 6
+    assert len(list(results)) == 19
+
+
+def test_finished_and_failed_items_skip_later_stages():
+    reached_last = []
+
+    def check(item):
+        if item == "broken":
+            raise ValueError("broken item")
+        return item != "rejected"
+
+    def last(item):
+        reached_last.append(item)
+        return True
+
+    pipeline = StagedPipeline(
+        [Stage("check", check, workers=2), Stage("last", last, workers=2)]
+    )
+    results = dict(pipeline.run(["ok", "rejected", "broken"], log_interval=None))
+
+    assert reached_last == ["ok"]
+    assert results["ok"] is None and results["rejected"] is None
+    assert isinstance(results["broken"], ValueError)
+
+
+def test_closing_the_results_stops_the_workers():
+    pipeline = StagedPipeline([Stage("sleep", lambda item: time.sleep(0.01) or True)])
+    results = pipeline.run(range(1000), log_interval=None)
+    next(results)
+    results.close()
+
+    wait_until(
+        lambda: not any(t.name.startswith("stage-") for t in threading.enumerate())
+    )
+    with pytest.raises(ValueError):
+        Stage("empty", lambda item: True, workers=0)
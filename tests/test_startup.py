@@ -0,0 +1,47 @@
+import logging
+import os
+import subprocess
+import sys
+
+from stt_data_with_llm import util
+
+HEAVY_MODULES = (
+    "anthropic",
+    "evaluate",
+    "librosa",
+    "pandas",
+    "pyannote.audio",
+    "pydub",
+    "torch",
+    "torchaudio",
+)
+
+
+def test_importing_pipeline_does_not_load_heavy_dependencies():
+    code = (
+        "import sys, stt_data_with_llm.main\n"
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, env=env
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == ""
+
+
+def test_setup_logging_configures_once(tmp_path):
+    util.shutdown_logging()
+    handlers = list(logging.getLogger().handlers)
+    try:
+        util.setup_logging(str(tmp_path / "pipeline.log"))
+        util.setup_logging(str(tmp_path / "other.log"))
+        added = [h for h in logging.getLogger().handlers if h not in handlers]
+        assert len(added) == 1
+
+        logging.info("queued record")
+    finally:
+        util.shutdown_logging()
+    assert logging.getLogger().handlers == handlers
+    assert "queued record" in (tmp_path / "pipeline.log").read_text()
+    assert not (tmp_path / "other.log").exists()
@@ -0,0 +1,32 @@
+from unittest import mock
+
+from stt_data_with_llm.audio_parser import (
+    clear_vad_pipelines,
+    get_vad_pipeline,
+    initialize_vad_pipeline,
+    warm_vad_pipelines,
+)
+from stt_data_with_llm.config import HYPER_PARAMETERS, VAD_MODEL_ID
+
+
+@mock.patch("stt_data_with_llm.audio_parser.load_vad_pipeline")
+def test_vad_pipeline_is_loaded_once_per_configuration(mock_load):
+    mock_load.side_effect = lambda model_id, hyper_parameters: object()
+    clear_vad_pipelines()
+
+    warm_vad_pipelines()
+    first = initialize_vad_pipeline()
+    second = initialize_vad_pipeline()
+    assert first is second
+    assert mock_load.call_count == 1
+
+    tuned_parameters = dict(HYPER_PARAMETERS, min_duration_on=1.0)
+    tuned = get_vad_pipeline(VAD_MODEL_ID, tuned_parameters)
+    assert tuned is not first
+    assert get_vad_pipeline(VAD_MODEL_ID, dict(tuned_parameters)) is tuned
+    assert mock_load.call_count == 2
+
+    thread_pipeline = get_vad_pipeline(per_thread=True)
+    assert thread_pipeline is not first
+    assert get_vad_pipeline(per_thread=True) is thread_pipeline
+    clear_vad_pipelines()